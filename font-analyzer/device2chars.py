@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+
+import sys
+import os
+import json
+import getopt
+import shlex
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+
+def usage():
+    cmd = os.path.basename(__file__)
+    print(f'''{cmd} [options] [<device>...]
+Runs cft-font-info for each device (or the given devices) in the SDK and writes fonts/<device>.fonts.json
+and chars/<device>.chars.json like device2chars.sh, but runs it in parallel and skips the devices
+whose fonts didn't change in the SDK since the last run.
+options:
+    -h|--help
+    -j|--jobs <N>                   <N>: how many cft-font-info to run at the same time, default: {os.cpu_count()}
+    -f|--force                      run cft-font-info for every device
+    --cft-font-info <command>       <command>: the command to run with the device as the last argument,
+                                    default: {DEFAULT_CFT_FONT_INFO}, it can also be set in the env: CFT_FONT_INFO
+
+examples:
+
+    to update the devices whose fonts changed:
+        {cmd}
+
+    to update fr245 and fenix7:
+        {cmd} --force fr245 fenix7
+''')
+
+
+DIR = os.path.dirname(os.path.realpath(__file__))
+# get_sdk_home() is shared with the scripts/*.py tools
+sys.path.insert(0, f"{os.path.dirname(DIR)}/scripts")
+from _sdk import get_sdk_home
+
+FONTS_DIR = f"{DIR}/fonts"
+CHARS_DIR = f"{DIR}/chars"
+# the signature of each device's fonts in the SDK when its fonts.json was generated
+SIGNATURES_FILE = f"{FONTS_DIR}/.signatures.json"
+
+DEFAULT_CFT_FONT_INFO = 'npx cft-font-info'
+
+
+def get_stat(path):
+    try:
+        stat = os.stat(path)
+        return [stat.st_size, stat.st_mtime_ns]
+    except OSError:
+        return None
+
+
+# the font files in the SDK's Fonts/ directory by their name without the extension
+def get_font_files(sdk_home):
+    font_files = {}
+    fonts_dir = f"{sdk_home}/Fonts"
+    if os.path.isdir(fonts_dir):
+        for file in sorted(os.listdir(fonts_dir)):
+            font_files.setdefault(os.path.splitext(file)[0], []).append(f"{fonts_dir}/{file}")
+    return font_files
+
+
+# the version of cft-font-info: the installed @markw65/monkeyc-optimizer and package-lock.json,
+# so upgrading it extracts the devices again
+def get_extractor_version():
+    try:
+        with open(f"{DIR}/node_modules/@markw65/monkeyc-optimizer/package.json", 'r') as file:
+            version = json.load(file).get('version')
+    except (OSError, ValueError):
+        version = None
+    return {'monkeyc-optimizer': version, 'package-lock.json': get_stat(f"{DIR}/package-lock.json")}
+
+
+# stat of everything cft-font-info reads for the device: its json files and the font files in simulator.json
+def get_device_signature(sdk_home, font_files, device, command, extractor_version):
+    device_dir = f"{sdk_home}/Devices/{device}"
+    signature = {'command': command, 'extractor': extractor_version}
+    for file in ['compiler.json', 'simulator.json']:
+        signature[file] = get_stat(f"{device_dir}/{file}")
+    try:
+        with open(f"{device_dir}/simulator.json", 'r') as file:
+            simulator = json.load(file)
+    except (OSError, ValueError):
+        simulator = {}
+    font_names = sorted({font.get('filename') for font_set in simulator.get('fonts', []) for font in font_set.get('fonts', []) if font.get('filename')})
+    for font_name in font_names:
+        for path in font_files.get(font_name, []):
+            signature[os.path.basename(path)] = get_stat(path)
+    return signature
+
+
+# formats json the same way as `jq .`
+def to_jq_json(obj):
+    return json.dumps(obj, indent=2, ensure_ascii=False).replace('\x7f', '\\u007f') + '\n'
+
+
+# jq '(.fonts[] |= ([.charInfo[].char]|add))'
+def fonts_to_chars(fonts):
+    chars = dict(fonts)
+    chars['fonts'] = {}
+    for name, font in fonts.get('fonts', {}).items():
+        font_chars = [char_info['char'] for char_info in font.get('charInfo', [])]
+        chars['fonts'][name] = ''.join(font_chars) if font_chars else None
+    return chars
+
+
+def write_atomically(path, content):
+    tmp_file = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_file, 'w', encoding='utf-8') as file:
+        file.write(content)
+    os.replace(tmp_file, path)
+
+
+# returns the error message, or None when it was successful
+def extract_device(device, command):
+    try:
+        # npx finds cft-font-info in the node_modules of font-analyzer/
+        result = subprocess.run(shlex.split(command) + [device], cwd=DIR, capture_output=True, check=True)
+        fonts = json.loads(result.stdout)
+    except subprocess.CalledProcessError as e:
+        return f"exit code: {e.returncode}: {e.stderr.decode(errors='replace').strip()}"
+    except (OSError, ValueError) as e:
+        return str(e)
+    write_atomically(f"{FONTS_DIR}/{device}.fonts.json", to_jq_json(fonts))
+    write_atomically(f"{CHARS_DIR}/{device}.chars.json", to_jq_json(fonts_to_chars(fonts)))
+    return None
+
+
+def read_signatures():
+    try:
+        with open(SIGNATURES_FILE, 'r') as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+
+def is_up_to_date(device, signature, signatures):
+    return signatures.get(device) == signature \
+        and os.path.exists(f"{FONTS_DIR}/{device}.fonts.json") \
+        and os.path.exists(f"{CHARS_DIR}/{device}.chars.json")
+
+
+def main(argv):
+    try:
+        opts, args = getopt.getopt(argv, 'hj:f', ['help', 'jobs=', 'force', 'cft-font-info='])
+    except getopt.GetoptError as e:
+        print(e)
+        usage()
+        sys.exit(1)
+    jobs = os.cpu_count()
+    force = False
+    command = os.environ.get('CFT_FONT_INFO') or DEFAULT_CFT_FONT_INFO
+    for opt, arg in opts:
+        if opt == '-h' or opt == '--help':
+            usage()
+            sys.exit(0)
+        if opt == '-j' or opt == '--jobs':
+            jobs = int(arg) if int(arg) > 0 else os.cpu_count()
+        if opt == '-f' or opt == '--force':
+            force = True
+        if opt == '--cft-font-info':
+            command = arg
+
+    print(sys.argv[0])
+    sdk_home = get_sdk_home()
+    devices = args or sorted(d for d in os.listdir(f"{sdk_home}/Devices") if not d.startswith('.'))
+    os.makedirs(FONTS_DIR, exist_ok=True)
+    os.makedirs(CHARS_DIR, exist_ok=True)
+
+    font_files = get_font_files(sdk_home)
+    extractor_version = get_extractor_version()
+    signatures = read_signatures()
+    device2signature = {}
+    for device in devices:
+        signature = get_device_signature(sdk_home, font_files, device, command, extractor_version)
+        if force or not is_up_to_date(device, signature, signatures):
+            device2signature[device] = signature
+    print(f"devices to extract: {len(device2signature)}, unchanged: {len(devices) - len(device2signature)}")
+
+    failed = []
+    try:
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            futures = {device: executor.submit(extract_device, device, command) for device in device2signature}
+            for device, future in futures.items():
+                error = future.result()
+                if error:
+                    print(f"{device}: {error}")
+                    failed.append(device)
+                    signatures.pop(device, None)
+                else:
+                    print(device)
+                    signatures[device] = device2signature[device]
+    finally:
+        # the devices that were extracted are remembered even when it was interrupted
+        write_atomically(SIGNATURES_FILE, json.dumps(signatures, indent=1, sort_keys=True) + '\n')
+    if failed:
+        print(f"failed: {', '.join(failed)}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,46 @@
+# the helpers of the bench-*.py scripts to run and measure monkey-generator.py
+
+import sys
+import importlib.util
+import subprocess
+import time
+
+
+def load_module(name, path):
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+# returns the wall time of each run of func, before is called before each run and isn't measured
+def measure(func, runs, before = None):
+    timings = []
+    for run in range(runs):
+        if before:
+            before()
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+# older versions of monkey-generator.py reject the options they don't know (i.e: --force), --help makes it exit without generating
+def supports_option(generator, option, cwd = None, env = None):
+    result = subprocess.run([sys.executable, generator, option, '--help'], cwd=cwd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return result.returncode == 0
+
+
+# runs the generator runs times and returns the timings, it exits when the generator fails
+def run_generator(generator, generator_args, runs, cwd = None, env = None, before = None):
+    args = [sys.executable, generator] + generator_args
+    if supports_option(generator, '--force', cwd, env):
+        # don't let the fingerprint skip the generation
+        args.append('--force')
+
+    def run():
+        result = subprocess.run(args, cwd=cwd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+        if result.returncode != 0:
+            print(result.stderr, file=sys.stderr)
+            sys.exit(f"{generator} failed with exit code: {result.returncode}")
+    return measure(run, runs, before)
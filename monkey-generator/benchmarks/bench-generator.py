@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+
+import sys
+import os
+import getopt
+import statistics
+
+from _bench import run_generator
+
+
+GENERATOR = os.path.dirname(os.path.dirname(os.path.realpath(__file__))) + '/monkey-generator.py'
+
+
+def usage():
+    cmd = os.path.basename(__file__)
+    print(f'''{cmd} [options] [-- <monkey-generator options>]
+Runs monkey-generator.py in the current directory (the app's directory) several times and prints the timings.
+options:
+    -h|--help
+    -n|--runs <runs>                    number of runs, default: 5
+    -g|--generator <generator.py>       the monkey-generator.py to measure, default: {GENERATOR}
+    -b|--baseline <generator.py>        another version of monkey-generator.py to compare with
+
+examples:
+
+    to compare the current version with the previous commit at the default verbosity
+    (the copy has to be next to monkey-generator.py, because it looks for csv/ and features/ relative to itself):
+        git show HEAD~1:monkey-generator/monkey-generator.py > monkey-generator/monkey-generator-before.py
+        {cmd} -b monkey-generator/monkey-generator-before.py -- --all-devices
+
+    to measure with debug logging:
+        {cmd} -- --all-devices -d 3
+''')
+
+
+def print_timings(name, timings):
+    print(f"{name}: min: {min(timings):.3f}s, median: {statistics.median(timings):.3f}s, max: {max(timings):.3f}s ({len(timings)} runs)")
+
+
+def main(argv):
+    try:
+        opts, args = getopt.getopt(argv, 'hn:g:b:', ['help', 'runs=', 'generator=', 'baseline='])
+    except getopt.GetoptError as e:
+        print(e)
+        usage()
+        sys.exit(1)
+    runs = 5
+    generator = GENERATOR
+    baseline = None
+    for opt, arg in opts:
+        if opt == '-h' or opt == '--help':
+            usage()
+            sys.exit(0)
+        if opt == '-n' or opt == '--runs':
+            runs = int(arg)
+        if opt == '-g' or opt == '--generator':
+            generator = arg
+        if opt == '-b' or opt == '--baseline':
+            baseline = arg
+
+    timings = run_generator(generator, args, runs)
+    if baseline:
+        baseline_timings = run_generator(baseline, args, runs)
+        print_timings('before', baseline_timings)
+        print_timings('after', timings)
+        print(f"speedup: {statistics.median(baseline_timings) / statistics.median(timings):.2f}x")
+    else:
+        print_timings(generator, timings)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
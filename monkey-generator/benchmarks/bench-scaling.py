@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+
+import sys
+import os
+import json
+import getopt
+import contextlib
+import shutil
+import statistics
+import tempfile
+
+from _bench import load_module, measure, run_generator
+
+
+BENCHMARKS_DIR = os.path.dirname(os.path.realpath(__file__))
+GENERATOR = os.path.dirname(BENCHMARKS_DIR) + '/monkey-generator.py'
+DEFAULT_SIZES = [10, 100, 1000]
+DEFAULT_FIXTURES_DIR = f"{tempfile.gettempdir()}/monkey-generator-fixtures"
+PHASES = ['full run (cold cache)', 'full run (cached)', 'device load', 'device load (cached)', 'filters', 'features', 'datafield_layout', 'number_font']
+
+
+def usage():
+    cmd = os.path.basename(__file__)
+    print(f'''{cmd} [options]
+Generates fake SDKs with make-fixture-sdk.py with a growing number of devices, and prints the timings of full
+monkey-generator.py runs and of its main phases (device load, filters, features, datafield_layout, number_font)
+for each size, so the regressions and how they scale are visible.
+options:
+    -h|--help
+    -s|--sizes <N,...>              the number of devices, default: {','.join(str(size) for size in DEFAULT_SIZES)}
+    -n|--runs <runs>                number of runs of each measurement, default: 3
+    -g|--generator <generator.py>   the monkey-generator.py to measure, default: {GENERATOR}
+    -d|--fixtures-dir <dir>         where the fixtures are generated (and reused in the next runs), default: {DEFAULT_FIXTURES_DIR}
+    -o|--output <file.json>         save the timings
+    -b|--baseline <file.json>       compare with the timings saved by --output
+
+examples:
+
+    to save the timings before a change and compare them after it:
+        {cmd} -o /tmp/before.json
+        {cmd} -b /tmp/before.json
+''')
+
+
+def get_fixture(make_fixture_sdk, fixtures_dir, size):
+    fixture_dir = f"{fixtures_dir}/{size}"
+    if not os.path.isdir(f"{fixture_dir}/app"):
+        make_fixture_sdk.random.seed(1)
+        make_fixture_sdk.make_fixture(fixture_dir, size, make_fixture_sdk.DEFAULT_LAYOUTS, make_fixture_sdk.DEFAULT_FIELDS)
+    return fixture_dir
+
+
+# loads the generator in this process with the fixture's environment and measures each phase on its own
+def measure_phases(generator_path, env, app_dir, runs):
+    timings = {}
+    os.environ.update(env)
+    cwd = os.getcwd()
+    os.chdir(app_dir)
+    try:
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            generator = load_module('monkey_generator', generator_path)
+            generator.LOG_LEVEL = generator.LOG_LEVEL_ALWAYS
+            generator.init_sdk()
+
+            def reset_devices():
+                generator.DEVICES.clear()
+            generator.USE_CACHE = False
+            timings['device load'] = measure(generator.read_all_devices, runs, reset_devices)
+            generator.USE_CACHE = True
+            generator.read_all_devices()
+            timings['device load (cached)'] = measure(generator.read_all_devices, runs, reset_devices)
+
+            # a full generation sets up the template's features, filters and registered functions for the phases
+            generator.generate(['-a', '--force'], [('-a', ''), ('--force', '')], 'all', 1, True)
+            devices = generator.ALL_DEVICES
+
+            def filters():
+                for dev in devices:
+                    for my_filter in generator.FILTER_CONSTRAINS:
+                        generator.has_feature_by_constraints(dev, generator.FILTER_CONSTRAINS, my_filter)
+            timings['filters'] = measure(filters, runs, generator.reset_constraint_cache)
+
+            def reset_features():
+                generator.reset_constraint_cache()
+                generator.FEATURES_TREE.clear()
+            timings['features'] = measure(lambda: [generator.features(dev) for dev in devices], runs, reset_features)
+
+            def datafield_layout():
+                generator.read_devices_datafield_hash_data(devices)
+                for dev in devices:
+                    generator.datafield_layout(dev)
+            timings['datafield_layout'] = measure(datafield_layout, runs)
+
+            def reset_font_db():
+                generator.FONT_DB = None
+            generator.USE_CACHE = False
+            timings['number_font'] = measure(lambda: [generator.number_font(dev) for dev in devices], runs, reset_font_db)
+    finally:
+        os.chdir(cwd)
+    return timings
+
+
+def format_timing(timings, baseline_timings):
+    median = statistics.median(timings)
+    if baseline_timings:
+        return f"{median:.3f}s ({median / statistics.median(baseline_timings):.2f}x)"
+    return f"{median:.3f}s"
+
+
+def print_table(results, baseline, runs):
+    sizes = list(results)
+    print(f"{f'median of {runs} runs':24}" + ''.join(f"{str(size) + ' devices':>22}" for size in sizes))
+    for phase in PHASES:
+        print(f"{phase:24}" + ''.join(f"{format_timing(results[size][phase], baseline.get(size, {}).get(phase)):>22}" for size in sizes))
+
+
+def main(argv):
+    try:
+        opts, args = getopt.getopt(argv, 'hs:n:g:d:o:b:', ['help', 'sizes=', 'runs=', 'generator=', 'fixtures-dir=', 'output=', 'baseline='])
+    except getopt.GetoptError as e:
+        print(e)
+        usage()
+        sys.exit(1)
+    sizes = DEFAULT_SIZES
+    runs = 3
+    generator = GENERATOR
+    fixtures_dir = DEFAULT_FIXTURES_DIR
+    output = None
+    baseline = {}
+    for opt, arg in opts:
+        if opt == '-h' or opt == '--help':
+            usage()
+            sys.exit(0)
+        if opt == '-s' or opt == '--sizes':
+            sizes = [int(size) for size in arg.split(',')]
+        if opt == '-n' or opt == '--runs':
+            runs = int(arg)
+        if opt == '-g' or opt == '--generator':
+            generator = arg
+        if opt == '-d' or opt == '--fixtures-dir':
+            fixtures_dir = arg
+        if opt == '-o' or opt == '--output':
+            output = arg
+        if opt == '-b' or opt == '--baseline':
+            with open(arg, 'r') as baseline_file:
+                baseline = {int(size): phases for size, phases in json.load(baseline_file).items()}
+
+    make_fixture_sdk = load_module('make_fixture_sdk', f"{BENCHMARKS_DIR}/make-fixture-sdk.py")
+    results = {}
+    for size in sizes:
+        fixture_dir = get_fixture(make_fixture_sdk, fixtures_dir, size)
+        fixture_env = make_fixture_sdk.get_fixture_env(fixture_dir)
+        env = dict(os.environ, **fixture_env)
+        app_dir = f"{fixture_dir}/app"
+        print(f"{size} devices: {fixture_dir}", file=sys.stderr)
+        cache_dir = fixture_env['MONKEY_GENERATOR_CACHE_DIR']
+        results[size] = {
+            'full run (cold cache)': run_generator(generator, ['-a'], runs, app_dir, env, lambda: shutil.rmtree(cache_dir, ignore_errors=True)),
+            'full run (cached)': run_generator(generator, ['-a'], runs, app_dir, env),
+        }
+        results[size].update(measure_phases(generator, fixture_env, app_dir, runs))
+
+    print_table(results, baseline, runs)
+    if output:
+        with open(output, 'w') as output_file:
+            json.dump(results, output_file, indent=1)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
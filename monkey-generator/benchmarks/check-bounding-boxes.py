@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+
+import sys
+import os
+import getopt
+import random
+import time
+
+from _bench import load_module
+
+
+GENERATOR = os.path.dirname(os.path.dirname(os.path.realpath(__file__))) + '/monkey-generator.py'
+OBSCURITIES = {0: [], 1: ['left'], 4: ['right'], 5: ['left', 'right'], 7: ['left', 'top', 'right'], 13: ['left', 'bottom', 'right'],
+    3: ['left', 'top'], 6: ['top', 'right'], 9: ['left', 'bottom'], 12: ['bottom', 'right'], 15: ['left', 'top', 'right', 'bottom']}
+
+
+def usage():
+    cmd = os.path.basename(__file__)
+    print(f'''{cmd} [options]
+Checks that the vectorized (NumPy) bounding box calculation gives the same results as the scalar calculate_bounding_box()
+for all the round devices in $CIQ_SDK_HOME and for random fields, and prints the timings of both.
+options:
+    -h|--help
+    -r|--random <count>     number of random devices with random fields to add, default: 100
+    -s|--seed <seed>        random seed, default: 1
+''')
+
+
+def load_generator():
+    generator = load_module('monkey_generator', GENERATOR)
+    generator.LOG_LEVEL = generator.LOG_LEVEL_ALWAYS
+    generator.init_sdk()
+    return generator
+
+
+def add_random_devices(generator, count):
+    devices = []
+    for i in range(count):
+        dev = f"random{i}"
+        size = random.choice([208, 218, 240, 260, 280, 360, 390, 416, 454])
+        fields = []
+        for j in range(random.randint(1, 20)):
+            obscurity_flags = random.choice(list(OBSCURITIES))
+            x = random.randint(0, size - 1)
+            y = random.randint(0, size - 1)
+            fields.append({
+                'location': {'x': x, 'y': y, 'width': random.randint(1, size - x), 'height': random.randint(1, size - y)},
+                'obscurity': OBSCURITIES[obscurity_flags],
+                'gen': {'short_name': f"{dev}[{j}]"},
+            })
+        generator.DEVICES[dev] = {
+            'dev': dev,
+            'compiler': {'resolution': {'width': size, 'height': size}},
+            'simulator': {'display': {'shape': 'round'}, 'layouts': [{'datafields': {'datafields': [{'name': dev, 'fields': fields}]}}]},
+        }
+        devices.append(dev)
+    return devices
+
+
+def calculate_scalar_bounding_boxes(generator, devices):
+    boxes = {}
+    for dev in devices:
+        device = generator.DEVICES[dev]
+        boxes[dev] = []
+        for layout in device['simulator']['layouts']:
+            for datafield in layout['datafields']['datafields']:
+                for field in datafield['fields']:
+                    try:
+                        boxes[dev].append(generator.calculate_bounding_box(dev, field, device['compiler']['resolution']))
+                    except (ValueError, ZeroDivisionError) as e:
+                        boxes[dev].append(e)
+    return boxes
+
+
+def main(argv):
+    try:
+        opts, args = getopt.getopt(argv, 'hr:s:', ['help', 'random=', 'seed='])
+    except getopt.GetoptError as e:
+        print(e)
+        usage()
+        sys.exit(1)
+    random_devices = 100
+    seed = 1
+    for opt, arg in opts:
+        if opt == '-h' or opt == '--help':
+            usage()
+            sys.exit(0)
+        if opt == '-r' or opt == '--random':
+            random_devices = int(arg)
+        if opt == '-s' or opt == '--seed':
+            seed = int(arg)
+    random.seed(seed)
+
+    generator = load_generator()
+    if generator.np is None:
+        sys.exit('NumPy is not installed')
+    generator.read_all_devices()
+    devices = []
+    for dev in generator.ALL_DEVICES:
+        simulator = generator.DEVICES[dev]['simulator']
+        if 'layouts' in simulator and simulator['display']['shape'] in ['round', 'semi-round', 'semi-octagon']:
+            generator.read_datafield_hash_data(dev)
+            devices.append(dev)
+    devices.extend(add_random_devices(generator, random_devices))
+
+    start = time.perf_counter()
+    scalar_boxes = calculate_scalar_bounding_boxes(generator, devices)
+    scalar_time = time.perf_counter() - start
+    start = time.perf_counter()
+    generator.calculate_fleet_bounding_boxes(devices)
+    vectorized_time = time.perf_counter() - start
+
+    fields = 0
+    fallbacks = 0
+    differences = 0
+    for dev in devices:
+        for scalar_box, vectorized_box in zip(scalar_boxes[dev], generator.PRECALCULATED_BOUNDING_BOXES[dev]):
+            fields += 1
+            if vectorized_box is None:
+                fallbacks += 1
+            elif vectorized_box != scalar_box:
+                differences += 1
+                print(f"{dev}: scalar: {scalar_box}, vectorized: {vectorized_box}")
+    print(f"devices: {len(devices)}, fields: {fields}, scalar fallbacks: {fallbacks}, differences: {differences}")
+    print(f"scalar: {scalar_time:.3f}s, vectorized: {vectorized_time:.3f}s")
+    sys.exit(1 if differences else 0)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+
+import sys
+import os
+import json
+import getopt
+import random
+
+
+def usage():
+    cmd = os.path.basename(__file__)
+    print(f'''{cmd} [options] <dir>
+Generates a fake SDK with synthetic devices and an app that uses it into <dir>, so monkey-generator.py can be measured without a real SDK:
+    <dir>/sdk/Devices/<device>/        compiler.json, simulator.json, <device>.api.debug.xml
+    <dir>/csv/device2min-version.csv
+    <dir>/chars/<device>.chars.json
+    <dir>/app/                         monkey.template.jungle, manifest.xml, source/, resources/, features/
+and prints the environment to run monkey-generator.py in <dir>/app with.
+options:
+    -h|--help
+    -n|--devices <N>                number of devices, default: {DEFAULT_DEVICES}
+    -l|--layouts <N>                number of datafield layouts of each device, default: {DEFAULT_LAYOUTS}
+    -f|--fields <N>                 the layouts have datafields with 1..<N> fields, default: {DEFAULT_FIELDS}
+    -s|--seed <seed>                random seed, default: 1
+    --env                           don't generate anything, only print the environment of the fixture in <dir>
+
+examples:
+
+    to generate 1000 devices and run monkey-generator.py with them:
+        {cmd} -n 1000 /tmp/fixture-1000
+        cd /tmp/fixture-1000/app && env $({cmd} --env /tmp/fixture-1000) {GENERATOR} -a
+''')
+
+
+GENERATOR = os.path.dirname(os.path.dirname(os.path.realpath(__file__))) + '/monkey-generator.py'
+DEFAULT_DEVICES = 100
+DEFAULT_LAYOUTS = 3
+DEFAULT_FIELDS = 4
+
+SHAPES = {'round': [208, 218, 240, 260, 280, 360, 390, 416, 454], 'semi-octagon': [176], 'rectangle': [200, 240, 282]}
+CIQ_VERSIONS = ['3.3.1', '3.4.0', '4.2.0', '5.0.0', '5.2.0']
+MEMORY_LIMITS = [32768, 65536, 131072, 262144]
+LANGS = ['eng', 'deu', 'fre', 'spa', 'zhs']
+FONTS = ['xtiny', 'tiny', 'small', 'medium', 'large', 'numberMild', 'numberMedium', 'numberHot']
+JUSTIFICATIONS = ['center', 'left', 'right', 'vcenter']
+CHARS = ''.join(chr(c) for c in range(32, 127))
+NUMBER_CHARS = ' #%+-./0123456789:°'
+
+TEMPLATE = '''# generated by make-fixture-sdk.py
+project.manifest = manifest.xml
+project.typecheck = 3
+base.sourcePath = source
+base.excludeAnnotations = base
+monkey_generator_filter_device_min_memory = 32768
+monkey_generator_feature_alert_view_has = showAlert
+monkey_generator_feature_cool_min_ciq = 4.0.0
+monkey_generator_feature_touch_json = simulator.display.isTouch
+monkey_generator_feature_vf_has = Graphics.getVectorFont
+monkey_generator_feature_lapkey_key_id = lap
+monkey_generator_feature_sel_key_behavior = onSelect
+monkey_generator_register = languages;number_font;color;datafield_layout;datafield_detector;memory_annotations;ciq_api;features;key_location;analog_hands;shape;resources;source;lang3
+monkey_generator_used_ciq_versions = 3.3.1;4.2.0
+monkey_generator_features_memoryCommon = base;beta
+monkey_generator_features_memory32K = no_gauge
+monkey_generator_features_memory64K = gauge
+'''
+FEATURE_DIRS = ['base/source', 'gauge/source', 'no_gauge/resources', 'alert_view/source', 'touch_AND_gauge/source', 'cool/source']
+
+
+def make_device(i, layouts_count, fields_count):
+    dev = f"dev{i:04d}"
+    shape = random.choice(list(SHAPES))
+    size = random.choice(SHAPES[shape])
+    ciq_version = random.choice(CIQ_VERSIONS)
+    compiler = {
+        'partNumbers': [{'number': f"006-B{i:04d}-00", 'connectIQVersion': ciq_version,
+            'languages': [{'code': lang, 'fontSet': 'ww'} for lang in random.sample(LANGS, random.randint(1, len(LANGS)))]}],
+        'appTypes': [{'type': 'datafield', 'memoryLimit': random.choice(MEMORY_LIMITS)}, {'type': 'watchApp', 'memoryLimit': 131072},
+            {'type': 'background', 'memoryLimit': 32768}],
+        'bitsPerPixel': random.choice([1, 8, 16]), 'displayType': random.choice(['mip', 'amoled']),
+        'deviceFamily': f"{shape}-{size}x{size}", 'resolution': {'width': size, 'height': size},
+    }
+    if i % 2:
+        compiler['palette'] = {'colors': [f"{c:06X}" for c in range(64)]}
+    has_ttf = i % 3 == 0
+    fonts = [{'filename': f"FNT_{font.upper()}", 'name': font, 'size': 10 + j} for j, font in enumerate(FONTS)]
+    if has_ttf:
+        fonts.append({'filename': 'RobotoCondensed-Bold', 'name': 'simExtNumber1', 'size': 20, 'type': 'ttf'})
+    label_fonts = FONTS[:3] + ['simExtNumber1' if has_ttf else 'medium']
+    layouts = []
+    for l in range(layouts_count):
+        datafields = []
+        for n in range(1, fields_count + 1):
+            fields = []
+            height = size // n
+            for k in range(n):
+                obscurity = []
+                if shape != 'rectangle':
+                    obscurity = ['left', 'right'] + (['top'] if k == 0 else []) + (['bottom'] if k == n - 1 else [])
+                fields.append({'location': {'x': 0, 'y': k * height, 'width': size, 'height': height}, 'obscurity': obscurity, 'labelDisabled': False,
+                    'label': {'font': label_fonts[(n + l) % 4], 'x': size // 2 + random.choice([0, 0, 1]), 'y': 2 + l, 'justification': JUSTIFICATIONS[(n + l) % 4]},
+                    'data': {'x': size // 2, 'y': height // 2 + random.choice([0, 0, 2, 5]), 'justification': JUSTIFICATIONS[(n + l) % 4]}})
+            datafields.append({'name': f"Layout {l} Fields {n}", 'fields': fields})
+        layouts.append({'controlBar': {'height': 5}, 'datafields': {'datafields': datafields}})
+    simulator = {
+        'fonts': [{'fontSet': 'ww', 'fonts': fonts}],
+        'display': {'shape': shape, 'location': {'x': 10, 'y': 10, 'width': size, 'height': size}, 'isTouch': i % 2 == 0},
+        'layouts': layouts, 'ppi': 200 + i % 100,
+        'keys': [{'id': 'enter', 'behavior': 'onSelect', 'location': {'x': size, 'y': 40, 'width': 10, 'height': 30}},
+            {'id': 'lap', 'location': {'x': 0, 'y': 80, 'width': 10, 'height': 30}}],
+    }
+    if i % 2:
+        simulator['analogHands'] = {'baseRadius': 5}
+    api_debug_xml = ['<debug>']
+    if has_ttf:
+        api_debug_xml.append('<entry name="getVectorFont" parent="Graphics"/>')
+    api_debug_xml.append('<entry name="compareTo" parent="String"/>\n<entry symbol="getBodyBatteryHistory"/>' if i % 2 == 0 else '<entry symbol="showAlert"/>')
+    api_debug_xml.append('</debug>')
+    # some devices miss a few chars, so the number fonts' common chars differ
+    font_chars = {f"FNT_{font.upper()}": NUMBER_CHARS if font.startswith('number') else CHARS[:len(CHARS) - i % 7] for font in FONTS}
+    chars = {'devices': {dev: {'fontSets': {'ww': {f"FONT_{font.upper()}": f"FNT_{font.upper()}" for font in FONTS}}}}, 'fonts': font_chars}
+    return dev, ciq_version, compiler, simulator, '\n'.join(api_debug_xml) + '\n', chars
+
+
+def write_json(path, obj):
+    with open(path, 'w') as file:
+        json.dump(obj, file, indent=1)
+
+
+def make_fixture(fixture_dir, devices_count, layouts_count, fields_count):
+    for sub_dir in ['sdk/Devices', 'csv', 'chars', 'app/source', 'app/resources', 'app/resources-deu']:
+        os.makedirs(f"{fixture_dir}/{sub_dir}", exist_ok=True)
+    min_versions = []
+    products = []
+    for i in range(devices_count):
+        dev, ciq_version, compiler, simulator, api_debug_xml, chars = make_device(i, layouts_count, fields_count)
+        device_dir = f"{fixture_dir}/sdk/Devices/{dev}"
+        os.makedirs(device_dir, exist_ok=True)
+        write_json(f"{device_dir}/compiler.json", compiler)
+        write_json(f"{device_dir}/simulator.json", simulator)
+        with open(f"{device_dir}/{dev}.api.debug.xml", 'w') as file:
+            file.write(api_debug_xml)
+        write_json(f"{fixture_dir}/chars/{dev}.chars.json", chars)
+        min_versions.append(f"{dev}:{ciq_version}\n")
+        if i % 2 == 0:
+            products.append(f'            <iq:product id="{dev}"/>\n')
+    with open(f"{fixture_dir}/csv/device2min-version.csv", 'w') as file:
+        file.writelines(min_versions)
+
+    app_dir = f"{fixture_dir}/app"
+    with open(f"{app_dir}/monkey.template.jungle", 'w') as file:
+        file.write(TEMPLATE)
+    with open(f"{app_dir}/manifest.xml", 'w') as file:
+        file.write('<?xml version="1.0"?>\n<iq:manifest version="3" xmlns:iq="http://www.garmin.com/xml/connectiq">\n'
+            '    <iq:application id="fixture" type="datafield" name="@Strings.AppName" minApiLevel="3.0.0">\n        <iq:products>\n'
+            f"{''.join(products)}        </iq:products>\n        <iq:languages>\n"
+            '            <iq:language>eng</iq:language>\n            <iq:language>deu</iq:language>\n'
+            '        </iq:languages>\n    </iq:application>\n</iq:manifest>\n')
+    for feature_dir in FEATURE_DIRS:
+        os.makedirs(f"{app_dir}/features/{feature_dir}", exist_ok=True)
+
+
+# the environment that makes monkey-generator.py use the fixture
+def get_fixture_env(fixture_dir):
+    fixture_dir = os.path.abspath(fixture_dir)
+    return {
+        'CIQ_SDK_HOME': f"{fixture_dir}/sdk",
+        'MONKEY_GENERATOR_CSV_DIR': f"{fixture_dir}/csv",
+        'MONKEY_GENERATOR_CHARS_DIR': f"{fixture_dir}/chars",
+        'MONKEY_GENERATOR_CACHE_DIR': f"{fixture_dir}/cache",
+    }
+
+
+def main(argv):
+    try:
+        opts, args = getopt.getopt(argv, 'hn:l:f:s:', ['help', 'devices=', 'layouts=', 'fields=', 'seed=', 'env'])
+    except getopt.GetoptError as e:
+        print(e)
+        usage()
+        sys.exit(1)
+    devices_count = DEFAULT_DEVICES
+    layouts_count = DEFAULT_LAYOUTS
+    fields_count = DEFAULT_FIELDS
+    seed = 1
+    env_only = False
+    for opt, arg in opts:
+        if opt == '-h' or opt == '--help':
+            usage()
+            sys.exit(0)
+        if opt == '-n' or opt == '--devices':
+            devices_count = int(arg)
+        if opt == '-l' or opt == '--layouts':
+            layouts_count = int(arg)
+        if opt == '-f' or opt == '--fields':
+            fields_count = int(arg)
+        if opt == '-s' or opt == '--seed':
+            seed = int(arg)
+        if opt == '--env':
+            env_only = True
+    if len(args) != 1:
+        usage()
+        sys.exit(1)
+
+    if not env_only:
+        random.seed(seed)
+        make_fixture(args[0], devices_count, layouts_count, fields_count)
+    print(' '.join(f"{key}={val}" for key, val in get_fixture_env(args[0]).items()))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -12,29 +12,47 @@ import datetime
 import getopt
 import shutil
 from enum import IntEnum
-from inspect import getframeinfo, stack
 import uuid
 # from packaging import version
 import numbers
+import pickle
+import hashlib
+import multiprocessing
+import io
+import time
+import builtins
+import threading
+import traceback
+from contextlib import contextmanager
+from types import MappingProxyType
+from collections.abc import Mapping
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 LOG_LINE_NUMBER = False
 LOG_LEVEL = -1
 USE_MODULES = False
 
-# def get_caller(nth_caller = 1):
-#     return getframeinfo(stack()[nth_caller][0])
+def get_caller_prefix(nth_caller = 1):
+    # sys._getframe is much cheaper than inspect.stack(), because it doesn't read the source files
+    caller = sys._getframe(nth_caller + 1)
+    return f"{caller.f_code.co_filename}:{caller.f_lineno}: "
 
-def log(log_level, min_level, msg, nth_caller = 1):
-    if log_level < 0:
-        caller = getframeinfo(stack()[nth_caller][0])
-        prefix = f"{caller.filename}:{caller.lineno}: "
-        print(f"{COLOR_RED}{prefix}ERROR: log_level: {log_level}{COLOR_RESET}")
+def format_log_msg(msg, args):
+    if callable(msg):
+        msg = msg()
+    return msg % args if args else msg
+
+# msg can be a string (with %-style args) or a function that returns the string,
+# so when the level is not logged it costs only the comparison, and the message isn't formatted
+def log(log_level, min_level, msg, *args, nth_caller = 1):
     if log_level >= min_level:
-        prefix = ''
-        if (LOG_LINE_NUMBER):
-            caller = getframeinfo(stack()[nth_caller][0])
-            prefix = f"{caller.filename}:{caller.lineno}: "
-        print(f"{prefix}{msg}")
+        prefix = get_caller_prefix(nth_caller) if LOG_LINE_NUMBER else ''
+        print(f"{prefix}{format_log_msg(msg, args)}")
+    elif log_level < 0:
+        print(f"{COLOR_RED}{get_caller_prefix(nth_caller)}ERROR: log_level: {log_level}{COLOR_RESET}")
 
 LOG_LEVEL_ALWAYS = 0
 LOG_LEVEL_BASIC = 1
@@ -43,16 +61,14 @@ LOG_LEVEL_PARSING = 3
 LOG_LEVEL_INPUT = 4
 LOG_LEVEL_DEBUG = 10
 
-CIQ_SDK_HOME = os.environ.get('CIQ_SDK_HOME')
-if not CIQ_SDK_HOME:
-    CIQ_SDK_HOME = f"{os.environ.get('HOME')}/Library/Application Support/Garmin/ConnectIQ"
-if not os.path.isdir(CIQ_SDK_HOME):
-    sys.exit(f"Missing CIQ SDK: {CIQ_SDK_HOME}")
+# set by init_sdk()
+CIQ_SDK_HOME = None
+SDK_DEVICES_DIR = None
+ALL_DEVICES = []
 
-CSV_DIR = os.path.dirname(os.path.dirname(os.path.realpath(__file__))) + '/csv'
+# csv/ can be overridden, i.e: by the fixtures of benchmarks/make-fixture-sdk.py
+CSV_DIR = os.environ.get('MONKEY_GENERATOR_CSV_DIR') or os.path.dirname(os.path.dirname(os.path.realpath(__file__))) + '/csv'
 DEVICE_2_MIN_VERSION_CSV = f"{CSV_DIR}/device2min-version.csv"
-if not os.path.exists(DEVICE_2_MIN_VERSION_CSV):
-    sys.exit(f"Missing: {DEVICE_2_MIN_VERSION_CSV}")
 
 FEATURES_SRC_DIR = os.path.dirname(os.path.realpath(__file__)) + '/features'
 GENERATED_DIR = 'gen'
@@ -68,19 +84,20 @@ MONKEY_GENERATOR_REPLACE = {}
 MONKEY_GENERATOR_CONF = {}
 
 MANIFEST='manifest.xml'
+# --matrix: the directory of each (LANG, ENV) variant
+DEFAULT_MATRIX_OUTPUT_DIR = 'matrix/{ENV}/{LANG}'
 
 GENERATROR_SIGNATURE=f"https://github.com/flocsy/garmin-dev-tools/tree/main/monkey-generator/ © by flocsy"
 COLOR_RED = '\033[91m'
 COLOR_YELLOW = '\033[93m'
 COLOR_RESET = '\033[00m'
 
-SDK_DEVICES_DIR = f"{CIQ_SDK_HOME}/Devices"
-# ALL_DEVICES = os.listdir(f"{SDK_DEVICES_DIR}")
-# ALL_DEVICES = filter(lambda d: not d.startswith('.'), os.listdir(f"{SDK_DEVICES_DIR}"))
-ALL_DEVICES = [d for d in os.listdir(f"{SDK_DEVICES_DIR}") if not d.startswith('.')]
-
-ALL_DEVICES.sort()
-# log(LOG_LEVEL, LOG_LEVEL_BASIC, f"{ALL_DEVICES}")
+CACHE_DIR = os.environ.get('MONKEY_GENERATOR_CACHE_DIR') or f"{os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache')}/monkey-generator"
+# bump when the structure of the cached device dict / api index changes
+DEVICES_CACHE_VERSION = 1
+API_INDEX_CACHE_VERSION = 1
+FONT_DB_CACHE_VERSION = 1
+USE_CACHE = True
 
 NS = {'iq': 'http://www.garmin.com/xml/connectiq'}
 
@@ -112,21 +129,179 @@ def read_device_2_min_version_csv():
         for line in csv:
             dev, min_versions = line.strip().split(':')
             DEVICE_MIN_VERSION[dev] = min_versions
-read_device_2_min_version_csv()
-
-MULTI_FEATURE_DIR_SEPARATOR = '_AND_'
 
-def print_error_log(log_level, min_level, msg, nth_caller = 2):
-    log(log_level, min_level, f"{COLOR_RED}{msg}{COLOR_RESET}", nth_caller)
+# reads the list of devices from the SDK (by default from $CIQ_SDK_HOME) and forgets everything read from the previous one
+def init_sdk(ciq_sdk_home = None):
+    global CIQ_SDK_HOME, SDK_DEVICES_DIR, ALL_DEVICES, DEVICES, DEVICE_MIN_VERSION, FONT_DB, API_INDEX, FONT_TO_MC_FONT_CACHE
+    if not ciq_sdk_home:
+        ciq_sdk_home = os.environ.get('CIQ_SDK_HOME')
+    if not ciq_sdk_home:
+        ciq_sdk_home = f"{os.environ.get('HOME')}/Library/Application Support/Garmin/ConnectIQ"
+    if not os.path.isdir(ciq_sdk_home):
+        sys.exit(f"Missing CIQ SDK: {ciq_sdk_home}")
+    if not os.path.exists(DEVICE_2_MIN_VERSION_CSV):
+        sys.exit(f"Missing: {DEVICE_2_MIN_VERSION_CSV}")
+    CIQ_SDK_HOME = ciq_sdk_home
+    SDK_DEVICES_DIR = f"{CIQ_SDK_HOME}/Devices"
+    ALL_DEVICES = sorted(d for d in os.listdir(SDK_DEVICES_DIR) if not d.startswith('.'))
+    # new dicts instead of clearing the old ones, so the globals that were saved before (i.e: by DeviceDatabase) are kept
+    DEVICE_MIN_VERSION = {}
+    read_device_2_min_version_csv()
+    DEVICES = {}
+    FONT_DB = None
+    API_INDEX = None
+    FONT_TO_MC_FONT_CACHE = {}
 
-def print_error(msg):
-    print_error_log(LOG_LEVEL, LOG_LEVEL_ALWAYS, msg, nth_caller = 3)
+MULTI_FEATURE_DIR_SEPARATOR = '_AND_'
 
-def print_warn_log(log_level, min_level, msg, nth_caller = 2):
-    log(log_level, min_level, f"{COLOR_YELLOW}{msg}{COLOR_RESET}", nth_caller)
+# the warnings and errors that are always printed are counted, so a skipped generation can report them
+def print_error_log(log_level, min_level, msg, *args, nth_caller = 2):
+    if min_level <= LOG_LEVEL_ALWAYS:
+        GENERATED_FILES_STATS['errors'] += 1
+    log(log_level, min_level, lambda: f"{COLOR_RED}{format_log_msg(msg, args)}{COLOR_RESET}", nth_caller = nth_caller)
+
+def print_error(msg, *args):
+    print_error_log(LOG_LEVEL, LOG_LEVEL_ALWAYS, msg, *args, nth_caller = 3)
+
+def print_warn_log(log_level, min_level, msg, *args, nth_caller = 2):
+    if min_level <= LOG_LEVEL_ALWAYS:
+        GENERATED_FILES_STATS['warnings'] += 1
+    log(log_level, min_level, lambda: f"{COLOR_YELLOW}{format_log_msg(msg, args)}{COLOR_RESET}", nth_caller = nth_caller)
+
+def print_warn(msg, *args):
+    print_warn_log(LOG_LEVEL, LOG_LEVEL_ALWAYS, msg, *args, nth_caller = 3)
+
+GENERATED_FILES_STATS = {'written': 0, 'skipped': 0, 'warnings': 0, 'errors': 0}
+
+def without_signature(content):
+    return [line for line in content.splitlines() if GENERATROR_SIGNATURE not in line]
+
+# buffers the generated content and only replaces the file (atomically) when it changed, ignoring the signature line,
+# so the mtime of unchanged files is kept and the compiler doesn't have to reprocess them
+@contextmanager
+def open_generated(path):
+    buffer = io.StringIO()
+    yield buffer
+    content = buffer.getvalue()
+    if os.path.exists(path):
+        with open(path, 'r') as old_file:
+            if without_signature(old_file.read()) == without_signature(content):
+                GENERATED_FILES_STATS['skipped'] += 1
+                log(LOG_LEVEL, LOG_LEVEL_DEBUG, f"unchanged: {path}")
+                return
+    tmp_file = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_file, 'w') as output:
+        output.write(content)
+    os.replace(tmp_file, path)
+    GENERATED_FILES_STATS['written'] += 1
+    log(LOG_LEVEL, LOG_LEVEL_DEBUG, f"written: {path}")
+
+# --timings: {'phases': {name: [wall, cpu, calls]}, 'functions': {registered function: [wall, cpu, calls]} summed across the devices,
+# 'devices': {dev: wall of its registered functions}, 'counters': {...}}, None when it's not enabled
+TIMINGS = None
+TIMINGS_COUNTERS = ['file_reads', 'stat_calls', 'has_method_lookups']
+# the builtins.open and os.stat that enable_timings() replaced, disable_timings() puts them back
+TIMINGS_REPLACED = None
+SLOWEST_DEVICES_COUNT = 10
+
+def new_timings():
+    return {'phases': {}, 'functions': {}, 'devices': {}, 'counters': {counter: 0 for counter in TIMINGS_COUNTERS}}
+
+def add_timing(timings, name, wall, cpu):
+    if name not in timings:
+        timings[name] = [0.0, 0.0, 0]
+    timing = timings[name]
+    timing[0] += wall
+    timing[1] += cpu
+    timing[2] += 1
+
+# the timings of a worker process are returned to the main process and added to its own
+def merge_timings(timings):
+    for group in ['phases', 'functions']:
+        for name, (wall, cpu, calls) in timings[group].items():
+            add_timing(TIMINGS[group], name, wall, cpu)
+            TIMINGS[group][name][2] += calls - 1
+    for dev, wall in timings['devices'].items():
+        TIMINGS['devices'][dev] = TIMINGS['devices'].get(dev, 0.0) + wall
+    for counter, count in timings['counters'].items():
+        TIMINGS['counters'][counter] += count
+
+@contextmanager
+def timed(phase):
+    if TIMINGS is None:
+        yield
+        return
+    wall = time.perf_counter()
+    cpu = time.process_time()
+    try:
+        yield
+    finally:
+        add_timing(TIMINGS['phases'], phase, time.perf_counter() - wall, time.process_time() - cpu)
+
+def timed_phase(func):
+    def timed_func(*args, **kwargs):
+        if TIMINGS is None:
+            return func(*args, **kwargs)
+        with timed(func.__name__):
+            return func(*args, **kwargs)
+    timed_func.__name__ = func.__name__
+    return timed_func
+
+# calls a registered function for a device with --timings
+def timed_call(func, dev):
+    wall = time.perf_counter()
+    cpu = time.process_time()
+    result = func(dev)
+    wall = time.perf_counter() - wall
+    add_timing(TIMINGS['functions'], func.__name__, wall, time.process_time() - cpu)
+    TIMINGS['devices'][dev] = TIMINGS['devices'].get(dev, 0.0) + wall
+    return result
 
-def print_warn(msg):
-    print_warn_log(LOG_LEVEL, LOG_LEVEL_ALWAYS, msg, nth_caller = 3)
+# counts the files opened for reading and the stat calls (os.path.exists, isdir, isfile... call os.stat) while --timings is enabled
+def enable_timings():
+    global TIMINGS, TIMINGS_REPLACED
+    TIMINGS = new_timings()
+    real_open = builtins.open
+    real_stat = os.stat
+    TIMINGS_REPLACED = (real_open, real_stat)
+    def counting_open(file, mode = 'r', *args, **kwargs):
+        if 'r' in mode and '+' not in mode:
+            TIMINGS['counters']['file_reads'] += 1
+        return real_open(file, mode, *args, **kwargs)
+    def counting_stat(*args, **kwargs):
+        TIMINGS['counters']['stat_calls'] += 1
+        return real_stat(*args, **kwargs)
+    builtins.open = counting_open
+    os.stat = counting_stat
+
+def disable_timings():
+    global TIMINGS, TIMINGS_REPLACED
+    if TIMINGS_REPLACED:
+        builtins.open, os.stat = TIMINGS_REPLACED
+        TIMINGS_REPLACED = None
+    TIMINGS = None
+
+def format_timing(name, timing):
+    wall, cpu, calls = timing
+    return f"{name}: wall: {wall:.3f}s, cpu: {cpu:.3f}s, calls: {calls}"
+
+def report_timings(timings_file):
+    for group in ['phases', 'functions']:
+        for name, timing in sorted(TIMINGS[group].items(), key=lambda item: -item[1][0]):
+            log(LOG_LEVEL, LOG_LEVEL_ALWAYS, f"timings: {group[:-1]}: {format_timing(name, timing)}")
+    slowest_devices = sorted(TIMINGS['devices'].items(), key=lambda item: -item[1])[:SLOWEST_DEVICES_COUNT]
+    log(LOG_LEVEL, LOG_LEVEL_ALWAYS, f"timings: slowest devices: {', '.join(f'{dev}: {wall:.3f}s' for dev, wall in slowest_devices)}")
+    log(LOG_LEVEL, LOG_LEVEL_ALWAYS, f"timings: counters: {', '.join(f'{counter}: {count}' for counter, count in TIMINGS['counters'].items())}")
+    if timings_file:
+        report = {
+            'phases': {name: {'wall': wall, 'cpu': cpu, 'calls': calls} for name, (wall, cpu, calls) in TIMINGS['phases'].items()},
+            'functions': {name: {'wall': wall, 'cpu': cpu, 'calls': calls} for name, (wall, cpu, calls) in TIMINGS['functions'].items()},
+            'slowest_devices': dict(slowest_devices),
+            'counters': TIMINGS['counters'],
+        }
+        with open(timings_file, 'w') as file:
+            json.dump(report, file, indent=1)
+            file.write('\n')
 
 def get_languages(device):
     langs = set()
@@ -157,35 +332,102 @@ def get_ciq_apis(device):
     return maxCiqVersions
 
 
+def get_cache_file(name):
+    sdk_hash = hashlib.sha1(os.path.realpath(SDK_DEVICES_DIR).encode()).hexdigest()[:16]
+    return f"{CACHE_DIR}/{name}-{sdk_hash}.pickle"
+
+def get_file_signature(path):
+    stat = os.stat(path)
+    return (path, stat.st_mtime_ns, stat.st_size)
+
+def get_device_signature(dev):
+    signature = [DEVICE_MIN_VERSION.get(dev)]
+    for file_name in ['compiler.json', 'simulator.json']:
+        signature.append(get_file_signature(f"{SDK_DEVICES_DIR}/{dev}/{file_name}"))
+    return tuple(signature)
+
+def read_cache(name, version):
+    if not USE_CACHE:
+        return {}
+    cache_file = get_cache_file(name)
+    if not os.path.exists(cache_file):
+        return {}
+    try:
+        with open(cache_file, 'rb') as cache:
+            snapshot = pickle.load(cache)
+    except Exception as e:
+        print_warn(f"ignoring unreadable {name} cache: {cache_file}: {e}")
+        return {}
+    if not isinstance(snapshot, dict) or snapshot.get('version') != version:
+        log(LOG_LEVEL, LOG_LEVEL_BASIC, f"ignoring {name} cache with old version: {cache_file}")
+        return {}
+    return snapshot['entries']
+
+def write_cache(name, version, entries):
+    if not USE_CACHE:
+        return
+    cache_file = get_cache_file(name)
+    tmp_file = f"{cache_file}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(CACHE_DIR, 0o755, True)
+        with open(tmp_file, 'wb') as cache:
+            pickle.dump({'version': version, 'entries': entries}, cache, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_file, cache_file)
+    except OSError as e:
+        print_warn(f"couldn't write {name} cache: {cache_file}: {e}")
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+
+def read_device(dev):
+    device = {'dev': dev}
+    with open(f"{SDK_DEVICES_DIR}/{dev}/compiler.json") as compiler_json:
+        device['compiler'] = json.load(compiler_json)
+    with open(f"{SDK_DEVICES_DIR}/{dev}/simulator.json") as simulator_json:
+        device['simulator'] = json.load(simulator_json)
+    device['languages'] = get_languages(device)
+    maxCiqVersions = get_ciq_apis(device)
+    device['minVersion'] = maxCiqVersions[0]
+    if DEVICE_MIN_VERSION[dev] < maxCiqVersions[0]:
+        log(LOG_LEVEL, LOG_LEVEL_DEBUG, f"{dev}: compiler: {maxCiqVersions[0]} > csv: {DEVICE_MIN_VERSION[dev]}")
+    else:
+        log(LOG_LEVEL, LOG_LEVEL_DEBUG, f"{dev}: compiler: {maxCiqVersions[0]}, csv: {DEVICE_MIN_VERSION[dev]}")
+        device['minVersion'] = DEVICE_MIN_VERSION[dev]
+    if device['minVersion'] is None:
+        print_error(f"{dev}: missing from DEVICE_MIN_VERSION")
+    device['memory'] = {}
+    for app_type in device['compiler']['appTypes']:
+        device['memory'][app_type['type']] = app_type['memoryLimit']
+    # log(LOG_LEVEL, LOG_LEVEL_BASIC, f"{dev}: {device['memory']}")
+    return device
+
+# The parsed and derived devices are kept in a snapshot in CACHE_DIR, so an unchanged SDK is loaded with a single read,
+# and only the devices whose compiler.json or simulator.json changed (or their min version in the csv) are parsed again.
+@timed_phase
 def read_all_devices():
     global DEVICES, CIQ_VERSIONS
+    cached_entries = read_cache('devices', DEVICES_CACHE_VERSION)
+    entries = {}
+    parsed_devices = []
     for dev in ALL_DEVICES:
-        device = {'dev': dev}
-        with open(f"{SDK_DEVICES_DIR}/{dev}/compiler.json") as compiler_json:
-            device['compiler'] = json.load(compiler_json)
-        with open(f"{SDK_DEVICES_DIR}/{dev}/simulator.json") as simulator_json:
-            device['simulator'] = json.load(simulator_json)
-        device['languages'] = get_languages(device)
-        maxCiqVersions = get_ciq_apis(device)
-        CIQ_VERSIONS.update(maxCiqVersions)
-        device['minVersion'] = maxCiqVersions[0]
-        if DEVICE_MIN_VERSION[dev] < maxCiqVersions[0]:
-            log(LOG_LEVEL, LOG_LEVEL_DEBUG, f"{dev}: compiler: {maxCiqVersions[0]} > csv: {DEVICE_MIN_VERSION[dev]}")
-            DEVICE_MIN_VERSION[dev] = maxCiqVersions[0]
-        else:
-            log(LOG_LEVEL, LOG_LEVEL_DEBUG, f"{dev}: compiler: {maxCiqVersions[0]}, csv: {DEVICE_MIN_VERSION[dev]}")
-        device['minVersion'] = DEVICE_MIN_VERSION[dev]
-        if device['minVersion'] is None:
-            print_error(f"{dev}: missing from DEVICE_MIN_VERSION")
-        device['memory'] = {}
-        for app_type in device['compiler']['appTypes']:
-            device['memory'][app_type['type']] = app_type['memoryLimit']
-        # log(LOG_LEVEL, LOG_LEVEL_BASIC, f"{dev}: {device['memory']}")
+        signature = get_device_signature(dev)
+        entry = cached_entries.get(dev)
+        if entry is None or entry['signature'] != signature:
+            entry = {'signature': signature, 'device': read_device(dev)}
+            parsed_devices.append(dev)
+        entries[dev] = entry
+        device = entry['device']
+        DEVICE_MIN_VERSION[dev] = device['minVersion']
         DEVICES[dev] = device
         # log(LOG_LEVEL, LOG_LEVEL_BASIC, device)
-    CIQ_VERSIONS = sorted(list(set(DEVICE_MIN_VERSION.values())), key=natural_sort_key)
+    if parsed_devices or len(entries) != len(cached_entries):
+        write_cache('devices', DEVICES_CACHE_VERSION, entries)
+    log(LOG_LEVEL, LOG_LEVEL_BASIC, f"devices: {len(ALL_DEVICES) - len(parsed_devices)} from cache, parsed: {parsed_devices}")
+    CIQ_VERSIONS = get_device_min_ciq_versions()
     log(LOG_LEVEL, LOG_LEVEL_BASIC, f"device min CIQ versions: {CIQ_VERSIONS}")
 
+def get_device_min_ciq_versions():
+    return sorted(list(set(DEVICE_MIN_VERSION.values())), key=natural_sort_key)
+
 
 def camel_case(s):
     s = re.sub(r"(_|-)+", " ", s).title().replace(" ", "")
@@ -199,6 +441,7 @@ def device_has_app_type(device, app_type):
     return False
 
 
+@timed_phase
 def parse_manifest(manifest):
     global APP_TYPE, MIN_API_LEVEL, MANIFEST_DEVICES, MANIFEST_LANGS, IS_BETA, MISSING_DEVICES
     IS_BETA = '-prod' not in manifest and ('ENV' not in MONKEY_GENERATOR_REPLACE or MONKEY_GENERATOR_REPLACE['ENV'] == 'beta')
@@ -296,7 +539,7 @@ def splitAndAppendIfNotContains(array, csv, separator):
             array.append(item)
 
 def usage():
-    print("Usage: monkey-generator.py [-h | --help] [-j <monkey.jungle> | --jungle=<monkey.jungle>] [-t <template> | --template=<template>] [-c | --clean] [-a | --all-devices] [-d <debug-level> | --debug=<debug-level> | -v | --verbose]")
+    print("Usage: monkey-generator.py [-h | --help] [-j <monkey.jungle> | --jungle=<monkey.jungle>] [-t <template> | --template=<template>] [-c | --clean] [-a | --all-devices] [-d <debug-level> | --debug=<debug-level> | -v | --verbose] [--no-cache] [--jobs=<N>] [--force] [--batch <app dir>... | --batch-root=<dir>] [--matrix] [--timings] [--timings-file=<file.json>] [--watch]")
 
 def parse_memory_sizes():
     global MEMORY_2_K, MEMORY_ORDER
@@ -363,7 +606,7 @@ def generate_manifest():
         manifest_id = manifest_id_map[lang][env]
     log(LOG_LEVEL, LOG_LEVEL_BASIC, f"generating {MANIFEST} with id: {manifest_id}")
     with open(MONKEY_GENERATOR_CONF['manifest_xml_template'], 'r') as manifest_template:
-        with open(MANIFEST, 'w') as manifest:
+        with open_generated(MANIFEST) as manifest:
             for line in manifest_template:
                 if 'iq:application' in line and ' id="' in line:
                     line = re.sub(r' id="([^"]+)"', ' id="%s"' % manifest_id, line)
@@ -401,12 +644,105 @@ def parse_monkey_generator_conf():
         log(LOG_LEVEL, LOG_LEVEL_BASIC, f"MONKEY_GENERATOR_REPLACE: {MONKEY_GENERATOR_REPLACE}")
 
 
+def get_fingerprint_file():
+    jungle_dir, jungle_file = os.path.split(MONKEY_JUNGLE)
+    return os.path.join(jungle_dir, f".{jungle_file}.fingerprint")
+
+def update_fingerprint_with_file(fingerprint, path):
+    fingerprint.update(f"{path}\0".encode())
+    if os.path.isfile(path):
+        with open(path, 'rb') as file:
+            fingerprint.update(hashlib.sha1(file.read()).digest())
+
+def update_fingerprint_with_stat(fingerprint, path):
+    if os.path.exists(path):
+        stat = os.stat(path)
+        fingerprint.update(f"{path}:{stat.st_mtime_ns}:{stat.st_size}\0".encode())
+    else:
+        fingerprint.update(f"{path}:-\0".encode())
+
+def update_fingerprint_with_tree(fingerprint, top_dir):
+    for root, dirs, files in os.walk(top_dir):
+        dirs.sort()
+        for file in sorted(files):
+            update_fingerprint_with_stat(fingerprint, os.path.join(root, file))
+        fingerprint.update(f"{root}/\0".encode())
+
+# the options that don't change what's generated aren't part of the fingerprint
+FINGERPRINT_IGNORED_OPTIONS = ['--force', '--timings', '--timings-file', '--jobs', '-d', '--debug', '-v', '--verbose', '-l', '--log-line-number']
+
+def get_fingerprint_args(argv):
+    opts, args = getopt.getopt(argv, SHORT_OPTIONS, LONG_OPTIONS)
+    return [f"{opt}={arg}" if arg else opt for opt, arg in opts if opt not in FINGERPRINT_IGNORED_OPTIONS] + args
+
+# hash of everything the generator reads (and the files it generated), so an unchanged project can skip the generation
+def get_fingerprint(argv):
+    fingerprint = hashlib.sha1()
+    fingerprint.update(' '.join(get_fingerprint_args(argv)).encode())
+    update_fingerprint_with_stat(fingerprint, os.path.realpath(__file__))
+    for file in [TEMPLATE, MONKEY_JUNGLE, MONKEY_GENERATOR_CONF_FILE, get_conf('manifest_xml_template'), get_conf('manifest_id_map')]:
+        if file:
+            update_fingerprint_with_file(fingerprint, file)
+    for file in sorted(os.listdir('.')):
+        if file.startswith('manifest') and file.endswith('.xml'):
+            update_fingerprint_with_file(fingerprint, file)
+    update_fingerprint_with_file(fingerprint, DEVICE_2_MIN_VERSION_CSV)
+    update_fingerprint_with_tree(fingerprint, FONTS_JSON_DIR)
+    update_fingerprint_with_tree(fingerprint, FEATURES_SRC_DIR)
+    for dev in ALL_DEVICES:
+        for file in ['compiler.json', 'simulator.json', f"{dev}.api.debug.xml"]:
+            update_fingerprint_with_stat(fingerprint, f"{SDK_DEVICES_DIR}/{dev}/{file}")
+    for base_dir in get_base_dirs():
+        fingerprint.update(f"{base_dir}:{sorted([file for file in os.listdir(base_dir if base_dir else '.') if not file.startswith('.')])}\0".encode())
+        update_fingerprint_with_tree(fingerprint, f"{base_dir}features")
+        update_fingerprint_with_tree(fingerprint, f"{base_dir}{GENERATED_DIR}")
+    # has_directory() looks for the sub directories of these in the app's directory (i.e: source-features/color_depth/<N>bpp)
+    update_fingerprint_with_tree(fingerprint, SOURCE_FEATURES_DIR)
+    update_fingerprint_with_tree(fingerprint, RESOURCES_FEATURES_DIR)
+    return fingerprint.hexdigest()
+
+# returns the fingerprint file ({'fingerprint': ..., 'warnings': N, 'errors': N}) when the fingerprint didn't change, otherwise None
+def get_unchanged_fingerprint(argv):
+    fingerprint_file = get_fingerprint_file()
+    if not os.path.exists(MONKEY_JUNGLE) or not os.path.exists(fingerprint_file):
+        return None
+    try:
+        with open(fingerprint_file, 'r') as file:
+            stored = json.load(file)
+    except ValueError:
+        # i.e: the fingerprint file of an older version
+        return None
+    if not isinstance(stored, dict) or stored.get('fingerprint') != get_fingerprint(argv):
+        return None
+    return stored
+
+def write_fingerprint(argv):
+    fingerprint = get_fingerprint(argv)
+    fingerprint_file = get_fingerprint_file()
+    tmp_file = f"{fingerprint_file}.{os.getpid()}.tmp"
+    with open(tmp_file, 'w') as file:
+        json.dump({'fingerprint': fingerprint, 'warnings': GENERATED_FILES_STATS['warnings'], 'errors': GENERATED_FILES_STATS['errors']}, file)
+        file.write("\n")
+    os.replace(tmp_file, fingerprint_file)
+
+
+SHORT_OPTIONS = 'hj:t:cad:vlm:'
+LONG_OPTIONS = ['help', 'jungle', 'template', 'clean', 'all-devices', 'debug', 'verbose', 'log-line-number', 'manifest-id-for-lang', 'no-cache', 'jobs=', 'force', 'batch', 'batch-root=', 'matrix', 'timings', 'timings-file=', 'watch']
+
 def main(argv):
-    global LOG_LEVEL, LOG_LINE_NUMBER, MONKEY_JUNGLE, TEMPLATE, MANIFEST, CIQ_VERSIONS, USED_CIQ_VERSIONS, FEATURES_BY_MEMORY, FEATURE_CONSTRAINS, FILTER_CONSTRAINS
+    global LOG_LEVEL, LOG_LINE_NUMBER, USE_CACHE
 
     generate_devices = 'manifest'
+    jobs = 1
+    force = False
+    clean = False
+    batch = False
+    batch_roots = []
+    timings = False
+    timings_file = None
+    watch = False
     try:
-        opts, args = getopt.getopt(argv, 'hj:t:cad:vlm:', ['help', 'jungle', 'template', 'clean', 'all-devices', 'debug', 'verbose', 'log-line-number', 'manifest-id-for-lang'])
+        opts, args = getopt.getopt(argv, SHORT_OPTIONS, LONG_OPTIONS)
     except getopt.GetoptError as e:
         print_error(e)
         usage()
@@ -417,9 +753,7 @@ def main(argv):
             usage()
             sys.exit(0)
         if opt == '-c' or opt == '--clean':
-            shutil.rmtree(GENERATED_DEVICES_DIR)
-            shutil.rmtree(GENERATED_FEATURES_DIR)
-            sys.exit(0)
+            clean = True
         if opt == '-a' or opt == '--all-devices':
             generate_devices = 'all'
         if opt == '-d' or opt == '--debug':
@@ -428,6 +762,426 @@ def main(argv):
             LOG_LEVEL = 1
         if opt == '-l' or opt == '--log-line-number':
             LOG_LINE_NUMBER = True
+        if opt == '--no-cache':
+            USE_CACHE = False
+        if opt == '--jobs':
+            jobs = int(arg) if int(arg) > 0 else os.cpu_count()
+        if opt == '--force':
+            force = True
+        if opt == '--batch':
+            batch = True
+        if opt == '--batch-root':
+            batch = True
+            batch_roots.append(arg)
+        if opt == '--timings':
+            timings = True
+        if opt == '--timings-file':
+            timings = True
+            timings_file = arg
+        if opt == '--watch':
+            watch = True
+    if watch and (batch or clean):
+        print_error("--watch can't be used with --batch or --clean")
+        sys.exit(1)
+
+    if timings:
+        enable_timings()
+    try:
+        generate_with_opts(argv, opts, args, generate_devices, jobs, force, clean, batch, batch_roots, watch)
+    finally:
+        if timings:
+            try:
+                report_timings(timings_file)
+            finally:
+                disable_timings()
+
+
+def generate_with_opts(argv, opts, args, generate_devices, jobs, force, clean, batch, batch_roots, watch):
+    init_sdk()
+
+    if batch:
+        # the options (without the batch ones) are used for each app, i.e: for the fingerprint
+        app_opts = [(opt, arg) for opt, arg in opts if opt not in ['--batch', '--batch-root']]
+        app_argv = [opt_or_arg for opt, arg in app_opts for opt_or_arg in ([opt, arg] if arg else [opt])]
+        app_dirs = args + find_app_dirs(batch_roots)
+        if not app_dirs:
+            print_error(f"no app directories, use: --batch <app dir>... or --batch-root=<dir> to find the directories with {MONKEY_GENERATOR_CONF_FILE}")
+            sys.exit(1)
+        sys.exit(0 if generate_apps(app_dirs, app_argv, app_opts, generate_devices, jobs, force, clean) else 1)
+
+    if clean:
+        clean_generated()
+        sys.exit(0)
+    if watch:
+        watch_app(argv, opts, generate_devices, jobs, force)
+    else:
+        generate(argv, opts, generate_devices, jobs, force)
+
+
+WATCH_POLL_INTERVAL = 1.0
+# the changes are collected until nothing changes for this long, so saving many files only regenerates once
+WATCH_DEBOUNCE = 0.5
+
+def add_tree_to_snapshot(snapshot, top_dir):
+    for root, dirs, files in os.walk(top_dir, followlinks=True):
+        snapshot[f"{root}/"] = sorted(dirs)
+        for file in files:
+            add_file_to_snapshot(snapshot, os.path.join(root, file))
+
+def add_file_to_snapshot(snapshot, path):
+    try:
+        stat = os.stat(path)
+        snapshot[path] = (stat.st_mtime_ns, stat.st_size)
+    except OSError:
+        snapshot[path] = None
+
+# a directory that is deleted or renamed while it's being edited is a change like the others, it doesn't stop watching
+def list_dir_for_snapshot(dir):
+    try:
+        return sorted(file for file in os.listdir(dir if dir else '.') if not file.startswith('.') and file != GENERATED_DIR)
+    except OSError:
+        return None
+
+# the stat of every file --watch looks at, grouped by what has to be reloaded when they change
+def get_watch_snapshot():
+    sdk = {}
+    add_tree_to_snapshot(sdk, SDK_DEVICES_DIR)
+    add_file_to_snapshot(sdk, DEVICE_2_MIN_VERSION_CSV)
+    add_tree_to_snapshot(sdk, FONTS_JSON_DIR)
+    app = {}
+    for file in [TEMPLATE, MONKEY_GENERATOR_CONF_FILE, get_conf('manifest_xml_template'), get_conf('manifest_id_map')]:
+        if file:
+            add_file_to_snapshot(app, file)
+    for file in list_dir_for_snapshot('.') or []:
+        if file.startswith('manifest') and file.endswith('.xml'):
+            add_file_to_snapshot(app, file)
+    features = {}
+    add_tree_to_snapshot(features, FEATURES_SRC_DIR)
+    for base_dir in get_base_dirs():
+        features[base_dir] = list_dir_for_snapshot(base_dir)
+        add_tree_to_snapshot(features, f"{base_dir}features")
+    # the same as in the fingerprint: has_directory() looks into these
+    add_tree_to_snapshot(features, SOURCE_FEATURES_DIR)
+    add_tree_to_snapshot(features, RESOURCES_FEATURES_DIR)
+    return {'sdk': sdk, 'app': app, 'features': features}
+
+def watch_generate(argv, opts, generate_devices, jobs, force):
+    reset_app_state()
+    try:
+        generate(argv, opts, generate_devices, jobs, force)
+    except SystemExit as e:
+        if e.code:
+            print_error(f"failed{': ' + str(e.code) if e.code != 1 else ''}, waiting for the next change")
+    except Exception as e:
+        # i.e: a file that is being edited can't be parsed
+        print_error(f"failed: {type(e).__name__}: {e}, waiting for the next change")
+    sys.stdout.flush()
+
+# keeps the devices, the API index and the font db loaded, and polls the template, the conf, the manifests, the features/ trees
+# and the SDK, and regenerates the app after they change. The devices are only read again when the SDK (or csv/, chars/) changed.
+# Every output depends on all of these, so the whole app is regenerated, and only the files whose content changed are written.
+def watch_app(argv, opts, generate_devices, jobs, force):
+    watch_generate(argv, opts, generate_devices, jobs, force)
+    snapshot = get_watch_snapshot()
+    log(LOG_LEVEL, LOG_LEVEL_ALWAYS, "watching for changes, press Ctrl-C to stop")
+    try:
+        while True:
+            time.sleep(WATCH_POLL_INTERVAL)
+            changed_snapshot = get_watch_snapshot()
+            if changed_snapshot == snapshot:
+                continue
+            while True:
+                time.sleep(WATCH_DEBOUNCE)
+                settled_snapshot = get_watch_snapshot()
+                if settled_snapshot == changed_snapshot:
+                    break
+                changed_snapshot = settled_snapshot
+            changed = [group for group in snapshot if snapshot[group] != changed_snapshot[group]]
+            log(LOG_LEVEL, LOG_LEVEL_ALWAYS, f"changed: {', '.join(changed)}")
+            if 'sdk' in changed:
+                init_sdk(CIQ_SDK_HOME)
+            watch_generate(argv, opts, generate_devices, jobs, force)
+            snapshot = get_watch_snapshot()
+    except KeyboardInterrupt:
+        log(LOG_LEVEL, LOG_LEVEL_ALWAYS, "stopped watching")
+
+
+def clean_generated():
+    shutil.rmtree(GENERATED_DEVICES_DIR)
+    shutil.rmtree(GENERATED_FEATURES_DIR)
+    if os.path.exists(get_fingerprint_file()):
+        os.remove(get_fingerprint_file())
+
+
+# the globals of the app that is generated, the SDK's devices, the API index and the font db are kept.
+# They are new objects (instead of clearing the old ones), so a Generator's state isn't changed by the next generation.
+def reset_app_state():
+    global MONKEY_JUNGLE, TEMPLATE, MANIFEST, MONKEY_GENERATOR_REPLACE, MONKEY_GENERATOR_CONF, \
+        FEATURES_TREE, MULTI_FEATURE_INDEX, PRECALCULATED_BOUNDING_BOXES, DEVICES_LINES_CACHE
+    MONKEY_JUNGLE = 'monkey.jungle'
+    TEMPLATE = MONKEY_JUNGLE.replace('.jungle', '.template.jungle')
+    MONKEY_GENERATOR_REPLACE = {}
+    MONKEY_GENERATOR_CONF = {}
+    MANIFEST = 'manifest.xml'
+    reset_variant_state()
+    FEATURES_TREE = {}
+    MULTI_FEATURE_INDEX = {}
+    PRECALCULATED_BOUNDING_BOXES = {}
+    DEVICES_LINES_CACHE = {}
+
+# the globals that are set from the template and the manifest, that can depend on LANG, ENV
+def reset_variant_state():
+    global APP_TYPE, MIN_API_LEVEL, MANIFEST_DEVICES, MISSING_DEVICES, MANIFEST_LANGS, BASE, IS_BETA, \
+        MEMORY_2_K, MEMORY_ORDER, FEATURES_BY_MEMORY, FEATURE_CONSTRAINS, FILTER_CONSTRAINS, USED_CIQ_VERSIONS, CIQ_VERSIONS, \
+        FUNCTIONS, CONSTS, GENERATED_FILES_STATS
+    APP_TYPE = ''
+    MIN_API_LEVEL = '1.0.0'
+    MANIFEST_DEVICES = []
+    MISSING_DEVICES = []
+    MANIFEST_LANGS = []
+    BASE = {}
+    IS_BETA = False
+    MEMORY_2_K = {}
+    MEMORY_ORDER = []
+    FEATURES_BY_MEMORY = {}
+    FEATURE_CONSTRAINS = {'beta': {'is_beta': True}}
+    FILTER_CONSTRAINS = {}
+    USED_CIQ_VERSIONS = []
+    CIQ_VERSIONS = get_device_min_ciq_versions() if DEVICES else set()
+    FUNCTIONS = []
+    CONSTS = {}
+    reset_constraint_cache()
+    GENERATED_FILES_STATS = {'written': 0, 'skipped': 0, 'warnings': 0, 'errors': 0}
+
+# the globals that reset_app_state() sets, and the ones of the SDK that init_sdk() sets, a Generator keeps its own
+APP_STATE_GLOBALS = ['MONKEY_JUNGLE', 'TEMPLATE', 'MANIFEST', 'MONKEY_GENERATOR_REPLACE', 'MONKEY_GENERATOR_CONF',
+    'FEATURES_TREE', 'MULTI_FEATURE_INDEX', 'PRECALCULATED_BOUNDING_BOXES', 'DEVICES_LINES_CACHE',
+    'APP_TYPE', 'MIN_API_LEVEL', 'MANIFEST_DEVICES', 'MISSING_DEVICES', 'MANIFEST_LANGS', 'BASE', 'IS_BETA',
+    'MEMORY_2_K', 'MEMORY_ORDER', 'FEATURES_BY_MEMORY', 'FEATURE_CONSTRAINS', 'FILTER_CONSTRAINS', 'USED_CIQ_VERSIONS', 'CIQ_VERSIONS',
+    'FUNCTIONS', 'CONSTS', 'GENERATED_FILES_STATS', 'COMPILED_CONSTRAINTS', 'HAS_FEATURE_BY_CONSTRAINTS_CACHE']
+SDK_STATE_GLOBALS = ['CIQ_SDK_HOME', 'SDK_DEVICES_DIR', 'ALL_DEVICES', 'DEVICES', 'DEVICE_MIN_VERSION', 'API_INDEX', 'FONT_DB', 'FONT_TO_MC_FONT_CACHE']
+
+def get_globals(names):
+    return {name: globals()[name] for name in names}
+
+def set_globals(values):
+    globals().update(values)
+
+
+# returns the directories under roots that have monkey-generator.conf
+def find_app_dirs(roots):
+    app_dirs = []
+    for root in roots:
+        for dir_path, dir_names, file_names in os.walk(root):
+            dir_names[:] = sorted(dir_name for dir_name in dir_names if not dir_name.startswith('.') and dir_name != GENERATED_DIR)
+            if MONKEY_GENERATOR_CONF_FILE in file_names:
+                app_dirs.append(dir_path)
+    return app_dirs
+
+# generates the app in app_dir, returns whether it was successful
+def generate_app(app_dir, argv, opts, generate_devices, jobs, force, clean):
+    log(LOG_LEVEL, LOG_LEVEL_ALWAYS, f"{app_dir}:")
+    if not os.path.isdir(app_dir):
+        print_error(f"{app_dir}: not a directory")
+        return False
+    cwd = os.getcwd()
+    try:
+        os.chdir(app_dir)
+        reset_app_state()
+        if clean:
+            clean_generated()
+        else:
+            generate(argv, opts, generate_devices, jobs, force)
+        return True
+    except SystemExit as e:
+        if e.code is None or e.code == 0:
+            return True
+        print_error(f"{app_dir}: failed{': ' + str(e.code) if e.code else ''}")
+        return False
+    except Exception as e:
+        # i.e: an unknown app type, the other apps of --batch are still generated
+        log(LOG_LEVEL, LOG_LEVEL_DEBUG, traceback.format_exc)
+        print_error(f"{app_dir}: failed: {type(e).__name__}: {e}")
+        return False
+    finally:
+        os.chdir(cwd)
+        sys.stdout.flush()
+
+# the Generators of --batch, the workers get them from the main process when they are forked
+BATCH_GENERATORS = []
+# held while a DeviceDatabase is loaded or a Generator generates, because they set the module's globals
+GENERATION_LOCK = threading.Lock()
+
+# the timings of the app are returned to the main process together with the result
+def generate_app_in_worker(index):
+    global TIMINGS
+    if TIMINGS is not None:
+        TIMINGS = new_timings()
+    return BATCH_GENERATORS[index].generate(), TIMINGS
+
+# generates the apps in app_dirs in the same process, so the devices are only read once,
+# with --jobs the apps are generated in parallel (and the devices of each app serially)
+def generate_apps(app_dirs, argv, opts, generate_devices, jobs, force, clean):
+    global BATCH_GENERATORS
+    if jobs > 1 and len(app_dirs) > 1 and 'fork' not in multiprocessing.get_all_start_methods():
+        print_warn("--jobs needs the fork start method, generating apps serially")
+        jobs = 1
+    if clean:
+        results = [generate_app(app_dir, argv, opts, generate_devices, 1, force, clean) for app_dir in app_dirs]
+    else:
+        # loaded before forking, so the workers share it
+        device_db = DeviceDatabase(CIQ_SDK_HOME, LOG_LEVEL)
+        BATCH_GENERATORS = [Generator(device_db, app_dir, argv, jobs = 1) for app_dir in app_dirs]
+        if jobs > 1 and len(app_dirs) > 1:
+            sys.stdout.flush()
+            with multiprocessing.get_context('fork').Pool(min(jobs, len(app_dirs))) as pool:
+                results = []
+                for result, timings in pool.map(generate_app_in_worker, range(len(app_dirs)), chunksize=1):
+                    results.append(result)
+                    if timings is not None:
+                        merge_timings(timings)
+        else:
+            results = [generator.generate() for generator in BATCH_GENERATORS]
+        BATCH_GENERATORS = []
+    failed_app_dirs = [app_dir for app_dir, result in zip(app_dirs, results) if not result]
+    log(LOG_LEVEL, LOG_LEVEL_ALWAYS, f"generated {len(app_dirs) - len(failed_app_dirs)} of {len(app_dirs)} apps{', failed: ' + ', '.join(failed_app_dirs) if failed_app_dirs else ''}")
+    return not failed_app_dirs
+
+
+# the DeviceDatabase's data can't be changed: the dicts are read-only views, the lists are tuples and the sets are frozensets
+def freeze(obj):
+    if isinstance(obj, dict):
+        return MappingProxyType({key: freeze(value) for key, value in obj.items()})
+    if isinstance(obj, list):
+        return tuple(freeze(value) for value in obj)
+    if isinstance(obj, set):
+        return frozenset(obj)
+    return obj
+
+# a copy of the frozen data with dicts and lists (the devices don't have tuples)
+def thaw(obj):
+    if isinstance(obj, MappingProxyType):
+        return {key: thaw(value) for key, value in obj.items()}
+    if isinstance(obj, tuple):
+        return [thaw(value) for value in obj]
+    return obj
+
+# The SDK's devices, the API index and the font db, loaded once and shared by the Generators of the process.
+# Loading it doesn't change the module's globals, and it's frozen, so it can't be changed after it's loaded.
+class DeviceDatabase:
+    def __init__(self, ciq_sdk_home = None, log_level = LOG_LEVEL_ALWAYS):
+        with GENERATION_LOCK:
+            self.load(ciq_sdk_home, log_level)
+
+    def load(self, ciq_sdk_home, log_level):
+        global LOG_LEVEL
+        saved = get_globals(SDK_STATE_GLOBALS + ['CIQ_VERSIONS', 'LOG_LEVEL'])
+        try:
+            LOG_LEVEL = log_level
+            init_sdk(ciq_sdk_home)
+            read_all_devices()
+            self.ciq_sdk_home = CIQ_SDK_HOME
+            self.all_devices = tuple(ALL_DEVICES)
+            self.devices = freeze(DEVICES)
+            self.device_min_version = freeze(DEVICE_MIN_VERSION)
+            self.api_index = freeze(get_api_index())
+            self.font_db = freeze(get_font_db())
+        finally:
+            set_globals(saved)
+
+    # the globals of the SDK for a generation, with its own copies of the devices
+    def get_sdk_state(self):
+        return {
+            'CIQ_SDK_HOME': self.ciq_sdk_home,
+            'SDK_DEVICES_DIR': f"{self.ciq_sdk_home}/Devices",
+            'ALL_DEVICES': list(self.all_devices),
+            'DEVICES': GenerationDevices(self.devices),
+            'DEVICE_MIN_VERSION': self.device_min_version,
+            'API_INDEX': self.api_index,
+            'FONT_DB': self.font_db,
+            'FONT_TO_MC_FONT_CACHE': {},
+        }
+
+# The devices of a generation: a copy of each device of the DeviceDatabase is made when it's first used,
+# the generation adds its working data to it (i.e: the datafields' hashes and bounding boxes).
+class GenerationDevices(Mapping):
+    def __init__(self, devices):
+        self.devices = devices
+        self.copies = {}
+
+    def __getitem__(self, dev):
+        if dev not in self.copies:
+            self.copies[dev] = thaw(self.devices[dev])
+        return self.copies[dev]
+
+    def __contains__(self, dev):
+        return dev in self.devices
+
+    def __iter__(self):
+        return iter(self.devices)
+
+    def __len__(self):
+        return len(self.devices)
+
+# Generates an app in this process with the devices of a DeviceDatabase, so many apps (or the same app many times)
+# can be generated without loading the SDK again, i.e:
+#     device_db = DeviceDatabase()
+#     for app_dir in app_dirs:
+#         Generator(device_db, app_dir, ['-a', '--force']).generate()
+# argv are the options of the command line that are used for the app (-a, -j, -t, -d, -v, --jobs, --force, --matrix),
+# the ones of the process (i.e: --no-cache, --timings) are the globals, jobs overrides --jobs.
+# The Generator keeps the state of its app (state: the globals in APP_STATE_GLOBALS after its last generation), but it's not
+# re-entrant: while it's generating the module's globals are set to its state and to the device db's (then they are restored),
+# and the working directory of the process is changed to app_dir. So generate() holds GENERATION_LOCK, the Generators of
+# different threads generate one after the other, for parallel generations use processes (i.e: --batch with --jobs).
+class Generator:
+    def __init__(self, device_db, app_dir = '.', argv = (), jobs = None):
+        self.device_db = device_db
+        self.app_dir = app_dir
+        self.argv = list(argv)
+        self.opts, args = getopt.getopt(self.argv, SHORT_OPTIONS, LONG_OPTIONS)
+        if args:
+            raise getopt.GetoptError(f"unexpected arguments: {' '.join(args)}")
+        self.generate_devices = 'manifest'
+        self.jobs = 1
+        self.force = False
+        self.log_level = LOG_LEVEL_ALWAYS
+        for opt, arg in self.opts:
+            if opt == '-a' or opt == '--all-devices':
+                self.generate_devices = 'all'
+            if opt == '-d' or opt == '--debug':
+                self.log_level = int(arg)
+            if opt == '-v' or opt == '--verbose':
+                self.log_level = 1
+            if opt == '--jobs':
+                self.jobs = int(arg) if int(arg) > 0 else os.cpu_count()
+            if opt == '--force':
+                self.force = True
+        if jobs is not None:
+            self.jobs = jobs
+        self.state = None
+
+    # returns whether it was successful
+    def generate(self):
+        with GENERATION_LOCK:
+            return self.generate_locked()
+
+    def generate_locked(self):
+        global LOG_LEVEL
+        saved = get_globals(SDK_STATE_GLOBALS + APP_STATE_GLOBALS + ['LOG_LEVEL'])
+        try:
+            LOG_LEVEL = self.log_level
+            set_globals(self.device_db.get_sdk_state())
+            result = generate_app(self.app_dir, self.argv, self.opts, self.generate_devices, self.jobs, self.force, False)
+            self.state = get_globals(APP_STATE_GLOBALS)
+            return result
+        finally:
+            set_globals(saved)
+
+
+def generate(argv, opts, generate_devices, jobs, force):
+    global MONKEY_JUNGLE, TEMPLATE
+
     parse_monkey_generator_conf()
     for opt, arg in opts:
         if opt == '-m' or opt == '--manifest-id-for-lang':
@@ -438,8 +1192,6 @@ def main(argv):
             print(f"lang: {lang}, opts: {opts}, argv: {argv}, i: {i}, uuid: {uuid}, env: {env}, a[i+1]: {argv[i+1]}")
             # add_manifest_id_to_map(lang, uuid, env)
             sys.exit(0)
-    if 'manifest_xml_template' in MONKEY_GENERATOR_CONF:
-        generate_manifest()
     if 'monkey_jungle_template' in MONKEY_GENERATOR_CONF:
         TEMPLATE = MONKEY_GENERATOR_CONF['monkey_jungle_template']
     for opt, arg in opts:
@@ -452,9 +1204,87 @@ def main(argv):
     if not os.path.exists(TEMPLATE):
         sys.exit(f"Missing template file: {TEMPLATE}")
 
+    if ('--matrix', '') in opts:
+        generate_matrix(argv, generate_devices, jobs, force)
+    else:
+        generate_jungle(argv, generate_devices, jobs, force)
+
+
+# generates a variant for each (LANG, ENV) in manifest_id_map into matrix_output_dir. The devices, the features tree and
+# the bounding boxes are shared by the variants, and the devices' lines are only generated again when they depend on LANG, ENV
+def generate_matrix(argv, generate_devices, jobs, force):
+    global MONKEY_JUNGLE, MANIFEST
+    if 'manifest_xml_template' not in MONKEY_GENERATOR_CONF or 'manifest_id_map' not in MONKEY_GENERATOR_CONF:
+        print_error(f"--matrix needs manifest_xml_template and manifest_id_map in {MONKEY_GENERATOR_CONF_FILE}")
+        sys.exit(1)
+    with open(MONKEY_GENERATOR_CONF['manifest_id_map']) as manifest_id_map_file:
+        manifest_id_map = json.load(manifest_id_map_file)
+    variants = [(lang, env) for lang in sorted(manifest_id_map) if isinstance(manifest_id_map[lang], dict) \
+        for env in sorted(manifest_id_map[lang]) if manifest_id_map[lang][env]]
+    if not variants:
+        print_error(f"no (LANG, ENV) pairs in '{MONKEY_GENERATOR_CONF['manifest_id_map']}'")
+        sys.exit(1)
+    matrix_output_dir = get_conf('matrix_output_dir') or DEFAULT_MATRIX_OUTPUT_DIR
+    replace = MONKEY_GENERATOR_REPLACE.copy()
+    monkey_jungle_file = os.path.basename(MONKEY_JUNGLE)
+    out_dirs = {}
+    for lang, env in variants:
+        reset_variant_state()
+        MONKEY_GENERATOR_REPLACE.clear()
+        MONKEY_GENERATOR_REPLACE.update(replace)
+        MONKEY_GENERATOR_REPLACE['LANG'] = lang
+        MONKEY_GENERATOR_REPLACE['ENV'] = env
+        out_dir = os.path.normpath(replace_placeholders(matrix_output_dir))
+        if out_dir in out_dirs:
+            print_error(f"matrix_output_dir: {matrix_output_dir}: [{lang}][{env}] and {out_dirs[out_dir]} would be generated to the same directory: {out_dir}")
+            sys.exit(1)
+        out_dirs[out_dir] = f"[{lang}][{env}]"
+        log(LOG_LEVEL, LOG_LEVEL_ALWAYS, f"{out_dir}:")
+        os.makedirs(out_dir, exist_ok=True)
+        MONKEY_JUNGLE = os.path.join(out_dir, monkey_jungle_file)
+        MANIFEST = os.path.join(out_dir, 'manifest.xml')
+        generate_jungle(argv, generate_devices, jobs, force, out_dir)
+
+
+JUNGLE_PATH_KEYS = {'sourcePath', 'resourcePath', 'barrelPath', 'lang'}
+
+# prefixes the relative paths in a monkey.jungle line, so it can be written to a monkey.jungle in another directory
+def relocate_jungle_line(line, path_prefix):
+    if not path_prefix or line.startswith('#') or '=' not in line:
+        return line
+    key, val = line.split('=', 1)
+    if not JUNGLE_PATH_KEYS.intersection(key.strip().split('.')[1:]):
+        return line
+    end = '\n' if val.endswith('\n') else ''
+    paths = []
+    for path in val.rstrip('\n').split(';'):
+        stripped = path.strip()
+        if stripped and not stripped.startswith('$(') and not os.path.isabs(stripped):
+            path = path.replace(stripped, f"{path_prefix}{stripped}", 1)
+        paths.append(path)
+    return f"{key}={';'.join(paths)}{end}"
+
+
+# generates MONKEY_JUNGLE (and MANIFEST), the paths are relative to out_dir
+@timed_phase
+def generate_jungle(argv, generate_devices, jobs, force, out_dir = ''):
+    global MANIFEST, CIQ_VERSIONS, USED_CIQ_VERSIONS
+    path_prefix = f"{os.path.relpath('.', out_dir)}/" if out_dir else ''
+
+    unchanged_fingerprint = None if force else get_unchanged_fingerprint(argv)
+    if unchanged_fingerprint:
+        log(LOG_LEVEL, LOG_LEVEL_ALWAYS, f"{MONKEY_JUNGLE} is up to date, use --force to regenerate it")
+        if unchanged_fingerprint.get('warnings') or unchanged_fingerprint.get('errors'):
+            print_warn(f"the generation of {MONKEY_JUNGLE} had warnings: {unchanged_fingerprint.get('warnings')}, errors: {unchanged_fingerprint.get('errors')}, use --force to see them")
+        return
+
+    if 'manifest_xml_template' in MONKEY_GENERATOR_CONF:
+        generate_manifest()
+
     # ALL_FEATURES = sorted(filter(lambda dir: MULTI_FEATURE_DIR_SEPARATOR not in dir, os.listdir('features'))) if os.path.isdir('features') else []
     # log(LOG_LEVEL, LOG_LEVEL_BASIC, f"ALL_FEATURES: {ALL_FEATURES}")
-    read_all_devices()
+    if not DEVICES:
+        read_all_devices()
 
     # placeholder = 'LANG'
     # line = 'base.sourcePath = {LANG?../../source:source};{LANG?../../gen/{LANG}/source:gen/eng/source}'
@@ -465,9 +1295,11 @@ def main(argv):
     # print(line)
     # sys.exit("foo")
 
-    with open(MONKEY_JUNGLE, 'w') as output:
+    with open_generated(MONKEY_JUNGLE) as output:
         output.write(f"# GENERATED from '{TEMPLATE}' by {GENERATROR_SIGNATURE}\n\n");
 
+        # the template after replacing the placeholders, the devices' lines only depend on this (and the manifest)
+        template_lines = []
         with open(TEMPLATE, 'r') as template:
             for line in template:
                 if line[0] != '#':
@@ -487,6 +1319,7 @@ def main(argv):
                     line = '#' + line
                 # output.write(line)
                 line = line.strip()
+                template_lines.append(line)
                 # log(LOG_LEVEL, LOG_LEVEL_BASIC, f"{line}")
                 write_line = False
                 if line.startswith('project.manifest'):
@@ -607,8 +1440,11 @@ def main(argv):
 
                 if not write_line:
                     line = '# ' + line
-                output.write(f"{line}\n")
+                output.write(f"{relocate_jungle_line(line, path_prefix)}\n")
 
+        reset_constraint_cache()
+        compile_constraints(FEATURE_CONSTRAINS)
+        compile_constraints(FILTER_CONSTRAINS)
         parse_manifest(MANIFEST)
 
         log(LOG_LEVEL, LOG_LEVEL_BASIC, f"FEATURES_BY_MEMORY: {FEATURES_BY_MEMORY}")
@@ -625,13 +1461,14 @@ def main(argv):
         if FILTER_CONSTRAINS:
             devices_to_exclude_reason = {}
             # unknown_filters = set()
-            for dev in ALL_DEVICES:
-                for my_filter in FILTER_CONSTRAINS:
-                    has_feature_obj = has_feature_by_constraints(dev, FILTER_CONSTRAINS, my_filter)
-                    if has_feature_obj[False]:
-                        devices_to_exclude.append(dev)
-                        devices_to_exclude_reason[dev] = has_feature_obj[False]
-                        break
+            with timed('filters'):
+                for dev in ALL_DEVICES:
+                    for my_filter in FILTER_CONSTRAINS:
+                        has_feature_obj = has_feature_by_constraints(dev, FILTER_CONSTRAINS, my_filter)
+                        if has_feature_obj[False]:
+                            devices_to_exclude.append(dev)
+                            devices_to_exclude_reason[dev] = has_feature_obj[False]
+                            break
                 # device = DEVICES[dev]
                 # for attr in FILTER_CONSTRAINS['include_device']:
                 #     val = FILTER_CONSTRAINS['include_device'][attr]
@@ -658,84 +1495,138 @@ def main(argv):
             print_error(f"MISSING_DEVICES: {MISSING_DEVICES}")
 
 
-        read_devices_datafield_hash_data(devices)
+        devices_lines_key = (tuple(template_lines), IS_BETA, APP_TYPE, MIN_API_LEVEL, tuple(MANIFEST_LANGS), tuple(original_devices), tuple(devices))
+        if devices_lines_key not in DEVICES_LINES_CACHE:
+            read_devices_datafield_hash_data(devices)
         output.write(f"\n# GENERATED #\n");
         output.write(f"# excluded {len(devices_to_exclude)} devices that are incompatible and are not in {MANIFEST}: {', '.join(devices_to_exclude)}\n");
         output.write(f"# filtered out {len(incompatible_devices)} incompatible devices by constraints from {MANIFEST}: {', '.join(incompatible_devices)}\n");
         output.write(f"# included {len(devices)} devices\n\n");
         original_devices.insert(0, 'base')
         log(LOG_LEVEL, LOG_LEVEL_DEBUG, f"devices ({generate_devices}): {devices}")
-        for dev in original_devices:
+        if devices_lines_key in DEVICES_LINES_CACHE:
+            log(LOG_LEVEL, LOG_LEVEL_BASIC, f"reusing the devices' lines, they don't depend on: {MONKEY_GENERATOR_REPLACE}")
+        else:
+            DEVICES_LINES_CACHE[devices_lines_key] = generate_devices_lines(original_devices, devices, jobs)
+        for dev, lines in zip(original_devices, DEVICES_LINES_CACHE[devices_lines_key]):
             if dev not in devices and dev != 'base':
                 output.write(f"{dev}.sourcePath=incompatible\n")
                 continue
+            output.writelines([relocate_jungle_line(line, path_prefix) for line in lines])
 
-            # if dev == 'base':
-            #     continue
-            log(LOG_LEVEL, LOG_LEVEL_OUTPUT, f"{dev}:")
-            # sourcePathArr = ['source']
-            sourcePathArr = []
-            # resourcePathArr = ['resources']
-            resourcePathArr = []
-            excludeAnnotationsArr = []
-            langsDict = {}
-
-            if dev == 'base':
-                if 'sourcePath' in BASE:
-                    sourcePathArr.extend(BASE['sourcePath'])
-                if 'resourcePath' in BASE:
-                    resourcePathArr.extend(BASE['resourcePath'])
-                if 'excludeAnnotations' in BASE:
-                    excludeAnnotationsArr.extend(BASE['excludeAnnotations'])
-                conf_base_dir = get_base_dir()
-                for dir in sorted(filter(lambda d: d.startswith('resources-'), os.listdir(conf_base_dir if conf_base_dir else '.'))):
-                    lang = dir.replace('resources-', '')
-                    if lang in LANGUAGES:
-                        if lang not in langsDict:
-                            langsDict[lang] = []
-                        langsDict[lang].append(f'{conf_base_dir}{dir}')
-            else:
-                sourcePathArr.append(f"$({dev}.sourcePath)")
-                resourcePathArr.append(f"$({dev}.resourcePath)")
-                excludeAnnotationsArr.append(f"$({dev}.excludeAnnotations)")
-
-            for func in FUNCTIONS:
-                # log(LOG_LEVEL, LOG_LEVEL_BASIC, f"{dev}.add: {func}")
-                add(sourcePathArr, resourcePathArr, excludeAnnotationsArr, langsDict, func(dev))
-
-            for lang in LANGUAGES:
-                if f"lang.{lang}" in BASE:
-                    if lang not in langsDict:
-                        langsDict[lang] = []
-                    langsDict[lang].extend(BASE[f"lang.{lang}"])
-
-            if langsDict:
-                if '' in langsDict:
-                    default_language = ''
-                elif 'eng' in langsDict:
-                    default_language = 'eng'
-                else:
-                    default_language = False
-                if default_language != False:
-                    resourcePathArr.append(';'.join(langsDict[default_language]))
-
-            min_required_elements = 0 if dev == 'base' else 1
-            if len(sourcePathArr) > min_required_elements:
-                # output.write(f"{dev}.sourcePath=$({dev}.sourcePath);{';'.join(sourcePathArr)}\n")
-                output.write(f"{dev}.sourcePath={';'.join(sourcePathArr)}\n")
-            if len(resourcePathArr) > min_required_elements:
-                # output.write(f"{dev}.resourcePath=$({dev}.resourcePath);{';'.join(resourcePathArr)}\n")
-                output.write(f"{dev}.resourcePath={';'.join(resourcePathArr)}\n")
-            if len(excludeAnnotationsArr) > min_required_elements:
-                # output.write(f"{dev}.excludeAnnotations=$({dev}.excludeAnnotations);{';'.join(excludeAnnotationsArr)}\n")
-                output.write(f"{dev}.excludeAnnotations={';'.join(excludeAnnotationsArr)}\n")
-            if langsDict:
-                for lang in langsDict:
-                    if lang != default_language:
-                        # log(LOG_LEVEL, LOG_LEVEL_BASIC, f"{dev}: {lang} = {langsDict[lang]}")
-                        # if lang == 'eng':
-                        #     output.write(f"{dev}.lang.DEFAULT=$({dev}.lang.DEFAULT);{';'.join(langsDict[lang])}\n")
-                        output.write(f"{dev}.lang.{lang}=$({dev}.lang.{lang});{';'.join(langsDict[lang])}\n")
+    log(LOG_LEVEL, LOG_LEVEL_ALWAYS, f"generated files: written: {GENERATED_FILES_STATS['written']}, unchanged: {GENERATED_FILES_STATS['skipped']}")
+    write_fingerprint(argv)
+
+
+# returns the lines of monkey.jungle for dev, called in a worker process when running with --jobs
+def generate_device_lines(dev):
+    log(LOG_LEVEL, LOG_LEVEL_OUTPUT, f"{dev}:")
+    lines = []
+    # sourcePathArr = ['source']
+    sourcePathArr = []
+    # resourcePathArr = ['resources']
+    resourcePathArr = []
+    excludeAnnotationsArr = []
+    langsDict = {}
+
+    if dev == 'base':
+        if 'sourcePath' in BASE:
+            sourcePathArr.extend(BASE['sourcePath'])
+        if 'resourcePath' in BASE:
+            resourcePathArr.extend(BASE['resourcePath'])
+        if 'excludeAnnotations' in BASE:
+            excludeAnnotationsArr.extend(BASE['excludeAnnotations'])
+        conf_base_dir = get_base_dir()
+        for dir in sorted(filter(lambda d: d.startswith('resources-'), os.listdir(conf_base_dir if conf_base_dir else '.'))):
+            lang = dir.replace('resources-', '')
+            if lang in LANGUAGES:
+                if lang not in langsDict:
+                    langsDict[lang] = []
+                langsDict[lang].append(f'{conf_base_dir}{dir}')
+    else:
+        sourcePathArr.append(f"$({dev}.sourcePath)")
+        resourcePathArr.append(f"$({dev}.resourcePath)")
+        excludeAnnotationsArr.append(f"$({dev}.excludeAnnotations)")
+
+    for func in FUNCTIONS:
+        # log(LOG_LEVEL, LOG_LEVEL_BASIC, f"{dev}.add: {func}")
+        add(sourcePathArr, resourcePathArr, excludeAnnotationsArr, langsDict, func(dev) if TIMINGS is None else timed_call(func, dev))
+
+    for lang in LANGUAGES:
+        if f"lang.{lang}" in BASE:
+            if lang not in langsDict:
+                langsDict[lang] = []
+            langsDict[lang].extend(BASE[f"lang.{lang}"])
+
+    if langsDict:
+        if '' in langsDict:
+            default_language = ''
+        elif 'eng' in langsDict:
+            default_language = 'eng'
+        else:
+            default_language = False
+        if default_language != False:
+            resourcePathArr.append(';'.join(langsDict[default_language]))
+
+    min_required_elements = 0 if dev == 'base' else 1
+    if len(sourcePathArr) > min_required_elements:
+        # lines.append(f"{dev}.sourcePath=$({dev}.sourcePath);{';'.join(sourcePathArr)}\n")
+        lines.append(f"{dev}.sourcePath={';'.join(sourcePathArr)}\n")
+    if len(resourcePathArr) > min_required_elements:
+        # lines.append(f"{dev}.resourcePath=$({dev}.resourcePath);{';'.join(resourcePathArr)}\n")
+        lines.append(f"{dev}.resourcePath={';'.join(resourcePathArr)}\n")
+    if len(excludeAnnotationsArr) > min_required_elements:
+        # lines.append(f"{dev}.excludeAnnotations=$({dev}.excludeAnnotations);{';'.join(excludeAnnotationsArr)}\n")
+        lines.append(f"{dev}.excludeAnnotations={';'.join(excludeAnnotationsArr)}\n")
+    if langsDict:
+        for lang in langsDict:
+            if lang != default_language:
+                # log(LOG_LEVEL, LOG_LEVEL_BASIC, f"{dev}: {lang} = {langsDict[lang]}")
+                # if lang == 'eng':
+                #     lines.append(f"{dev}.lang.DEFAULT=$({dev}.lang.DEFAULT);{';'.join(langsDict[lang])}\n")
+                lines.append(f"{dev}.lang.{lang}=$({dev}.lang.{lang});{';'.join(langsDict[lang])}\n")
+    return lines
+
+# the lines of the devices by everything they depend on, so the variants of --matrix can share them
+DEVICES_LINES_CACHE = {}
+
+# the counters of the written files and of the warnings (and the timings) are returned to the main process together with the lines
+def generate_device_lines_in_worker(dev):
+    global TIMINGS
+    stats = GENERATED_FILES_STATS.copy()
+    if TIMINGS is not None:
+        TIMINGS = new_timings()
+    lines = generate_device_lines(dev)
+    return lines, {key: GENERATED_FILES_STATS[key] - stats[key] for key in stats}, TIMINGS
+
+@timed_phase
+def generate_devices_lines(original_devices, devices, jobs):
+    devices_to_generate = [dev for dev in original_devices if dev in devices or dev == 'base']
+    if jobs > 1 and len(devices_to_generate) > 1 and 'fork' not in multiprocessing.get_all_start_methods():
+        print_warn("--jobs needs the fork start method, generating devices serially")
+        jobs = 1
+    if jobs > 1 and len(devices_to_generate) > 1:
+        # build the lazy caches before forking, so the workers don't all build their own
+        get_api_index()
+        if features in FUNCTIONS:
+            for conf_base_dir in get_base_dirs():
+                get_features_tree(f'{conf_base_dir}features/')
+        if number_font in FUNCTIONS:
+            get_font_db()
+        sys.stdout.flush()
+        with multiprocessing.get_context('fork').Pool(min(jobs, len(devices_to_generate))) as pool:
+            results = pool.map(generate_device_lines_in_worker, devices_to_generate, chunksize=1)
+        generated_lines = []
+        for lines, stats, timings in results:
+            generated_lines.append(lines)
+            for key in stats:
+                GENERATED_FILES_STATS[key] += stats[key]
+            if timings is not None:
+                merge_timings(timings)
+    else:
+        generated_lines = [generate_device_lines(dev) for dev in devices_to_generate]
+    dev2lines = dict(zip(devices_to_generate, generated_lines))
+    return [dev2lines.get(dev, []) for dev in original_devices]
 
 
 def generate_lang_strings(lang_code_length):
@@ -746,7 +1637,7 @@ def generate_lang_strings(lang_code_length):
         lang_dir = f"{conf_base_dir}{GENERATED_FEATURES_DIR}/lang/lang-{lang}"
         lang_code = LANG_CODE3_2_LANG_CODE2[lang] if lang_code_length == 2 else lang
         os.makedirs(lang_dir, 0o755, True)
-        with open(f"{lang_dir}/strings-lang-{lang}.xml", 'w') as output:
+        with open_generated(f"{lang_dir}/strings-lang-{lang}.xml") as output:
             output.write(f"<strings>\n");
             output.write(f'\t<string id="lang{lang_code_length}">{lang_code}</string>\n');
             output.write(f"</strings>");
@@ -792,7 +1683,75 @@ pre_register(languages)
 # npx cft-font-info fr230 | jq '{devices: .devices, chars: (.fonts | map_values([.charInfo[].char]|join("")))}'
 # npx cft-font-info fr230 | jq '{devices: .devices, chars: (.fonts[] |= ([.charInfo[].char]|add))}'
 
-FONTS_JSON_DIR = os.path.dirname(os.path.dirname(os.path.realpath(__file__))) + '/font-analyzer/chars'
+# font-analyzer/chars/ can be overridden, i.e: by the fixtures of benchmarks/make-fixture-sdk.py
+FONTS_JSON_DIR = os.environ.get('MONKEY_GENERATOR_CHARS_DIR') or os.path.dirname(os.path.dirname(os.path.realpath(__file__))) + '/font-analyzer/chars'
+FONT_DB = None
+
+def get_font_chars_json_file(dev):
+    return f"{FONTS_JSON_DIR}/{dev}.chars.json"
+
+# the chars of a font as a bitset: bit n is set when the font has chr(n)
+def chars_to_bitset(chars):
+    if not chars:
+        return 0
+    code_points = [ord(c) for c in chars]
+    bitset = bytearray(max(code_points) // 8 + 1)
+    for code_point in code_points:
+        bitset[code_point >> 3] |= 1 << (code_point & 7)
+    return int.from_bytes(bitset, 'little')
+
+def bitset_to_chars(bitset):
+    return ''.join(chr(code_point) for code_point, bit in enumerate(reversed(bin(bitset)[2:])) if bit == '1')
+
+# the fonts of every device's <dev>.chars.json: {'charsets': [bitset, ...], 'devices': {dev: {'fonts': {font: charset id}, 'fontSets': ...}}}
+# Many devices have the same fonts, so each distinct charset is only kept once. It's kept next to the devices cache,
+# and only the <dev>.chars.json files that changed are parsed again.
+@timed_phase
+def read_font_db():
+    cached_entries = read_cache('fonts', FONT_DB_CACHE_VERSION)
+    cached_charsets = cached_entries.get('charsets', [])
+    cached_devices = cached_entries.get('devices', {})
+    charsets = []
+    charset_2_id = {}
+    chars_2_bitset = {}
+    devices = {}
+    parsed_devices = []
+    for dev in ALL_DEVICES:
+        chars_json_file = get_font_chars_json_file(dev)
+        if not os.path.exists(chars_json_file):
+            continue
+        signature = get_file_signature(chars_json_file)
+        entry = cached_devices.get(dev)
+        if entry is None or entry['signature'] != signature:
+            with open(chars_json_file) as chars_json:
+                chars_json = json.load(chars_json)
+            fonts = {}
+            for font, chars in chars_json['fonts'].items():
+                if chars not in chars_2_bitset:
+                    chars_2_bitset[chars] = chars_to_bitset(chars)
+                fonts[font] = chars_2_bitset[chars]
+            font_sets = chars_json['devices'][dev]['fontSets']
+            parsed_devices.append(dev)
+        else:
+            fonts = {font: cached_charsets[charset_id] for font, charset_id in entry['fonts'].items()}
+            font_sets = entry['fontSets']
+        for bitset in fonts.values():
+            if bitset not in charset_2_id:
+                charset_2_id[bitset] = len(charsets)
+                charsets.append(bitset)
+        devices[dev] = {'signature': signature, 'fonts': {font: charset_2_id[bitset] for font, bitset in fonts.items()}, 'fontSets': font_sets}
+    font_db = {'charsets': charsets, 'devices': devices}
+    if parsed_devices or len(devices) != len(cached_devices):
+        write_cache('fonts', FONT_DB_CACHE_VERSION, font_db)
+    log(LOG_LEVEL, LOG_LEVEL_BASIC, f"font db: {len(devices) - len(parsed_devices)} from cache, parsed: {parsed_devices}, charsets: {len(charsets)}")
+    return font_db
+
+def get_font_db():
+    global FONT_DB
+    if FONT_DB is None:
+        FONT_DB = read_font_db()
+    return FONT_DB
+
 def number_font(dev):
     if dev == 'base':
         return ['', '', '']
@@ -820,63 +1779,58 @@ def number_font(dev):
     if number_is_ttf:
         log(LOG_LEVEL, LOG_LEVEL_INPUT, f"{dev}: all number fonts are ttf")
     common_chars = None
-    with open(f"{FONTS_JSON_DIR}/{dev}.chars.json") as chars_json_file:
-        chars_json = json.load(chars_json_file)
-        # print(f"{chars_json['fonts']}")
-        # ''.join(set(word_1).intersection(word_2))
-        if len(chars_json['fonts']) > 0:
-            for font in chars_json['fonts']:
-                chars = chars_json['fonts'][font]
-                # print(f"chars: {chars}")
-                if common_chars == None:
-                    common_chars = set(chars)
-                else:
-                    common_chars = common_chars.intersection(chars)
-        elif not is_ttf:
-            print_error_log(LOG_LEVEL, LOG_LEVEL_ALWAYS, f"{dev}: empty \"fonts\" in {chars_json_file.name}")
-        is_missing = False
-        missing_mc_fonts = {}
-        missing_number_mc_fonts = {}
-        for fontSetArea in chars_json['devices'][dev]['fontSets']:
-            missing_from_fontset = {}
-            for mc_font in chars_json['devices'][dev]['fontSets'][fontSetArea]:
-                font = chars_json['devices'][dev]['fontSets'][fontSetArea][mc_font]
-                if font not in chars_json['fonts'] and font not in ttf_fonts:
-                    if not is_ttf:
-                        print_error_log(LOG_LEVEL, LOG_LEVEL_DEBUG, f"{dev}: missing font chars for fontSet: {fontSetArea}: {mc_font}: {font}")
-                    # print_error_log(LOG_LEVEL, LOG_LEVEL_ALWAYS, f"{dev}: missing: devices.{dev}.fontSets.{fontSetArea}.{mc_font}: \"{font}\"")
-                    missing_from_fontset[f'{mc_font}'] = font
-                    is_missing = True
-                    if fontSetArea not in missing_mc_fonts:
-                        missing_mc_fonts[fontSetArea] = set()
-                    missing_mc_fonts[fontSetArea].add(mc_font)
-                    if 'NUMBER' in mc_font:
-                        if fontSetArea not in missing_number_mc_fonts:
-                            missing_number_mc_fonts[fontSetArea] = set()
-                        missing_number_mc_fonts[fontSetArea].add(mc_font)
-                else:
-                    log(LOG_LEVEL, LOG_LEVEL_DEBUG, f"{dev}: found font chars for fontSet: {fontSetArea}: {mc_font}: {font} {' (ttf)' if font in ttf_fonts else ''}")
-            if missing_from_fontset and not is_ttf:
-                # print_error_log(LOG_LEVEL, LOG_LEVEL_ALWAYS, f"{dev}: missing: devices.{dev}.fontSets.{fontSetArea}: {missing_from_fontset}")
-                if fontSetArea == 'apac_tha' or dev == 'fr920xt':
-                    print_warn_log(LOG_LEVEL, LOG_LEVEL_DEBUG, f"{dev}: missing fonts: {fontSetArea}: {missing_from_fontset}")
-                else:
-                    print_error_log(LOG_LEVEL, LOG_LEVEL_ALWAYS, f"{dev}: missing fonts: {fontSetArea}: {missing_from_fontset}")
-        # if is_missing:
-        #     if missing_number_mc_fonts:
-        #         print_warn_log(LOG_LEVEL, LOG_LEVEL_ALWAYS, f"{dev}: some number font chars are missing: {missing_number_mc_fonts}")
-        #     print_error_log(LOG_LEVEL, LOG_LEVEL_DEBUG, f"{dev}: some font chars are missing: {missing_mc_fonts}")
-        # else:
-        if not is_missing:
-            print_warn_log(LOG_LEVEL, LOG_LEVEL_DEBUG, f"{dev}: no font chars are missing")
+    font_db = get_font_db()
+    if dev not in font_db['devices']:
+        sys.exit(f"Missing: {get_font_chars_json_file(dev)}")
+    font_db_device = font_db['devices'][dev]
+    if len(font_db_device['fonts']) > 0:
+        for font in font_db_device['fonts']:
+            chars = font_db['charsets'][font_db_device['fonts'][font]]
+            if common_chars == None:
+                common_chars = chars
+            else:
+                common_chars &= chars
+    elif not is_ttf:
+        print_error_log(LOG_LEVEL, LOG_LEVEL_ALWAYS, f"{dev}: empty \"fonts\" in {get_font_chars_json_file(dev)}")
+    is_missing = False
+    missing_mc_fonts = {}
+    missing_number_mc_fonts = {}
+    for fontSetArea in font_db_device['fontSets']:
+        missing_from_fontset = {}
+        for mc_font in font_db_device['fontSets'][fontSetArea]:
+            font = font_db_device['fontSets'][fontSetArea][mc_font]
+            if font not in font_db_device['fonts'] and font not in ttf_fonts:
+                if not is_ttf:
+                    print_error_log(LOG_LEVEL, LOG_LEVEL_DEBUG, f"{dev}: missing font chars for fontSet: {fontSetArea}: {mc_font}: {font}")
+                # print_error_log(LOG_LEVEL, LOG_LEVEL_ALWAYS, f"{dev}: missing: devices.{dev}.fontSets.{fontSetArea}.{mc_font}: \"{font}\"")
+                missing_from_fontset[f'{mc_font}'] = font
+                is_missing = True
+                if fontSetArea not in missing_mc_fonts:
+                    missing_mc_fonts[fontSetArea] = set()
+                missing_mc_fonts[fontSetArea].add(mc_font)
+                if 'NUMBER' in mc_font:
+                    if fontSetArea not in missing_number_mc_fonts:
+                        missing_number_mc_fonts[fontSetArea] = set()
+                    missing_number_mc_fonts[fontSetArea].add(mc_font)
+            else:
+                log(LOG_LEVEL, LOG_LEVEL_DEBUG, f"{dev}: found font chars for fontSet: {fontSetArea}: {mc_font}: {font} {' (ttf)' if font in ttf_fonts else ''}")
+        if missing_from_fontset and not is_ttf:
+            # print_error_log(LOG_LEVEL, LOG_LEVEL_ALWAYS, f"{dev}: missing: devices.{dev}.fontSets.{fontSetArea}: {missing_from_fontset}")
+            if fontSetArea == 'apac_tha' or dev == 'fr920xt':
+                print_warn_log(LOG_LEVEL, LOG_LEVEL_DEBUG, f"{dev}: missing fonts: {fontSetArea}: {missing_from_fontset}")
+            else:
+                print_error_log(LOG_LEVEL, LOG_LEVEL_ALWAYS, f"{dev}: missing fonts: {fontSetArea}: {missing_from_fontset}")
+    # if is_missing:
+    #     if missing_number_mc_fonts:
+    #         print_warn_log(LOG_LEVEL, LOG_LEVEL_ALWAYS, f"{dev}: some number font chars are missing: {missing_number_mc_fonts}")
+    #     print_error_log(LOG_LEVEL, LOG_LEVEL_DEBUG, f"{dev}: some font chars are missing: {missing_mc_fonts}")
+    # else:
+    if not is_missing:
+        print_warn_log(LOG_LEVEL, LOG_LEVEL_DEBUG, f"{dev}: no font chars are missing")
     if common_chars:
         # print_error_log(LOG_LEVEL, LOG_LEVEL_ALWAYS, f"{dev}: {common_chars}")
-        if '\x00' in common_chars:
-            common_chars.remove('\x00')
-        if '\x02' in common_chars:
-            common_chars.remove('\x02')
-        common_chars = list(common_chars)
-        common_chars.sort()
+        # without '\x00', '\x02'
+        common_chars = bitset_to_chars(common_chars & ~0b101)
 
         # with open(f"{FONTS_JSON_DIR}/{dev}.fonts.json") as fonts_json_file:
         #     fonts_json = json.load(fonts_json_file)
@@ -893,7 +1847,6 @@ def number_font(dev):
         #     to_c = ord(c)
         # if from_c != to_c and to_c > from_c + 3:
         #     print(f"chars: {to_c-from_c+1}:[{from_c} {chr(from_c)}, {to_c} {chr(to_c)}]")
-        common_chars = ''.join(common_chars)
         # print(f"{dev}: common_chars: {common_chars}")
         app_type = 'glance' if APP_TYPE == 'widget' and 'glance' in device['memory'] else APP_TYPE
         memory_limit = device['memory'][app_type]
@@ -926,7 +1879,7 @@ def number_font(dev):
     device_dir = f"{GENERATED_DEVICES_DIR}/{dev}"
     device_file = f"{device_dir}/chars.mc"
     os.makedirs(device_dir, 0o755, True)
-    with open(device_file, 'w') as output:
+    with open_generated(device_file) as output:
         # output.write(f"// GENERATED for {dev} by {GENERATROR_SIGNATURE}\n\n");
         output.write(f"// GENERATED by {GENERATROR_SIGNATURE}\n\n")
         # output.write("import Toybox.Lang;\n")
@@ -1214,7 +2167,7 @@ def font2mc_font(font, dev, font_set = '?'):
     # return if font in FONT_TO_MC_FONT and FONT_TO_MC_FONT[font] != ''
     # return 'Graphics.FONT_' + (FONT_TO_MC_FONT[font] if font in FONT_TO_MC_FONT else font.upper())
     FONT_TO_MC_FONT_CACHE[cache_key] = mc_font
-    log(LOG_LEVEL, LOG_LEVEL_DEBUG, f"{dev}: font: {font_set}:{font} => {mc_font}")
+    log(LOG_LEVEL, LOG_LEVEL_DEBUG, lambda: f"{dev}: font: {font_set}:{font} => {mc_font}")
     return mc_font
 
 def get_most_frequent_value_and_occurrences(dict):
@@ -1255,7 +2208,7 @@ def to_short_field_name(long_name):
 
 def solve_quadratic(a, b, c):
     # x1,x2 = (-b +- sqrt(b^2 - 4*a*c)) / 2*a
-    log(LOG_LEVEL, LOG_LEVEL_DEBUG, f"solve_quadratic(a: {a}, b: {b}, c: {c}): q^2: {b*b - 4*a*c}")
+    log(LOG_LEVEL, LOG_LEVEL_DEBUG, "solve_quadratic(a: %s, b: %s, c: %s): q^2: %s", a, b, c, b*b - 4*a*c)
     q = math.sqrt(b*b - 4*a*c)
     return (-b + q) / (2*a), (-b - q) / (2*a)
 
@@ -1368,7 +2321,7 @@ def intersect_circle_with_line_in_field(display_h, origo_y, radius, line_slope,
         inside_field.append(int(x2))
     bounding_box_x = max(field_x, min(inside_field)) if obscurity_flags & OBSCURITY_TO_NUMBER['left'] and inside_field else field_x
     bounding_box_w = min(field_x + field_w, max(inside_field)) - bounding_box_x if obscurity_flags & OBSCURITY_TO_NUMBER['right'] and inside_field else field_w
-    print_warn_log(LOG_LEVEL, LOG_LEVEL_DEBUG, f"intersect_circle_with_line_in_field: {log_prefix}: obscurity_flags: {obscurity_flags_str}({obscurity_flags}), inside_field: {inside_field}, field_x: {field_x}, field_y: {field_y}, field_w: {field_w}, r: {radius}, line_slope: {'%.2f' % line_slope}, line_y: {line_y}, x1: {'%.2f' % x1}, x2: {'%.2f' % x2}, min: {'%.2f' % min(inside_field) if inside_field else '-'}, max: {'%.2f' % max(inside_field) if inside_field else '-'} => {value_prefix}_x: {'%.2f' % bounding_box_x}, {value_prefix}_w: {'%.2f' % bounding_box_w}")
+    print_warn_log(LOG_LEVEL, LOG_LEVEL_DEBUG, lambda: f"intersect_circle_with_line_in_field: {log_prefix}: obscurity_flags: {obscurity_flags_str}({obscurity_flags}), inside_field: {inside_field}, field_x: {field_x}, field_y: {field_y}, field_w: {field_w}, r: {radius}, line_slope: {'%.2f' % line_slope}, line_y: {line_y}, x1: {'%.2f' % x1}, x2: {'%.2f' % x2}, min: {'%.2f' % min(inside_field) if inside_field else '-'}, max: {'%.2f' % max(inside_field) if inside_field else '-'} => {value_prefix}_x: {'%.2f' % bounding_box_x}, {value_prefix}_w: {'%.2f' % bounding_box_w}")
     return bounding_box_x, bounding_box_w
 
 # TODO: generate bounding_box(x, y, w, h) relative to dc for "worst case" (i.e: 7.1|7.4|8.1|8.3|8.5 194x82@l => bounding_box: [30, 0, 164,82]) using the data in simulator.json
@@ -1419,9 +2372,9 @@ def calculate_bounding_box(dev, field, resolution):
 
             if field_x != bounding_box_x or field_w != bounding_box_w:
                 # print_warn_log(LOG_LEVEL, LOG_LEVEL_ALWAYS, f"calculate_bounding_box: {field['gen']['short_name']}: bounding_box_top_x: {bounding_box_top_x}, bounding_box_bottom_x: {bounding_box_bottom_x}")
-                print_warn_log(LOG_LEVEL, LOG_LEVEL_INPUT, f"calculate_bounding_box: {field['gen']['short_name']}: bounding_box_x: {field_x} => {bounding_box_x}, bounding_box_w: {field_w} => {bounding_box_w}")
+                print_warn_log(LOG_LEVEL, LOG_LEVEL_INPUT, lambda: f"calculate_bounding_box: {field['gen']['short_name']}: bounding_box_x: {field_x} => {bounding_box_x}, bounding_box_w: {field_w} => {bounding_box_w}")
             else:
-                log(LOG_LEVEL, LOG_LEVEL_DEBUG, f"calculate_bounding_box: {field['gen']['short_name']}: bounding_box_x: {field_x} => {bounding_box_x}, bounding_box_w: {field_w} => {bounding_box_w}")
+                log(LOG_LEVEL, LOG_LEVEL_DEBUG, lambda: f"calculate_bounding_box: {field['gen']['short_name']}: bounding_box_x: {field_x} => {bounding_box_x}, bounding_box_w: {field_w} => {bounding_box_w}")
 
         case 7: # "rtl", // right-top-left: top-arc | top-half
             # # sx/sy=field_w/field_h, sx^2+sy^2=r^2 ; sy=field_w/(field_h*sx) ; sx^2+(field_w/(field_h*sx))^2=r^2 ; sx^2+(fw^2/fh^2/sx^2)=r^2 ; sx!=0 | sx^4+fw^2/fh^2-r^2*sx^2=0
@@ -1444,7 +2397,7 @@ def calculate_bounding_box(dev, field, resolution):
             bounding_box_w = bounding_box_x2 - bounding_box_x
             bounding_box_y = int((field_h / (field_w / 2)) * (field_x + bounding_box_x)) + 0
             bounding_box_h = field_h - bounding_box_y
-            log(LOG_LEVEL, LOG_LEVEL_DEBUG, f"calculate_bounding_box: {field['gen']['short_name']}: bounding_box_x: {'%.2f' % bounding_box_x}, bounding_box_y: {'%.2f' % bounding_box_y}, bounding_box_w: {'%.2f' % bounding_box_w}, bounding_box_h: {'%.2f' % bounding_box_h}")
+            log(LOG_LEVEL, LOG_LEVEL_DEBUG, lambda: f"calculate_bounding_box: {field['gen']['short_name']}: bounding_box_x: {'%.2f' % bounding_box_x}, bounding_box_y: {'%.2f' % bounding_box_y}, bounding_box_w: {'%.2f' % bounding_box_w}, bounding_box_h: {'%.2f' % bounding_box_h}")
 
         case 13: # "brl", // bottom-right-left: bottom-arc | bottom-half
             # line: y = field_h/(field_w/2)*x + display_h - 2 * (field_h) ; -field_h/(field_w/2)*x + display_h
@@ -1452,7 +2405,7 @@ def calculate_bounding_box(dev, field, resolution):
             bounding_box_x2, bounding_box_w = intersect_circle_with_line_in_field(display_h, origo_y, radius, field_h / (field_w / 2), display_h -2 * (field_h), field_x, field_y, field_w, field_h, obscurity_flags, obscurity_flags_str, f"calculate_bounding_box: {field['gen']['short_name']}", 'bounding_box')
             bounding_box_w = bounding_box_x2 - bounding_box_x
             bounding_box_h = int((-field_h / (field_w / 2)) * (bounding_box_x)) + display_h - field_y
-            log(LOG_LEVEL, LOG_LEVEL_DEBUG, f"calculate_bounding_box: {field['gen']['short_name']}: bounding_box_x: {'%.2f' % bounding_box_x}, bounding_box_y: {'%.2f' % bounding_box_y}, bounding_box_w: {'%.2f' % bounding_box_w}, bounding_box_h: {'%.2f' % bounding_box_h}")
+            log(LOG_LEVEL, LOG_LEVEL_DEBUG, lambda: f"calculate_bounding_box: {field['gen']['short_name']}: bounding_box_x: {'%.2f' % bounding_box_x}, bounding_box_y: {'%.2f' % bounding_box_y}, bounding_box_w: {'%.2f' % bounding_box_w}, bounding_box_h: {'%.2f' % bounding_box_h}")
 
         case 3: # "tl", // top-left: top-left-arc
             bounding_box_x = origo_x - quarter_box_side
@@ -1492,6 +2445,137 @@ def calculate_bounding_box(dev, field, resolution):
     # convert absolute coordinates to relative to the field
     return {'x': bounding_box_x - field_x, 'y': bounding_box_y - field_y, 'width': bounding_box_w, 'height': bounding_box_h}
 
+# Vectorized version of calculate_bounding_box() for the fields of all the devices at once.
+# It does the same floating point operations in the same order as the scalar version, so the results are identical.
+# It's only used when the per field logs of the scalar version are not printed anyway. The fields where the scalar version
+# would fail or print an error (i.e: no intersection, unknown obscurity) are left as None, and calculate_bounding_boxes()
+# calculates them with the scalar version.
+PRECALCULATED_BOUNDING_BOXES = {}
+
+def intersect_circle_with_line_in_fields(display_h, origo_y, radius, line_slope, line_y, field_x, field_y, field_w, field_h, obscurity_flags):
+    x1, x2 = solve_quadratics(1 + line_slope*line_slope, -2*origo_y + 2 * line_slope * (line_y - origo_y),
+        origo_y*origo_y + line_y*line_y - 2*line_y*origo_y + origo_y*origo_y - radius*radius)
+    y1 = line_slope * x1 + line_y
+    y2 = line_slope * x2 + line_y
+    inside_field1 = (field_x <= x1) & (x1 <= field_x + field_w) & (field_y <= y1) & (y1 <= field_y + field_h)
+    inside_field2 = (field_x <= x2) & (x2 <= field_x + field_w) & (field_y <= y2) & (y2 <= field_y + field_h)
+    int_x1 = np.trunc(x1)
+    int_x2 = np.trunc(x2)
+    inside_field_min = np.where(inside_field1 & inside_field2, np.minimum(int_x1, int_x2), np.where(inside_field1, int_x1, int_x2))
+    inside_field_max = np.where(inside_field1 & inside_field2, np.maximum(int_x1, int_x2), np.where(inside_field1, int_x1, int_x2))
+    inside_field = inside_field1 | inside_field2
+    bounding_box_x = np.where(((obscurity_flags & OBSCURITY_TO_NUMBER['left']) != 0) & inside_field, np.maximum(field_x, inside_field_min), field_x)
+    bounding_box_w = np.where(((obscurity_flags & OBSCURITY_TO_NUMBER['right']) != 0) & inside_field, np.minimum(field_x + field_w, inside_field_max) - bounding_box_x, field_w)
+    # where the line doesn't intersect the circle math.sqrt would fail in the scalar version
+    return bounding_box_x, bounding_box_w, ~np.isnan(x1)
+
+def solve_quadratics(a, b, c):
+    discriminant = b*b - 4*a*c
+    q = np.sqrt(np.where(discriminant >= 0, discriminant, np.nan))
+    return (-b + q) / (2*a), (-b - q) / (2*a)
+
+@timed_phase
+def calculate_fleet_bounding_boxes(devices):
+    if np is None or LOG_LEVEL >= LOG_LEVEL_INPUT:
+        return
+    field_devs = []
+    columns = {'display_w': [], 'display_h': [], 'field_x': [], 'field_y': [], 'field_w': [], 'field_h': [], 'obscurity_flags': []}
+    for dev in devices:
+        device = DEVICES[dev]
+        if dev == 'base' or 'layouts' not in device['simulator'] or device['simulator']['display']['shape'] not in ['round', 'semi-round', 'semi-octagon']:
+            continue
+        resolution = device['compiler']['resolution']
+        for layout in device['simulator']['layouts']:
+            for datafield in layout['datafields']['datafields']:
+                for field in datafield['fields']:
+                    field_devs.append(dev)
+                    columns['display_w'].append(resolution['width'])
+                    columns['display_h'].append(resolution['height'])
+                    columns['field_x'].append(field['location']['x'])
+                    columns['field_y'].append(field['location']['y'])
+                    columns['field_w'].append(field['location']['width'])
+                    columns['field_h'].append(field['location']['height'])
+                    columns['obscurity_flags'].append(field2obscurity_flags_int(field))
+    if not field_devs:
+        return
+
+    with np.errstate(all='ignore'):
+        display_w = np.array(columns['display_w'], dtype=np.float64)
+        display_h = np.array(columns['display_h'], dtype=np.float64)
+        field_x = np.array(columns['field_x'], dtype=np.float64)
+        field_y = np.array(columns['field_y'], dtype=np.float64)
+        field_w = np.array(columns['field_w'], dtype=np.float64)
+        field_h = np.array(columns['field_h'], dtype=np.float64)
+        obscurity_flags = np.array(columns['obscurity_flags'], dtype=np.int64)
+        origo_x = np.trunc(display_w / 2)
+        origo_y = np.trunc(display_h / 2)
+        radius = np.trunc(display_h / 2)
+        quarter_box_side = np.trunc(np.sqrt(radius*radius/2))
+
+        bounding_box_x = field_x.copy()
+        bounding_box_y = field_y.copy()
+        bounding_box_w = field_w.copy()
+        bounding_box_h = field_h.copy()
+        is_valid = np.zeros(len(field_devs), dtype=bool)
+
+        # 1, 4, 5: "l", "r", "rl": middle fields
+        rows = (obscurity_flags == 1) | (obscurity_flags == 4) | (obscurity_flags == 5)
+        top_x, top_w, top_valid = intersect_circle_with_line_in_fields(display_h, origo_y, radius, 0, field_y, field_x, field_y, field_w, field_h, obscurity_flags)
+        bottom_x, bottom_w, bottom_valid = intersect_circle_with_line_in_fields(display_h, origo_y, radius, 0, field_y + field_h, field_x, field_y, field_w, field_h, obscurity_flags)
+        bounding_box_x = np.where(rows, np.maximum(top_x, bottom_x), bounding_box_x)
+        bounding_box_w = np.where(rows, np.minimum(top_w, bottom_w), bounding_box_w)
+        is_valid |= rows & top_valid & bottom_valid
+
+        # 7: "rtl": top-arc
+        rows = (obscurity_flags == 7) & (field_w != 0)
+        slope = field_h / (field_w / 2)
+        x1, w1, valid1 = intersect_circle_with_line_in_fields(display_h, origo_y, radius, slope, 0, field_x, field_y, field_w, field_h, obscurity_flags)
+        x2, w2, valid2 = intersect_circle_with_line_in_fields(display_h, origo_y, radius, -field_h / (field_w / 2), 2 * (field_y + field_h), field_x, field_y, field_w, field_h, obscurity_flags)
+        top_arc_y = np.trunc((field_h / (field_w / 2)) * (field_x + x1)) + 0
+        bounding_box_x = np.where(rows, x1, bounding_box_x)
+        bounding_box_w = np.where(rows, x2 - x1, bounding_box_w)
+        bounding_box_y = np.where(rows, top_arc_y, bounding_box_y)
+        bounding_box_h = np.where(rows, field_h - top_arc_y, bounding_box_h)
+        is_valid |= rows & valid1 & valid2
+
+        # 13: "brl": bottom-arc
+        rows = (obscurity_flags == 13) & (field_w != 0)
+        x1, w1, valid1 = intersect_circle_with_line_in_fields(display_h, origo_y, radius, -field_h / (field_w / 2), display_h, field_x, field_y, field_w, field_h, obscurity_flags)
+        x2, w2, valid2 = intersect_circle_with_line_in_fields(display_h, origo_y, radius, field_h / (field_w / 2), display_h -2 * (field_h), field_x, field_y, field_w, field_h, obscurity_flags)
+        bottom_arc_h = np.trunc((-field_h / (field_w / 2)) * (x1)) + display_h - field_y
+        bounding_box_x = np.where(rows, x1, bounding_box_x)
+        bounding_box_w = np.where(rows, x2 - x1, bounding_box_w)
+        bounding_box_h = np.where(rows, bottom_arc_h, bounding_box_h)
+        is_valid |= rows & valid1 & valid2
+
+        # 3, 6, 9, 12, 15: "tl", "rt", "bl", "br", "brtl": quarter arcs and full-screen field
+        for flags, quarter_x, quarter_y, quarter_size in [(3, -1, -1, 1), (6, 0, -1, 1), (9, -1, 0, 1), (12, 0, 0, 1), (15, -1, -1, 2)]:
+            rows = obscurity_flags == flags
+            bounding_box_x = np.where(rows, origo_x + quarter_x * quarter_box_side, bounding_box_x)
+            bounding_box_y = np.where(rows, origo_y + quarter_y * quarter_box_side, bounding_box_y)
+            bounding_box_w = np.where(rows, quarter_size * quarter_box_side, bounding_box_w)
+            bounding_box_h = np.where(rows, quarter_size * quarter_box_side, bounding_box_h)
+            is_valid |= rows
+
+        # 0: no obscurity
+        is_valid |= obscurity_flags == 0
+
+        # convert absolute coordinates to relative to the field
+        boxes = np.stack([bounding_box_x - field_x, bounding_box_y - field_y, bounding_box_w, bounding_box_h], axis = 1)
+        is_valid &= ~np.isnan(boxes).any(axis = 1)
+        boxes = np.where(is_valid[:, None], boxes, 0).astype(np.int64).tolist()
+
+    is_valid = is_valid.tolist()
+    # new lists for the devices, so calculating them again (i.e: for the next variant with --matrix) replaces them
+    devices_boxes = {}
+    for i, dev in enumerate(field_devs):
+        if dev not in devices_boxes:
+            devices_boxes[dev] = []
+        x, y, w, h = boxes[i]
+        devices_boxes[dev].append({'x': x, 'y': y, 'width': w, 'height': h} if is_valid[i] else None)
+    PRECALCULATED_BOUNDING_BOXES.update(devices_boxes)
+    log(LOG_LEVEL, LOG_LEVEL_BASIC, f"calculate_fleet_bounding_boxes: {sum(is_valid)} of {len(field_devs)} fields")
+
 def calculate_bounding_boxes(dev):
     device = DEVICES[dev]
     shape = device['simulator']['display']['shape']
@@ -1501,11 +2585,19 @@ def calculate_bounding_boxes(dev):
         print_error(f"{dev}: compiler.resolution: width: {resolution['width']} != height: {resolution['height']}")
     if resolution['width'] != location['width'] or resolution['height'] != location['height']:
         print_error(f"{dev}: compiler.resolution: {resolution} != simulator.display.location: {location}")
-    log(LOG_LEVEL, LOG_LEVEL_DEBUG, f"{dev}: calculate_bounding_boxes: shape: {shape}, resolution: {resolution}, location: {location}")
-
+    log(LOG_LEVEL, LOG_LEVEL_DEBUG, lambda: f"{dev}: calculate_bounding_boxes: shape: {shape}, resolution: {resolution}, location: {location}")
+
+    precalculated_bounding_boxes = PRECALCULATED_BOUNDING_BOXES.get(dev)
+    if precalculated_bounding_boxes is not None:
+        fields_count = sum(len(datafield['fields']) for layout in device['simulator']['layouts'] for datafield in layout['datafields']['datafields'])
+        if len(precalculated_bounding_boxes) != fields_count:
+            print_error(f"{dev}: calculate_bounding_boxes: precalculated bounding boxes: {len(precalculated_bounding_boxes)} != fields: {fields_count}, calculating them one by one")
+            precalculated_bounding_boxes = None
+    field_idx = -1
     for layout in device['simulator']['layouts']:
         for datafield in layout['datafields']['datafields']:
             for field in datafield['fields']:
+                field_idx += 1
                 if 'func' not in field['gen']:
                     field['gen']['func'] = {}
                 if 'bounding_box' not in field['gen']['func']:
@@ -1520,7 +2612,10 @@ def calculate_bounding_boxes(dev):
                             print_error(f"{dev}: calculate_bounding_boxes: unknown obscurity_flags on rectangle device in field:{field['gen']['short_name']}: {obscurity_flags}")
                         gen.update(field['location'])
                     case 'round' | 'semi-round' | 'semi-octagon':
-                        gen.update(calculate_bounding_box(dev, field, resolution))
+                        if precalculated_bounding_boxes and precalculated_bounding_boxes[field_idx]:
+                            gen.update(precalculated_bounding_boxes[field_idx])
+                        else:
+                            gen.update(calculate_bounding_box(dev, field, resolution))
                     case _:
                         print_error(f"{dev}: calculate_bounding_boxes: unknown display shape: {shape}")
                 # log(LOG_LEVEL, LOG_LEVEL_ALWAYS, f"calculate_bounding_boxes: {field['gen']['short_name']}: location: {field['location']}")
@@ -1544,19 +2639,19 @@ def datafield_layout(dev):
     log_level = LOG_LEVEL
     # log(LOG_LEVEL, LOG_LEVEL_ALWAYS, f"datafield_layout: {dev}")
     # log(log_level, LOG_LEVEL_OUTPUT, f"{dev}:")
-    result = {
-        'label_font': get_datafield_hash_data_font_values(dev, 'label_font', lambda field: field['label']['font'] if has_label(field) else False, log_level = log_level),
-        'label_x': get_datafield_hash_data_values(dev, 'label_x', 'min', lambda field: field['label']['x'] if has_label(field) else False, max_delta, max_value, log_level = log_level),
-        'label_y': get_datafield_hash_data_values(dev, 'label_y', 'min', lambda field: field['label']['y'] if has_label(field) else False, max_delta, max_value, log_level = log_level),
-        'label_justification': get_datafield_hash_data_justification_values(dev, 'label_justification', lambda field: field['label']['justification'] if has_label(field) else False, log_level = log_level),
-        'data_x': get_datafield_hash_data_values(dev, 'data_x', 'min', lambda field: field['data']['x'], max_delta, max_value, log_level = log_level),
-        'data_y': get_datafield_hash_data_values(dev, 'data_y', 'min', lambda field: field['data']['y'], max_delta, max_value, log_level = log_level),
-        'data_justification': get_datafield_hash_data_justification_values(dev, 'data_justification', lambda field: field['data']['justification'], log_level = log_level),
-        'bounding_box_x': get_datafield_hash_data_values(dev, 'bounding_box_x', 'max', lambda field: field['gen']['func']['bounding_box']['x'], max_delta = 1000, max_value = max_value, log_level = log_level),
-        'bounding_box_y': get_datafield_hash_data_values(dev, 'bounding_box_y', 'max', lambda field: field['gen']['func']['bounding_box']['y'], max_delta = 1000, max_value = max_value, log_level = log_level),
-        'bounding_box_width': get_datafield_hash_data_values(dev, 'bounding_box_width', 'min', lambda field: field['gen']['func']['bounding_box']['width'], max_delta = 1000, max_value = max_value, log_level = log_level),
-        'bounding_box_height': get_datafield_hash_data_values(dev, 'bounding_box_height', 'min', lambda field: field['gen']['func']['bounding_box']['height'], max_delta = 1000, max_value = max_value, log_level = log_level),
-    }
+    result = get_datafield_hash_data_multi_values(dev, {
+        'label_font': datafield_metric('min', lambda field: field['label']['font'] if has_label(field) else False, post_func = lambda gen: to_datafield_hash_data_font_values(dev, gen)),
+        'label_x': datafield_metric('min', lambda field: field['label']['x'] if has_label(field) else False, max_delta, max_value),
+        'label_y': datafield_metric('min', lambda field: field['label']['y'] if has_label(field) else False, max_delta, max_value),
+        'label_justification': datafield_metric('min', lambda field: field['label']['justification'] if has_label(field) else False, post_func = to_datafield_hash_data_justification_values),
+        'data_x': datafield_metric('min', lambda field: field['data']['x'], max_delta, max_value),
+        'data_y': datafield_metric('min', lambda field: field['data']['y'], max_delta, max_value),
+        'data_justification': datafield_metric('min', lambda field: field['data']['justification'], post_func = to_datafield_hash_data_justification_values),
+        'bounding_box_x': datafield_metric('max', lambda field: field['gen']['func']['bounding_box']['x'], max_delta = 1000, max_value = max_value),
+        'bounding_box_y': datafield_metric('max', lambda field: field['gen']['func']['bounding_box']['y'], max_delta = 1000, max_value = max_value),
+        'bounding_box_width': datafield_metric('min', lambda field: field['gen']['func']['bounding_box']['width'], max_delta = 1000, max_value = max_value),
+        'bounding_box_height': datafield_metric('min', lambda field: field['gen']['func']['bounding_box']['height'], max_delta = 1000, max_value = max_value),
+    }, log_level = log_level)
 
     increase_hebrew_label_font = False
     prefix = ''
@@ -1576,11 +2671,20 @@ def datafield_layout(dev):
 
         prefix = f"(:datafield, :hebrew) const INCREASE_HEBREW_LABEL_FONT_SIZE = {'true' if increase_hebrew_label_font else 'false'};\n"
 
-    generate_datafield_file(dev, 'datafield_layout.mc', result, prefix)
+    packed = get_datafield_packed(dev, result) if get_conf('datafield_layout_format') == 'packed' else None
+    generate_datafield_file(dev, 'datafield_layout.mc', result, prefix, packed = packed)
 
-    sourceDirs = list(filter(None, [has_directory(f"{GENERATED_FEATURES_DIR}/datafield_layout"), has_directory(f"{GENERATED_DEVICES_DIR}/{dev}")]))
+    sourceDirs = list(filter(None, [has_directory(f"{GENERATED_FEATURES_DIR}/{'datafield_layout_packed' if packed else 'datafield_layout'}"), has_directory(f"{GENERATED_DEVICES_DIR}/{dev}")]))
     return [';'.join(sourceDirs), '', '']
-pre_register(datafield_layout, 'datafield_layout', dependencies=['languages'])
+
+def check_datafield_layout_format():
+    datafield_layout_format = get_conf('datafield_layout_format')
+    if datafield_layout_format == 'packed':
+        copy_gen_directory_if_not_exists('datafield_layout_packed')
+    elif datafield_layout_format not in ['', 'dict']:
+        print_error(f"unknown datafield_layout_format: {datafield_layout_format}, supported: dict, packed")
+        sys.exit(1)
+pre_register(datafield_layout, 'datafield_layout', check_datafield_layout_format, dependencies=['languages'])
 
 
 def datafield_detector(dev):
@@ -1652,10 +2756,10 @@ def datafield_detector(dev):
 
     log_level = LOG_LEVEL
     # log(log_level, LOG_LEVEL_OUTPUT, f"{dev}:")
-    result = {
-        'field_names': get_datafield_hash_data_values(dev, 'field_names', 'concat', lambda field: field['gen']['short_name'], log_level = log_level),
-        'field_status': get_datafield_hash_data_values(dev, 'field_status', 'min', lambda field: device_hash2status[field['gen']['hash']], log_level = log_level),
-    }
+    result = get_datafield_hash_data_multi_values(dev, {
+        'field_names': datafield_metric('concat', lambda field: field['gen']['short_name']),
+        'field_status': datafield_metric('min', lambda field: device_hash2status[field['gen']['hash']]),
+    }, log_level = log_level)
 
     postfix = "(:datafield_detector)\n" + \
         f"const DEVICE_STATUS = {device_status};\n"
@@ -1684,11 +2788,98 @@ DICTIONARY_VALUE_TYPE = {
     'bounding_box_height': 'Number' + COMMON_TYPE,
 }
 
-def generate_datafield_file(dev, filename, result, prefix = '', postfix = ''):
+# datafield_layout_format = packed: all the values of a hash are packed into one array of Numbers in DATAFIELD_HASH_2_PACKED
+# the order has to be kept in sync with the DATAFIELD_PACKED_* consts in features/datafield_layout_packed/datafield_layout.mc
+DATAFIELD_PACKED_METRICS = ['label_font', 'label_x', 'label_y', 'label_justification', 'data_x', 'data_y', 'data_justification',
+                            'bounding_box_x', 'bounding_box_y', 'bounding_box_width', 'bounding_box_height']
+# values of these metrics are packed as indexes of the arrays
+DATAFIELD_PACKED_INDEXED_METRICS = {
+    'label_font': 'LABEL_FONTS',
+    'label_justification': 'JUSTIFICATIONS',
+    'data_justification': 'JUSTIFICATIONS',
+}
+DATAFIELD_PACKED_BITS = 10
+DATAFIELD_PACKED_VALUES_PER_NUMBER = 3
+# estimated memory usage of the generated constants on the device, used to compare the dict and the packed formats
+MC_OBJECT_SIZE = 12
+MC_VALUE_SIZE = 5
+MC_DICTIONARY_ENTRY_SIZE = 2 * MC_VALUE_SIZE
+
+# removes the comments, i.e: '130 /*min value*/' -> 130, 'null /*conflict*/' -> 'null'
+def without_mc_comments(mc_value):
+    if not isinstance(mc_value, str):
+        return mc_value
+    mc_value = re.sub(r'\s*/\*.*?\*/', '', mc_value).strip()
+    return int(mc_value) if re.match(r'^-?\d+$', mc_value) else mc_value
+
+# returns the packed field of mc_value: 0: null, 1: false, otherwise: value + 2, or None if it doesn't fit,
+# false only fits the metrics whose type has Boolean (the labels'), so the others are never decoded as a Boolean
+def to_datafield_packed_value(mc_value, values, can_be_false):
+    mc_value = without_mc_comments(mc_value)
+    if mc_value == 'null':
+        return 0
+    if mc_value == 'false':
+        return 1 if can_be_false else None
+    if values is not None:
+        if mc_value not in values:
+            values.append(mc_value)
+        packed_value = values.index(mc_value) + 2
+    elif isinstance(mc_value, int) and not isinstance(mc_value, bool) and mc_value >= 0:
+        packed_value = mc_value + 2
+    else:
+        return None
+    return packed_value if packed_value < 1 << DATAFIELD_PACKED_BITS else None
+
+def get_datafield_dictionaries_size(result):
+    size = 0
+    for key in result:
+        gen = result[key]
+        default_value = to_mc_value(get_first_most_frequent_value(gen))
+        entries = sum(1 for hash in gen['hash_map'] if to_mc_value(gen['hash_map'][hash]['value']) != default_value)
+        size += MC_OBJECT_SIZE + entries * MC_DICTIONARY_ENTRY_SIZE
+    return size
+
+# returns the data to generate DATAFIELD_HASH_2_PACKED or None when the dict format should be used for dev
+def get_datafield_packed(dev, result):
+    missing_metrics = [key for key in DATAFIELD_PACKED_METRICS if key not in result]
+    if missing_metrics:
+        print_error(f"{dev}: datafield_layout_format: packed: missing metrics: {missing_metrics}")
+        return None
+    defaults = {key: to_mc_value(get_first_most_frequent_value(result[key])) for key in DATAFIELD_PACKED_METRICS}
+    boolean_defaults = [key for key in DATAFIELD_PACKED_METRICS if without_mc_comments(defaults[key]) == 'false' and 'Boolean' not in DICTIONARY_VALUE_TYPE[key]]
+    if boolean_defaults:
+        log(LOG_LEVEL, LOG_LEVEL_BASIC, f"{dev}: datafield_layout_format: packed: the defaults of {boolean_defaults} are false, using dict")
+        return None
+    tables = {name: [] for name in DATAFIELD_PACKED_INDEXED_METRICS.values()}
+    hash_map = {}
+    for hash in result[DATAFIELD_PACKED_METRICS[0]]['hash_map']:
+        mc_values = [to_mc_value(result[key]['hash_map'][hash]['value']) for key in DATAFIELD_PACKED_METRICS]
+        if [without_mc_comments(mc_value) for mc_value in mc_values] == [without_mc_comments(defaults[key]) for key in DATAFIELD_PACKED_METRICS]:
+            continue
+        numbers = [0] * -(-len(DATAFIELD_PACKED_METRICS) // DATAFIELD_PACKED_VALUES_PER_NUMBER)
+        for i, (key, mc_value) in enumerate(zip(DATAFIELD_PACKED_METRICS, mc_values)):
+            packed_value = to_datafield_packed_value(mc_value, tables[DATAFIELD_PACKED_INDEXED_METRICS[key]] if key in DATAFIELD_PACKED_INDEXED_METRICS else None,
+                'Boolean' in DICTIONARY_VALUE_TYPE[key])
+            if packed_value is None:
+                log(LOG_LEVEL, LOG_LEVEL_BASIC, f"{dev}: datafield_layout_format: packed: {key}: {mc_value} doesn't fit, using dict")
+                return None
+            numbers[i // DATAFIELD_PACKED_VALUES_PER_NUMBER] |= packed_value << (DATAFIELD_PACKED_BITS * (i % DATAFIELD_PACKED_VALUES_PER_NUMBER))
+        hash_map[hash] = {'hash_key': result[DATAFIELD_PACKED_METRICS[0]]['hash_map'][hash]['hash_key'], 'numbers': numbers, 'mc_values': mc_values}
+
+    dict_size = get_datafield_dictionaries_size(result)
+    packed_size = MC_OBJECT_SIZE + sum(MC_DICTIONARY_ENTRY_SIZE + MC_OBJECT_SIZE + len(hash_obj['numbers']) * MC_VALUE_SIZE for hash_obj in hash_map.values()) + \
+        sum(MC_OBJECT_SIZE + len(values) * MC_VALUE_SIZE for values in tables.values())
+    if packed_size >= dict_size:
+        log(LOG_LEVEL, LOG_LEVEL_BASIC, f"{dev}: datafield_layout_format: packed: ~{packed_size} bytes is not smaller than dict: ~{dict_size} bytes, using dict")
+        return None
+    log(LOG_LEVEL, LOG_LEVEL_BASIC, f"{dev}: datafield_layout_format: packed: ~{packed_size} bytes instead of ~{dict_size} bytes, saved: ~{dict_size - packed_size} bytes")
+    return {'defaults': defaults, 'tables': tables, 'hash_map': hash_map}
+
+def generate_datafield_file(dev, filename, result, prefix = '', postfix = '', packed = None):
     device_dir = f"{GENERATED_DEVICES_DIR}/{dev}"
     device_file = f"{device_dir}/{filename}"
     os.makedirs(device_dir, 0o755, True)
-    with open(device_file, 'w') as output:
+    with open_generated(device_file) as output:
         # output.write(f"// GENERATED for {dev} by {GENERATROR_SIGNATURE}\n\n");
         output.write(f"// GENERATED by {GENERATROR_SIGNATURE}\n\n")
         output.write("import Toybox.Lang;\n")
@@ -1702,24 +2893,39 @@ def generate_datafield_file(dev, filename, result, prefix = '', postfix = ''):
 
         device = DEVICES[dev]
         used_ttf_fonts = set()
-        for key in result:
-            gen = result[key]
-            KEY = key.upper()
-            default_value = to_mc_value(get_first_most_frequent_value(gen))
-            used_ttf_fonts.add(default_value)
-            output.write(f"(:datafield, :datafield_hash, :datafield_{key}) const DEFAULT_{KEY} = {default_value}; // {destring_arr_values(to_mc_value(gen['most_frequent_value'])) + ' ' if isinstance(gen['most_frequent_value'], list) else ''}x{gen['most_frequent_value_count']}\n")
-            # if key.endswith('_justification'):
-            #     output.write(f"(:datafield, :datafield_hash, :datafield_{key}) const HAS_DATAFIELD_HASH_2_{KEY} = {'false' if gen['default_value'] is not None else 'true'};\n")
-            output.write(f"(:datafield, :datafield_hash, :datafield_{key}) const DATAFIELD_HASH_2_{KEY} = {{\n")
-            for hash in gen['hash_map']:
-                hash_obj = gen['hash_map'][hash]
-                value = to_mc_value(hash_obj['value'])
-                used_ttf_fonts.add(value)
-                if value != default_value:
-                    output.write(f"\t{hash} /*{hash_obj['hash_key']}*/ => {value}, // {destring_arr_dict_values(hash_obj['field_values'])}\n")
-                else:
-                    output.write(f"\t// {hash} /*{hash_obj['hash_key']}*/ => {value} /*default*/, // {destring_arr_dict_values(hash_obj['field_values'])}\n")
-            output.write(f"}} as Dictionary<Number, {DICTIONARY_VALUE_TYPE[key]}>;\n\n")
+        if packed:
+            for key in DATAFIELD_PACKED_METRICS:
+                gen = result[key]
+                default_value = packed['defaults'][key]
+                used_ttf_fonts.add(default_value)
+                output.write(f"(:datafield, :datafield_hash, :datafield_{key}) const DEFAULT_{key.upper()} = {default_value}; // {destring_arr_values(to_mc_value(gen['most_frequent_value'])) + ' ' if isinstance(gen['most_frequent_value'], list) else ''}x{gen['most_frequent_value_count']}\n")
+            output.write("\n")
+            for name, values in packed['tables'].items():
+                used_ttf_fonts.update(values)
+                output.write(f"(:datafield, :datafield_hash) const DATAFIELD_PACKED_{name} = [{', '.join(str(value) for value in values)}];\n")
+            output.write(f"(:datafield, :datafield_hash) const DATAFIELD_HASH_2_PACKED = {{ // [{', '.join(DATAFIELD_PACKED_METRICS)}]\n")
+            for hash, hash_obj in packed['hash_map'].items():
+                output.write(f"\t{hash} /*{hash_obj['hash_key']}*/ => [{', '.join(str(number) for number in hash_obj['numbers'])}], // [{', '.join(str(value) for value in hash_obj['mc_values'])}]\n")
+            output.write("} as Dictionary<Number, Array<Number> >;\n\n")
+        else:
+            for key in result:
+                gen = result[key]
+                KEY = key.upper()
+                default_value = to_mc_value(get_first_most_frequent_value(gen))
+                used_ttf_fonts.add(default_value)
+                output.write(f"(:datafield, :datafield_hash, :datafield_{key}) const DEFAULT_{KEY} = {default_value}; // {destring_arr_values(to_mc_value(gen['most_frequent_value'])) + ' ' if isinstance(gen['most_frequent_value'], list) else ''}x{gen['most_frequent_value_count']}\n")
+                # if key.endswith('_justification'):
+                #     output.write(f"(:datafield, :datafield_hash, :datafield_{key}) const HAS_DATAFIELD_HASH_2_{KEY} = {'false' if gen['default_value'] is not None else 'true'};\n")
+                output.write(f"(:datafield, :datafield_hash, :datafield_{key}) const DATAFIELD_HASH_2_{KEY} = {{\n")
+                for hash in gen['hash_map']:
+                    hash_obj = gen['hash_map'][hash]
+                    value = to_mc_value(hash_obj['value'])
+                    used_ttf_fonts.add(value)
+                    if value != default_value:
+                        output.write(f"\t{hash} /*{hash_obj['hash_key']}*/ => {value}, // {destring_arr_dict_values(hash_obj['field_values'])}\n")
+                    else:
+                        output.write(f"\t// {hash} /*{hash_obj['hash_key']}*/ => {value} /*default*/, // {destring_arr_dict_values(hash_obj['field_values'])}\n")
+                output.write(f"}} as Dictionary<Number, {DICTIONARY_VALUE_TYPE[key]}>;\n\n")
 
         if 'ttf_fonts' in device['simulator'] and device['simulator']['ttf_fonts']:
             # output.write(f"(:datafield, :datafield_hash, :datafield_ttf) const SCREEN_PPI = {device['simulator']['ppi']};\n")
@@ -1740,7 +2946,7 @@ def generate_datafield_file(dev, filename, result, prefix = '', postfix = ''):
 
 
 def read_datafield_hash_data(dev):
-    log(LOG_LEVEL, LOG_LEVEL_DEBUG, f"read_datafield_hash_data: {dev}")
+    log(LOG_LEVEL, LOG_LEVEL_DEBUG, lambda: f"read_datafield_hash_data: {dev}")
     if dev == 'base':
         return
 
@@ -1842,122 +3048,166 @@ def is_numeric_array(arr):
         is_numeric &= type(o) == int
     return is_numeric
 
+# A metric is one value of the fields (i.e: label_x) that is aggregated by the hash of the fields
+# post_func is called with the result of the metric (i.e: to convert the values to Monkey C)
+def datafield_metric(multiple_values_aggregator, getter_func, max_delta = 0, max_value = None, post_func = None):
+    return {'aggregator': multiple_values_aggregator, 'getter_func': getter_func, 'max_delta': max_delta, 'max_value': max_value, 'post_func': post_func}
+
 def get_datafield_hash_data_values(dev, getter_func_name, multiple_values_aggregator, getter_func, max_delta = 0, max_value = None, log_level = LOG_LEVEL):
     # log(LOG_LEVEL, LOG_LEVEL_ALWAYS, f"get_datafield_hash_data_values(dev: {dev}, getter_func_name: {getter_func_name}, aggregator: {multiple_values_aggregator}, getter_func: {getter_func}, max_delta: {max_delta}, log_level: {log_level})")
+    metrics = {getter_func_name: datafield_metric(multiple_values_aggregator, getter_func, max_delta, max_value)}
+    return get_datafield_hash_data_multi_values(dev, metrics, log_level)[getter_func_name]
+
+# Walks the layouts of the device once and evaluates all the metrics for every field.
+# The values are collected in dicts (used as ordered sets), the log messages are collected per metric,
+# so the results and the log are the same as if the metrics were calculated one after the other.
+def get_datafield_hash_data_multi_values(dev, metrics, log_level = LOG_LEVEL):
     device = DEVICES[dev]
 
-    # field2value = {}
-    device_hash2values = {}
-    device_value_counter = {}
-    device_value_2_hashes = {}
-    device_most_frequent_value_count = 0
-    # device_value = None
-    # device_status = HashValueStatus.KNOWN_VALUE
-    device_hash2field_names = {}
-    device_hash2field_values = {}
     hash2hash_key = {}
-    layout2status = {}
-    layout2value = {}
-    log(log_level, LOG_LEVEL_INPUT, f"\t{getter_func_name} input:")
+    device_hash2field_names = {}
+    states = {}
+    for getter_func_name in metrics:
+        states[getter_func_name] = {
+            'messages': [],
+            'device_hash2values': {},
+            'device_value_2_hashes': {},
+            'device_hash2field_values': {},
+            'layout_value_counter': {},
+            'layout_most_frequent_value_count': 0,
+            'layout_value': False,
+        }
+        if log_level >= LOG_LEVEL_INPUT:
+            states[getter_func_name]['messages'].append((LOG_LEVEL_INPUT, False, f"\t{getter_func_name} input:"))
     for layout in device['simulator']['layouts']:
         for datafield in layout['datafields']['datafields']:
             layout_short_name = datafield['gen']['short_name']
-            log(log_level, LOG_LEVEL_INPUT, f"\t\tlayout: {layout_short_name}")
-            layout_hash2values = {}
-            layout_value_counter = {}
-            layout_most_frequent_value_count = 0
-            layout_most_frequent_value = None
-            layout_hash2field_values = {}
-            # layout_hash2values = {}
+            layout_states = {}
+            for getter_func_name in metrics:
+                if log_level >= LOG_LEVEL_INPUT:
+                    states[getter_func_name]['messages'].append((LOG_LEVEL_INPUT, False, f"\t\tlayout: {layout_short_name}"))
+                layout_states[getter_func_name] = {
+                    'hash2values': {},
+                    'value_counter': {},
+                    'most_frequent_value_count': 0,
+                    'hash2field_values': {},
+                }
             for field in datafield['fields']:
-                hash = field['gen']['hash']
-                hash2hash_key[hash] = field['gen']['hash_key']
-                field_short_name = field['gen']['short_name']
-                # log(log_level, LOG_LEVEL_DEBUG, field)
-                value = getter_func(field)
-                if max_value != None and isinstance(value, numbers.Number) and value > max_value:
-                    print_error_log(log_level, LOG_LEVEL_ALWAYS, f"{dev}: field: {field_short_name} {getter_func_name} value too high: {value}")
-
-                # field['gen']['value'] = value
-                if 'func' not in field['gen']:
-                    field['gen']['func'] = {}
-                if getter_func_name not in field['gen']['func']:
-                    field['gen']['func'][getter_func_name] = {}
-                gen = field['gen']['func'][getter_func_name]
-                gen['value'] = value
-
-                # field2value[field_short_name] = value
-                log(log_level, LOG_LEVEL_INPUT, f"\t\t\tfield: {field_short_name} ({hash}): {getter_func_name}: {value}")
-
-                if hash not in layout_hash2values:
-                    layout_hash2values[hash] = []
-                if value not in layout_hash2values[hash]:
-                    layout_hash2values[hash].append(value)
-                if value not in layout_value_counter:
-                    layout_value_counter[value] = 0
-                layout_value_counter[value] += 1
-                if layout_value_counter[value] > layout_most_frequent_value_count:
-                    layout_most_frequent_value = value
-                    layout_most_frequent_value_count = layout_value_counter[value]
-
-                if hash not in device_hash2values:
-                    device_hash2values[hash] = []
-                if value not in device_hash2values[hash]:
-                    device_hash2values[hash].append(value)
-
-                if value not in device_value_2_hashes:
-                    device_value_2_hashes[value] = set()
-                device_value_2_hashes[value].add(hash)
-
-                # if value not in device_value_counter:
-                #     device_value_counter[value] = 0
-                # device_value_counter[value] += 1
-                device_value_counter[value] = len(device_value_2_hashes[value])
-                if device_value_counter[value] > device_most_frequent_value_count:
-                    device_most_frequent_value_count = device_value_counter[value]
-
-                if hash not in layout_hash2field_values:
-                    layout_hash2field_values[hash] = []
-                layout_hash2field_values[hash].append({field_short_name: value})
-                gen['fields_with_same_hash_in_layout'] = layout_hash2field_values[hash]
+                field_gen = field['gen']
+                hash = field_gen['hash']
+                hash2hash_key[hash] = field_gen['hash_key']
+                field_short_name = field_gen['short_name']
+                if 'func' not in field_gen:
+                    field_gen['func'] = {}
                 if hash not in device_hash2field_names:
                     device_hash2field_names[hash] = []
                 device_hash2field_names[hash].append(field_short_name)
-                if hash not in device_hash2field_values:
-                    device_hash2field_values[hash] = []
-                device_hash2field_values[hash].append({field_short_name: value})
-
-            layout_value = False
-            layout_status = HashValueStatus.KNOWN_VALUE
-            layout_hash2status = {}
-            for hash in layout_hash2values:
-                hash_status = HashValueStatus.KNOWN_VALUE
-                number_of_values_for_hash = len(layout_hash2values[hash])
-                if number_of_values_for_hash > 1:
-                    hash_status = HashValueStatus.UNKNOWN_VALUE
-                layout_hash2status[hash] = hash_status
-
-                if layout_status == HashValueStatus.KNOWN_VALUE:
-                    if number_of_values_for_hash == 1 and (layout_value == layout_hash2values[hash][0] or layout_value == False):
-                        layout_value = layout_hash2values[hash][0]
-                    else:
-                        layout_value = None
-                        layout_status = HashValueStatus.UNKNOWN_VALUE
-                    # print_error(f"{hash}: number_of_values_for_hash: {number_of_values_for_hash}, layout_value: {layout_value}, layout_hash2values[hash][0]: {layout_hash2values[hash][0]}")
-            for field in datafield['fields']:
-                hash = field['gen']['hash']
-                field['gen']['func'][getter_func_name]['status'] = layout_hash2status[hash]
+                for getter_func_name, metric in metrics.items():
+                    state = states[getter_func_name]
+                    layout_state = layout_states[getter_func_name]
+                    value = metric['getter_func'](field)
+                    max_value = metric['max_value']
+                    if max_value != None and isinstance(value, numbers.Number) and value > max_value:
+                        state['messages'].append((LOG_LEVEL_ALWAYS, True, f"{dev}: field: {field_short_name} {getter_func_name} value too high: {value}"))
+
+                    if getter_func_name not in field_gen['func']:
+                        field_gen['func'][getter_func_name] = {}
+                    gen = field_gen['func'][getter_func_name]
+                    gen['value'] = value
+
+                    if log_level >= LOG_LEVEL_INPUT:
+                        state['messages'].append((LOG_LEVEL_INPUT, False, f"\t\t\tfield: {field_short_name} ({hash}): {getter_func_name}: {value}"))
+
+                    layout_hash2values = layout_state['hash2values']
+                    if hash not in layout_hash2values:
+                        layout_hash2values[hash] = {}
+                    layout_hash2values[hash][value] = True
+                    layout_value_counter = layout_state['value_counter']
+                    layout_value_counter[value] = layout_value_counter.get(value, 0) + 1
+                    if layout_value_counter[value] > layout_state['most_frequent_value_count']:
+                        layout_state['most_frequent_value_count'] = layout_value_counter[value]
+
+                    device_hash2values = state['device_hash2values']
+                    if hash not in device_hash2values:
+                        device_hash2values[hash] = {}
+                    device_hash2values[hash][value] = True
+
+                    device_value_2_hashes = state['device_value_2_hashes']
+                    if value not in device_value_2_hashes:
+                        device_value_2_hashes[value] = set()
+                    device_value_2_hashes[value].add(hash)
+
+                    layout_hash2field_values = layout_state['hash2field_values']
+                    if hash not in layout_hash2field_values:
+                        layout_hash2field_values[hash] = []
+                    layout_hash2field_values[hash].append({field_short_name: value})
+                    gen['fields_with_same_hash_in_layout'] = layout_hash2field_values[hash]
+                    device_hash2field_values = state['device_hash2field_values']
+                    if hash not in device_hash2field_values:
+                        device_hash2field_values[hash] = []
+                    device_hash2field_values[hash].append({field_short_name: value})
 
             if 'func' not in datafield['gen']:
                 datafield['gen']['func'] = {}
-            if getter_func_name not in datafield['gen']['func']:
-                datafield['gen']['func'][getter_func_name] = {}
-            gen = datafield['gen']['func'][getter_func_name]
-            gen['status'] = layout_status
-            gen['value'] = layout_value
-
-            layout2status[layout_short_name] = layout_status
-            layout2value[layout_short_name] = layout_value
+            for getter_func_name in metrics:
+                state = states[getter_func_name]
+                layout_state = layout_states[getter_func_name]
+                layout_hash2values = layout_state['hash2values']
+                layout_value = False
+                layout_status = HashValueStatus.KNOWN_VALUE
+                layout_hash2status = {}
+                for hash in layout_hash2values:
+                    hash_status = HashValueStatus.KNOWN_VALUE
+                    number_of_values_for_hash = len(layout_hash2values[hash])
+                    if number_of_values_for_hash > 1:
+                        hash_status = HashValueStatus.UNKNOWN_VALUE
+                    layout_hash2status[hash] = hash_status
+
+                    if layout_status == HashValueStatus.KNOWN_VALUE:
+                        only_value = next(iter(layout_hash2values[hash]))
+                        if number_of_values_for_hash == 1 and (layout_value == only_value or layout_value == False):
+                            layout_value = only_value
+                        else:
+                            layout_value = None
+                            layout_status = HashValueStatus.UNKNOWN_VALUE
+                for field in datafield['fields']:
+                    hash = field['gen']['hash']
+                    field['gen']['func'][getter_func_name]['status'] = layout_hash2status[hash]
+
+                if getter_func_name not in datafield['gen']['func']:
+                    datafield['gen']['func'][getter_func_name] = {}
+                gen = datafield['gen']['func'][getter_func_name]
+                gen['status'] = layout_status
+                gen['value'] = layout_value
+
+                # the parser log uses the values of the last layout
+                state['layout_value_counter'] = layout_state['value_counter']
+                state['layout_most_frequent_value_count'] = layout_state['most_frequent_value_count']
+                state['layout_value'] = layout_value
+
+    results = {}
+    for getter_func_name, metric in metrics.items():
+        state = states[getter_func_name]
+        for min_level, is_error, msg in state['messages']:
+            if is_error:
+                print_error_log(log_level, min_level, msg)
+            else:
+                log(log_level, min_level, msg)
+        results[getter_func_name] = get_datafield_hash_data_metric_result(dev, getter_func_name, metric['aggregator'], metric['max_delta'],
+            state, hash2hash_key, device_hash2field_names, log_level)
+        if metric['post_func']:
+            results[getter_func_name] = metric['post_func'](results[getter_func_name])
+    return results
+
+def get_datafield_hash_data_metric_result(dev, getter_func_name, multiple_values_aggregator, max_delta, state, hash2hash_key, device_hash2field_names, log_level):
+    device = DEVICES[dev]
+    device_hash2values = {hash: list(values) for hash, values in state['device_hash2values'].items()}
+    device_value_counter = {value: len(hashes) for value, hashes in state['device_value_2_hashes'].items()}
+    device_most_frequent_value_count = max(device_value_counter.values(), default = 0)
+    device_hash2field_values = state['device_hash2field_values']
+    layout_value_counter = state['layout_value_counter']
+    layout_most_frequent_value_count = state['layout_most_frequent_value_count']
+    layout_value = state['layout_value']
 
     device_value = False
     device_status = HashValueStatus.KNOWN_VALUE
@@ -2049,9 +3299,9 @@ def get_datafield_hash_data_values(dev, getter_func_name, multiple_values_aggreg
         }
     # log(log_level, LOG_LEVEL_PARSING, f"{dev}: {getter_func_name}: {result}")
     if result['most_frequent_value_count'] > 1:
-        log(log_level, LOG_LEVEL_OUTPUT, f"\t{getter_func_name} output: default_{getter_func_name}: {result['default_value']} ({result['device_status'].name}), most_frequent_value{'s' if len(values) > 1 else ''}({result['most_frequent_value_count']}x): {result['most_frequent_value']}")
+        log(log_level, LOG_LEVEL_OUTPUT, lambda: f"\t{getter_func_name} output: default_{getter_func_name}: {result['default_value']} ({result['device_status'].name}), most_frequent_value{'s' if len(values) > 1 else ''}({result['most_frequent_value_count']}x): {result['most_frequent_value']}")
     else:
-        log(log_level, LOG_LEVEL_OUTPUT, f"\t{getter_func_name} output: default_{getter_func_name}: {result['default_value']} ({result['device_status'].name})")
+        log(log_level, LOG_LEVEL_OUTPUT, lambda: f"\t{getter_func_name} output: default_{getter_func_name}: {result['default_value']} ({result['device_status'].name})")
     for hash in hashes:
         hash_map_val = result['hash_map'][hash]
         # log(log_level, LOG_LEVEL_DEBUG, f"{hash_map_val}")
@@ -2069,9 +3319,9 @@ def get_datafield_hash_data_values(dev, getter_func_name, multiple_values_aggreg
                     max_values = max(values)
                     avg_str = '%.2f' % (sum(values)/len(values))
                     delta = max_values - min_values
-                    log(log_level, LOG_LEVEL_DEBUG, f"\thash: {hash} ({field_short_names}, {device_hash2status[hash].name}): {getter_func_name}: {f'{values}, min: {min_values}, avg: {avg_str}, max: {max_values}' if len(values) > 1 else values[0]}, aggregator: {multiple_values_aggregator}")
+                    log(log_level, LOG_LEVEL_DEBUG, lambda: f"\thash: {hash} ({field_short_names}, {device_hash2status[hash].name}): {getter_func_name}: {f'{values}, min: {min_values}, avg: {avg_str}, max: {max_values}' if len(values) > 1 else values[0]}, aggregator: {multiple_values_aggregator}")
                     if delta > max_delta:
-                        print_error_log(log_level, LOG_LEVEL_OUTPUT, f"{dev_prefix}\t\t{hash} ({hash_map_val['hash_key']}) ({hash_map_val['status'].name}): {getter_func_name}: {f'{value}, min: {min_values}, avg: {avg_str}, max: {max_values}'}, delta: {delta} > {max_delta}, aggregator: {multiple_values_aggregator} {field_values}")
+                        print_error_log(log_level, LOG_LEVEL_OUTPUT, lambda: f"{dev_prefix}\t\t{hash} ({hash_map_val['hash_key']}) ({hash_map_val['status'].name}): {getter_func_name}: {f'{value}, min: {min_values}, avg: {avg_str}, max: {max_values}'}, delta: {delta} > {max_delta}, aggregator: {multiple_values_aggregator} {field_values}")
                     else:
                         orig_value = hash_map_val['value']
                         hash_map_val['orig_value'] = orig_value
@@ -2080,15 +3330,15 @@ def get_datafield_hash_data_values(dev, getter_func_name, multiple_values_aggreg
                         elif multiple_values_aggregator == 'max':
                             value = f"{max(values)} /*max value*/"
                         hash_map_val['value'] = value
-                        print_warn_log(log_level, LOG_LEVEL_OUTPUT, f"{dev_prefix}\t\t{hash} ({hash_map_val['hash_key']}) ({hash_map_val['status'].name}): {getter_func_name}: {f'{orig_value} -> {value}, min: {min_values}, avg: {avg_str}, max: {max_values}'}, delta: {delta} <= {max_delta}, aggregator: {multiple_values_aggregator} {field_values}")
+                        print_warn_log(log_level, LOG_LEVEL_OUTPUT, lambda: f"{dev_prefix}\t\t{hash} ({hash_map_val['hash_key']}) ({hash_map_val['status'].name}): {getter_func_name}: {f'{orig_value} -> {value}, min: {min_values}, avg: {avg_str}, max: {max_values}'}, delta: {delta} <= {max_delta}, aggregator: {multiple_values_aggregator} {field_values}")
                 else:
-                    print_error_log(log_level, LOG_LEVEL_OUTPUT, f"{dev_prefix}\t\t{hash} ({hash_map_val['hash_key']}) ({hash_map_val['status'].name}): {getter_func_name}: {value}, aggregator: {multiple_values_aggregator} {field_values}")
+                    print_error_log(log_level, LOG_LEVEL_OUTPUT, lambda: f"{dev_prefix}\t\t{hash} ({hash_map_val['hash_key']}) ({hash_map_val['status'].name}): {getter_func_name}: {value}, aggregator: {multiple_values_aggregator} {field_values}")
             elif multiple_values_aggregator == 'concat':
                 orig_value = hash_map_val['value']
                 hash_map_val['orig_value'] = orig_value
                 value = '|'.join(values)
                 hash_map_val['value'] = value
-                log(log_level, LOG_LEVEL_OUTPUT, f"{dev_prefix}\t\t{hash} ({hash_map_val['hash_key']}) ({hash_map_val['status'].name}): {getter_func_name}: {orig_value} -> {value}, aggregator: {multiple_values_aggregator}, {field_values}")
+                log(log_level, LOG_LEVEL_OUTPUT, lambda: f"{dev_prefix}\t\t{hash} ({hash_map_val['hash_key']}) ({hash_map_val['status'].name}): {getter_func_name}: {orig_value} -> {value}, aggregator: {multiple_values_aggregator}, {field_values}")
             else:
                 print_error(f"{dev_prefix} {getter_func_name}: unknown aggregator: {multiple_values_aggregator}")
         # else:
@@ -2099,6 +3349,9 @@ def get_datafield_hash_data_values(dev, getter_func_name, multiple_values_aggreg
 
 def get_datafield_hash_data_font_values(dev, getter_func_name, getter_func, max_delta = 0, log_level = LOG_LEVEL):
     gen = get_datafield_hash_data_values(dev, getter_func_name, 'min', getter_func, max_delta, log_level = log_level)
+    return to_datafield_hash_data_font_values(dev, gen)
+
+def to_datafield_hash_data_font_values(dev, gen):
     gen['orig_most_frequent_value'] = gen['most_frequent_value']
     gen['most_frequent_value'] = font2mc_font(get_first_most_frequent_value(gen), dev)
     for hash in gen['hash_map']:
@@ -2109,6 +3362,9 @@ def get_datafield_hash_data_font_values(dev, getter_func_name, getter_func, max_
 
 def get_datafield_hash_data_justification_values(dev, getter_func_name, getter_func, max_delta = 0, log_level = LOG_LEVEL):
     gen = get_datafield_hash_data_values(dev, getter_func_name, 'min', getter_func, max_delta, log_level = log_level)
+    return to_datafield_hash_data_justification_values(gen)
+
+def to_datafield_hash_data_justification_values(gen):
     gen['orig_most_frequent_value'] = gen['most_frequent_value']
     gen['most_frequent_value'] = justification2mc(get_first_most_frequent_value(gen))
     for hash in gen['hash_map']:
@@ -2120,11 +3376,14 @@ def get_datafield_hash_data_justification_values(dev, getter_func_name, getter_f
 def has_label(field):
     return not field['labelDisabled']
 
+@timed_phase
 def read_devices_datafield_hash_data(devices):
     log(LOG_LEVEL, LOG_LEVEL_DEBUG, "read_devices_datafield_hash_data")
     for dev in devices:
         if dev != 'base':
             read_datafield_hash_data(dev)
+    if datafield_layout in FUNCTIONS:
+        calculate_fleet_bounding_boxes(devices)
 
 
 def memory_annotations(dev):
@@ -2213,47 +3472,84 @@ def versiontuple(v):
     return tuple(map(int, (v.split("."))))
 
 
+# snapshot of the features/ directory of each base dir: {features_dir: {relative dir: [entries]}}, scanned once by get_features_tree()
+FEATURES_TREE = {}
+
+@timed_phase
+def scan_features_tree(features_dir):
+    tree = {}
+    if os.path.isdir(features_dir):
+        for dir_path, dir_names, file_names in os.walk(features_dir, followlinks=True):
+            rel_dir = os.path.relpath(dir_path, features_dir).replace(os.sep, '/')
+            tree['' if rel_dir == '.' else rel_dir] = dir_names + file_names
+    log(LOG_LEVEL, LOG_LEVEL_BASIC, f"features tree: {features_dir}: {len(tree)} directories")
+    return tree
+
+def get_features_tree(features_dir):
+    if features_dir not in FEATURES_TREE:
+        FEATURES_TREE[features_dir] = scan_features_tree(features_dir)
+    return FEATURES_TREE[features_dir]
+
+# the same as has_directory(f"{features_dir}{sub_dir}") but using the snapshot of features_dir
+def has_feature_directory(features_dir, sub_dir):
+    return f"{features_dir}{sub_dir}" if sub_dir.rstrip('/') in get_features_tree(features_dir) else ''
+
+# the same as os.listdir(f"{features_dir}{sub_dir}") but using the snapshot of features_dir
+def list_feature_directory(features_dir, sub_dir):
+    return get_features_tree(features_dir).get(sub_dir.rstrip('/'), [])
+
+# index of the multi-feature (_AND_) directories in each features_dir/base_dir, see get_multi_feature_index()
+MULTI_FEATURE_INDEX = {}
+
+# dirs: the sorted _AND_ dir names and their features, feature2dirs: the inverted index: feature -> indexes of dirs,
+# and_dirs: the last dir of each first feature that contains an empty feature (i.e: zones_AND_), see get_multi_feature_dirs()
+def get_multi_feature_index(features_dir, base_dir):
+    index_key = (features_dir, base_dir)
+    if index_key not in MULTI_FEATURE_INDEX:
+        multi_feature_dirs = sorted(filter(lambda dir: MULTI_FEATURE_DIR_SEPARATOR in dir, list_feature_directory(features_dir, base_dir)))
+        dirs = []
+        feature2dirs = {}
+        last_dir_by_first_feature = {}
+        for dir_idx, multi_feature_dir in enumerate(multi_feature_dirs):
+            dir_features = multi_feature_dir.split(MULTI_FEATURE_DIR_SEPARATOR)
+            dir_features_set = set(dir_features)
+            dirs.append((multi_feature_dir, dir_features, dir_features_set))
+            for feature in dir_features_set:
+                feature2dirs.setdefault(feature, []).append(dir_idx)
+            last_dir_by_first_feature[dir_features[0]] = dir_idx
+        and_dirs = [(first_feature, dir_idx) for first_feature, dir_idx in last_dir_by_first_feature.items() if '' in dirs[dir_idx][2]]
+        MULTI_FEATURE_INDEX[index_key] = {'dirs': dirs, 'feature2dirs': feature2dirs, 'and_dirs': and_dirs}
+    return MULTI_FEATURE_INDEX[index_key]
+
 def get_multi_feature_dirs(dev, features_dir, base_dir, features):
     base_dir_path = f"{features_dir}{base_dir}"
-    multi_feature_dirs = sorted(filter(lambda dir: MULTI_FEATURE_DIR_SEPARATOR in dir, os.listdir(base_dir_path))) if os.path.isdir(base_dir_path) else []
-    # log(LOG_LEVEL, LOG_LEVEL_BASIC, f"{dev}: multi_feature_dirs in {base_dir_path}: {multi_feature_dirs}")
-
-    # multi_features = {}
-    # for multi_feature_dir in multi_feature_dirs:
-    #     dir_features = multi_feature_dir.split(MULTI_FEATURE_DIR_SEPARATOR)
-    #     if dir_features[0] not in multi_features:
-    #         multi_features[dir_features[0]] = set()
-    #     multi_features[dir_features[0]].update(dir_features)
-    #     # multi_features[dir_features[0]].remove(dir_features[0])
-
-    add_feature_and_ = {}
-    # potential_multi_feature_dirs = {}
-    multi_dirs = []
-    for multi_feature_dir in multi_feature_dirs:
-        dir_features = multi_feature_dir.split(MULTI_FEATURE_DIR_SEPARATOR)
-        add_feature_and_[dir_features[0]] = 0
-        add_dir = True
+    index = get_multi_feature_index(features_dir, base_dir)
+    dirs = index['dirs']
+
+    # a dir is added when all of its features are in features
+    features_set = set(features)
+    dir_idx2matches = {}
+    for feature in features_set:
+        for dir_idx in index['feature2dirs'].get(feature, []):
+            dir_idx2matches[dir_idx] = dir_idx2matches.get(dir_idx, 0) + 1
+    matching_dir_idxs = sorted(dir_idx for dir_idx, matches in dir_idx2matches.items() if matches == len(dirs[dir_idx][2]))
+    multi_dirs = [dirs[dir_idx][0] for dir_idx in matching_dir_idxs]
+
+    # <feature>_AND_ is added when the last dir starting with <feature> (in sorted order) has exactly 1 more empty feature
+    # before its first missing feature than the number of times it was added
+    for first_feature, dir_idx in index['and_dirs']:
+        add_feature_and_ = 0
+        dir_features = dirs[dir_idx][1]
         for feature in dir_features:
             if feature == '':
-                add_feature_and_[dir_features[0]] += 1
-            # log(LOG_LEVEL, LOG_LEVEL_BASIC, f"{dev}: checking: {feature}")
-            if feature not in features:
-                add_dir = False
+                add_feature_and_ += 1
+            if feature not in features_set:
                 break
-        if add_dir:
-            # log(LOG_LEVEL, LOG_LEVEL_BASIC, f"{dev}: adding: {multi_feature_dir}")
-            # features.append(multi_feature_dir)
-            # potential_multi_feature_dirs[multi_feature_dir] = dir_features
-            multi_dirs.append(f"{multi_feature_dir}")
-            add_feature_and_[dir_features[0]] -= 1
-    for feature in add_feature_and_:
-        if add_feature_and_[feature] == 1:
-            print_warn(f"{dev}: adding directory: {feature}{MULTI_FEATURE_DIR_SEPARATOR}")
-            # features.append(f"{feature}{MULTI_FEATURE_DIR_SEPARATOR}")
-            # potential_multi_feature_dirs[f"{feature}{MULTI_FEATURE_DIR_SEPARATOR}"] = list(feature)
-            multi_dirs.append(f"{feature}{MULTI_FEATURE_DIR_SEPARATOR}")
-        # else:
-        #     log(LOG_LEVEL, LOG_LEVEL_BASIC, f"{dev}: not adding directory: {feature}{MULTI_FEATURE_DIR_SEPARATOR}")
+        else:
+            add_feature_and_ -= 1
+        if add_feature_and_ == 1:
+            print_warn(f"{dev}: adding directory: {first_feature}{MULTI_FEATURE_DIR_SEPARATOR}")
+            multi_dirs.append(f"{first_feature}{MULTI_FEATURE_DIR_SEPARATOR}")
     if multi_dirs:
         log(LOG_LEVEL, LOG_LEVEL_OUTPUT, f"{dev}: multi_dirs in {base_dir_path}: {multi_dirs}")
     return multi_dirs
@@ -2265,33 +3561,24 @@ def add_multi_feature_dirs(dev, features_dir, base_dir, features):
         features.append(f"{base_dir}{dir}")
 
 
+# adds the potential dirs of the set that aren't a strict subset of another potential dir
 def add_set(dev, features_dir, set_dir, features):
     potential_multi_feature_dirs = get_multi_feature_dirs(dev, features_dir, set_dir, features)
-    # potential_multi_feature_dirs = {}
-    for potential_dir in potential_multi_feature_dirs:
-        potential_dir_features = potential_dir.split(MULTI_FEATURE_DIR_SEPARATOR)
-        # potential_dir_features = potential_multi_feature_dirs[potential_dir]
-        # log(LOG_LEVEL, LOG_LEVEL_BASIC, f"{dev}: {potential_dir}: {potential_dir_features}")
-        potential_dir_features_set = set(potential_dir_features)
-        include_potential_dir = True
-        for dir in potential_multi_feature_dirs:
-            if dir != potential_dir:
-                # dir_features = potential_multi_feature_dirs[dir]
-                dir_features = dir.split(MULTI_FEATURE_DIR_SEPARATOR)
-                dir_features_set = set(dir_features)
-                if len(dir_features_set - potential_dir_features_set) > 0 and len(potential_dir_features_set - dir_features_set) == 0:
-                    include_potential_dir = False
-        if include_potential_dir:
-            # log(LOG_LEVEL, LOG_LEVEL_BASIC, f"{dev}: including: {set_dir}{potential_dir}")
+    potential_dir_features_sets = [set(potential_dir.split(MULTI_FEATURE_DIR_SEPARATOR)) for potential_dir in potential_multi_feature_dirs]
+    feature2potential_dirs = {}
+    for potential_dir_idx, potential_dir_features_set in enumerate(potential_dir_features_sets):
+        for feature in potential_dir_features_set:
+            feature2potential_dirs.setdefault(feature, set()).add(potential_dir_idx)
+    for potential_dir_idx, potential_dir in enumerate(potential_multi_feature_dirs):
+        potential_dir_features_set = potential_dir_features_sets[potential_dir_idx]
+        superset_dir_idxs = set.intersection(*(feature2potential_dirs[feature] for feature in potential_dir_features_set))
+        if not any(len(potential_dir_features_sets[dir_idx]) > len(potential_dir_features_set) for dir_idx in superset_dir_idxs):
             features.append(f"{set_dir}{potential_dir}")
-        # else:
-        #     log(LOG_LEVEL, LOG_LEVEL_BASIC, f"{dev}: not including: {potential_dir}")
 
 
 def add_sets(dev, features_dir, base_dir, features):
-    dir_path = f"{features_dir}{base_dir}"
-    if os.path.isdir(dir_path):
-        set_dirs = sorted(os.listdir(dir_path))
+    if has_feature_directory(features_dir, base_dir):
+        set_dirs = sorted(list_feature_directory(features_dir, base_dir))
         for set_dir in set_dirs:
             add_set(dev, features_dir, f"{base_dir}{set_dir}/", features)
             # dirs = sorted(filter(lambda dir: MULTI_FEATURE_DIR_SEPARATOR in dir, os.listdir(f"{base_dir}/{set_dir}")))
@@ -2299,18 +3586,64 @@ def add_sets(dev, features_dir, base_dir, features):
             # for dir in dirs:
             #     set_features = get_multi_dir_features(f"{base_dir}/{set_dir}/{dir}", features)
 
-def has_method(dev, method):
-    found = False
-    # debug_files = [file for file in os.listdir(f"{SDK_DEVICES_DIR}/{dev}") if file.endswith('.debug.xml')]
-    if '.' in method:
-        (clazz, func) = method.split('.', 2)
-        searchFor = f'name="{func}" parent="{clazz}"'
-    else:
-        searchFor = f'symbol="{method}"'
-    found = open(f"{SDK_DEVICES_DIR}/{dev}/{dev}.api.debug.xml", 'r').read().find(searchFor) != -1
-    # log(LOG_LEVEL, LOG_LEVEL_BASIC, f"{dev}: has_method: {method}: {found}")
+API_METHOD_RE = re.compile(r'name="([^"]*)" parent="([^"]*)"')
+API_SYMBOL_RE = re.compile(r'symbol="([^"]*)"')
+API_INDEX = None
+
+def read_device_api(dev):
+    with open(f"{SDK_DEVICES_DIR}/{dev}/{dev}.api.debug.xml", 'r') as api_debug_xml:
+        content = api_debug_xml.read()
+    return {
+        'methods': {(clazz, func) for (func, clazz) in API_METHOD_RE.findall(content)},
+        'symbols': set(API_SYMBOL_RE.findall(content)),
+    }
+
+# index of the (class, method) pairs and symbols in every device's <dev>.api.debug.xml, kept next to the devices cache
+@timed_phase
+def read_api_index():
+    cached_entries = read_cache('api', API_INDEX_CACHE_VERSION)
+    entries = {}
+    parsed_devices = []
+    for dev in ALL_DEVICES:
+        api_debug_xml = f"{SDK_DEVICES_DIR}/{dev}/{dev}.api.debug.xml"
+        if not os.path.exists(api_debug_xml):
+            print_warn(f"{dev}: missing: {api_debug_xml}")
+            entries[dev] = {'signature': None, 'api': {'methods': set(), 'symbols': set()}}
+            continue
+        signature = get_file_signature(api_debug_xml)
+        entry = cached_entries.get(dev)
+        if entry is None or entry['signature'] != signature:
+            entry = {'signature': signature, 'api': read_device_api(dev)}
+            parsed_devices.append(dev)
+        entries[dev] = entry
+    if parsed_devices or len(entries) != len(cached_entries):
+        write_cache('api', API_INDEX_CACHE_VERSION, entries)
+    log(LOG_LEVEL, LOG_LEVEL_BASIC, f"api index: {len(ALL_DEVICES) - len(parsed_devices)} from cache, parsed: {parsed_devices}")
+    return {dev: entries[dev]['api'] for dev in entries}
+
+def get_api_index():
+    global API_INDEX
+    if API_INDEX is None:
+        API_INDEX = read_api_index()
+    return API_INDEX
+
+def has_methods(dev, methods):
+    api = get_api_index()[dev]
+    if TIMINGS is not None:
+        TIMINGS['counters']['has_method_lookups'] += len(methods)
+    found = {}
+    for method in methods:
+        if '.' in method:
+            (clazz, func) = method.split('.', 1)
+            found[method] = (clazz, func) in api['methods']
+        else:
+            found[method] = method in api['symbols']
+    # log(LOG_LEVEL, LOG_LEVEL_BASIC, f"{dev}: has_methods: {found}")
     return found
 
+def has_method(dev, method):
+    return has_methods(dev, [method])[method]
+
 def merge_feature_result(a, b):
     for trueOrFalse in b:
         if b[trueOrFalse]:
@@ -2358,99 +3691,95 @@ def get_bool_value_by_json_path(dev, feature, attr, json_path_str):
     return (op == True and val is not None and val != False) or (op == False and (val is None or val == False))
 
 
+# the constraints are compiled to predicates once and the results are memoized for each (constraints, dev, feature),
+# call reset_constraint_cache() when FEATURE_CONSTRAINS, FILTER_CONSTRAINS or the devices change
+COMPILED_CONSTRAINTS = {}
+HAS_FEATURE_BY_CONSTRAINTS_CACHE = {}
+
+def reset_constraint_cache():
+    global COMPILED_CONSTRAINTS, HAS_FEATURE_BY_CONSTRAINTS_CACHE
+    COMPILED_CONSTRAINTS = {}
+    HAS_FEATURE_BY_CONSTRAINTS_CACHE = {}
+
+def has_keys_predicate(val, key_attr):
+    values = val.split(';')
+    def predicate(dev, device):
+        if 'keys' not in device['simulator']:
+            return False, 'no_keys'
+        key_values = set(key[key_attr] for key in device['simulator']['keys'] if key_attr in key)
+        missing_values = [value for value in values if value not in key_values]
+        return not missing_values, ';'.join(missing_values)
+    return predicate
+
+# returns a predicate: (dev, device) -> (has_feature, no_feature_reason)
+def compile_constraint(feature, attr, val):
+    match attr:
+        case 'min_ciq':
+            min_ciq = versiontuple(val)
+            return lambda dev, device: (versiontuple(device['minVersion']) >= min_ciq, '')
+        case 'max_ciq':
+            max_ciq = versiontuple(val)
+            return lambda dev, device: (max_ciq > versiontuple(device['minVersion']), '')
+        case 'min_color_depth':
+            min_color_depth = int(val)
+            return lambda dev, device: (get_color_depth(device) >= min_color_depth, '')
+        case 'is_beta':
+            return lambda dev, device: (IS_BETA, '')
+        case 'is':
+            is_value = int(val) != 0
+            return lambda dev, device: (is_value, '')
+        case 'has':
+            return lambda dev, device: (has_method(dev, val), '')
+        case 'min_memory':
+            min_memory = int(val)
+            return lambda dev, device: (APP_TYPE in device['memory'] and device['memory'][APP_TYPE] >= min_memory, '')
+        case 'min_background_memory':
+            min_background_memory = int(val)
+            return lambda dev, device: ('background' in device['memory'] and device['memory']['background'] >= min_background_memory, '')
+        case 'json':
+            return lambda dev, device: (get_bool_value_by_json_path(dev, feature, attr, val), '')
+        case 'key_behavior':
+            return has_keys_predicate(val, 'behavior')
+        case 'key_id':
+            return has_keys_predicate(val, 'id')
+        case 'for_devices':
+            for_devices = set(val.split(','))
+            return lambda dev, device: (dev in for_devices, '')
+        case _:
+            return lambda dev, device: (True, '')
+
+def compile_constraints(constraints):
+    compiled = {}
+    for feature in constraints:
+        compiled[feature] = [(attr, val, compile_constraint(feature, attr, val)) for attr, val in constraints[feature].items()]
+    COMPILED_CONSTRAINTS[id(constraints)] = (constraints, compiled)
+    return compiled
+
+def get_compiled_constraints(constraints):
+    entry = COMPILED_CONSTRAINTS.get(id(constraints))
+    return entry[1] if entry and entry[0] is constraints else compile_constraints(constraints)
+
 def has_feature_by_constraints(dev, constraints, feature = None):
     if dev == 'base':
         return False
+    cache_key = (id(constraints), dev, feature)
+    if cache_key in HAS_FEATURE_BY_CONSTRAINTS_CACHE:
+        return HAS_FEATURE_BY_CONSTRAINTS_CACHE[cache_key]
     has_constraints = {True: [], False: []}
+    compiled_constraints = get_compiled_constraints(constraints)
     if feature is None:
-        for f in constraints:
+        for f in compiled_constraints:
             merge_feature_result(has_constraints, has_feature_by_constraints(dev, constraints, f))
-    elif feature in constraints:
+    elif feature in compiled_constraints:
         device = DEVICES[dev]
-        for attr in constraints[feature]:
-            has_feature = True
-            no_feature_reason = ''
-            val = constraints[feature][attr]
-            # log(LOG_LEVEL, LOG_LEVEL_BASIC, f"{dev}: {feature}: {attr}: {val} => ?")
-            if attr == 'min_ciq' and versiontuple(device['minVersion']) < versiontuple(val):
-                has_feature = False
-                # log(LOG_LEVEL, LOG_LEVEL_BASIC, f"{dev}: {feature}: {attr}: {val} => {has_feature}")
-            elif attr == 'max_ciq' and versiontuple(val) <= versiontuple(device['minVersion']):
-                has_feature = False
-                # log(LOG_LEVEL, LOG_LEVEL_BASIC, f"{dev}: {feature}: {attr}: {val} => {has_feature}")
-            elif attr == 'min_color_depth' and get_color_depth(device) < int(val):
-                has_feature = False
-                # log(LOG_LEVEL, LOG_LEVEL_BASIC, f"{dev}: {feature}: {attr}: {get_color_depth(device)} < {val} => {has_feature}")
-            elif attr == 'is_beta' and not IS_BETA:
-                has_feature = False
-            elif attr == 'is' and int(val) == 0:
-                has_feature = False
-            elif attr == 'has' and not has_method(dev, val):
-                has_feature = False
-            elif attr == 'min_memory' and (APP_TYPE not in device['memory'] or device['memory'][APP_TYPE] < int(val)):
-                has_feature = False
-                # log(LOG_LEVEL, LOG_LEVEL_BASIC, f"{dev}: {feature}: {attr}: {val} => {has_feature}")
-            elif attr == 'min_background_memory' and ('background' not in device['memory'] or device['memory']['background'] < int(val)):
-                has_feature = False
-                # log(LOG_LEVEL, LOG_LEVEL_BASIC, f"{dev}: {feature}: {attr}: {val} => {has_feature}")
-            elif attr == 'json':
-                # if isinstance(val, list):
-                #     obj = True
-                #     for json_path in val:
-                #         obj &= get_value_by_json_path(dev, feature, attr, json_path)
-                # else:
-                obj = get_bool_value_by_json_path(dev, feature, attr, val)
-                # print(f"{dev}: feature: {feature}, attr: {attr}, val: {val}, obj: {obj}")
-                if not obj:
-                    has_feature = False
-                # print(f"{dev}: key: {key}, obj: {obj}, has_feature2: {has_feature}")
-            elif attr == 'key_behavior':
-                if 'keys' in device['simulator']:
-                    behaviors = val.split(';')
-                    for behavior in behaviors:
-                        # if not next((key for key in device['simulator']['keys'] if 'behavior' in key and key['behavior'] == behavior), None):
-                        #     has_feature = False
-                        has_behavior = False
-                        for key in device['simulator']['keys']:
-                            if 'behavior' in key and key['behavior'] == behavior:
-                                has_behavior = True
-                                # no_feature_reason += (',' if no_feature_reason else '') + f'no_key_{key["id"]}'
-                        if not has_behavior:
-                            has_feature = False
-                            no_feature_reason += (';' if no_feature_reason else '') + f'{behavior}'
-                    # no_feature_reason = f"no_behavior:{no_feature_reason}"
-                else:
-                    has_feature = False
-                    no_feature_reason = 'no_keys'
-            elif attr == 'key_id':
-                if 'keys' in device['simulator']:
-                    key_ids = val.split(';')
-                    for key_id in key_ids:
-                        # if not next((key for key in device['simulator']['keys'] if 'behavior' in key and key['behavior'] == behavior), None):
-                        #     has_feature = False
-                        has_key_id = False
-                        for key in device['simulator']['keys']:
-                            if 'id' in key and key['id'] == key_id:
-                                has_key_id = True
-                                # no_feature_reason += (',' if no_feature_reason else '') + f'no_key_{key["id"]}'
-                        if not has_key_id:
-                            has_feature = False
-                            no_feature_reason += (';' if no_feature_reason else '') + f'{key_id}'
-                else:
-                    has_feature = False
-                    no_feature_reason = 'no_keys'
-            elif attr == 'for_devices' and (dev not in val.split(',')):
-                has_feature = False
-                # log(LOG_LEVEL, LOG_LEVEL_BASIC, f"{dev}: {feature}: {attr}: {val} => {has_feature}")
-            # if feature != attr:
-            #     print_error_log(LOG_LEVEL, LOG_LEVEL_ALWAYS, f"{dev}: has_feature_by_constraints: feature: {feature} != attr: {attr}")
-            # has_constraints[has_feature].append(f"{feature}:{attr + ':' if feature != attr else ''}{val}:{no_feature_reason}")
+        for attr, val, predicate in compiled_constraints[feature]:
+            has_feature, no_feature_reason = predicate(dev, device)
             has_constraints[has_feature].append(f"{feature}:{attr + ':' if feature != attr else ''}{no_feature_reason if no_feature_reason else val}")
     else:
         print_error_log(LOG_LEVEL, LOG_LEVEL_ALWAYS, f"unknown feature: '{feature}' in constraints: {constraints}")
 
-    # log(LOG_LEVEL, LOG_LEVEL_INPUT, f"{dev}: {'no_' if not has_feature else ''}{feature}")
-    log(LOG_LEVEL, LOG_LEVEL_DEBUG, f"{dev}: has_feature_by_constraints: {feature}: {has_constraints}")
+    log(LOG_LEVEL, LOG_LEVEL_DEBUG, lambda: f"{dev}: has_feature_by_constraints: {feature}: {has_constraints}")
+    HAS_FEATURE_BY_CONSTRAINTS_CACHE[cache_key] = has_constraints
     return has_constraints
 
 def features(dev):
@@ -2459,12 +3788,13 @@ def features(dev):
     exclude_annotations_arr = []
     langs = {}
     for conf_base_dir in get_base_dirs():
+        features_dir = f'{conf_base_dir}features/'
         if dev == 'base':
-            return [has_directory(f'{conf_base_dir}features/base/source'), has_directory(f'{conf_base_dir}features/base/resources'), 'base']
+            return [has_feature_directory(features_dir, 'base/source'), has_feature_directory(features_dir, 'base/resources'), 'base']
         device = DEVICES[dev]
         app_type = 'glance' if APP_TYPE == 'widget' and 'glance' in device['memory'] else APP_TYPE
         if app_type not in device['memory']:
-            return [has_directory(f'{conf_base_dir}features/base/source'), has_directory(f'{conf_base_dir}features/base/resources'), 'base']
+            return [has_feature_directory(features_dir, 'base/source'), has_feature_directory(features_dir, 'base/resources'), 'base']
         memory_limit = device['memory'][app_type]
         features = []
         # log(LOG_LEVEL, LOG_LEVEL_BASIC, f"{dev}: features: memory_limit: {memory_limit}: {get_features_by_memory(memory_limit)}")
@@ -2495,7 +3825,7 @@ def features(dev):
             # log(LOG_LEVEL, LOG_LEVEL_INPUT, f"{dev}: features1: {feature_or_not}: {has_constraints}")
             if feature in FEATURE_CONSTRAINS:
                 has_feature_constraints = has_feature_by_constraints(dev, FEATURE_CONSTRAINS, feature)
-                log(LOG_LEVEL, LOG_LEVEL_INPUT, f"{dev}: features: feature: {feature_or_not}: {has_feature_constraints}")
+                log(LOG_LEVEL, LOG_LEVEL_INPUT, lambda: f"{dev}: features: feature: {feature_or_not}: {has_feature_constraints}")
                 if has_feature_constraints[False]:
                     has_feature = False
 
@@ -2503,35 +3833,35 @@ def features(dev):
             features.append(feature_or_not)
         log(LOG_LEVEL, LOG_LEVEL_OUTPUT, f"{dev}: features: all: {features}")
 
-        add_multi_feature_dirs(dev, f'{conf_base_dir}features/', '', features)
-        add_sets(dev, f'{conf_base_dir}features/', 'sets/', features)
+        add_multi_feature_dirs(dev, features_dir, '', features)
+        add_sets(dev, features_dir, 'sets/', features)
 
         # log(LOG_LEVEL, LOG_LEVEL_BASIC, f"{dev}: {features}")
 
         settings_dirs = []
         for feature_or_not in features:
-            dir = has_directory(f'{conf_base_dir}features/{feature_or_not}/source')
+            dir = has_feature_directory(features_dir, f'{feature_or_not}/source')
             if dir != '' and feature_or_not != 'base': source_path_arr.append(dir)
-            dir = has_directory(f'{conf_base_dir}features/{feature_or_not}/resources')
+            dir = has_feature_directory(features_dir, f'{feature_or_not}/resources')
             if dir != '' and feature_or_not != 'base': resource_path_arr.append(dir)
             if feature_or_not != 'base' and MULTI_FEATURE_DIR_SEPARATOR not in feature_or_not:
                 exclude_annotation = feature_or_not.replace('no_', '') if feature_or_not.startswith('no_') else f"no_{feature_or_not}"
                 exclude_annotations_arr.append(exclude_annotation)
             for lang in MANIFEST_LANGS:
-                dir = has_directory(f'{conf_base_dir}features/{feature_or_not}/lang-{lang}')
+                dir = has_feature_directory(features_dir, f'{feature_or_not}/lang-{lang}')
                 # log(LOG_LEVEL, LOG_LEVEL_BASIC, f"{dev}: {feature}: {lang}, {dir}")
                 if dir != '':
                     if lang not in langs:
                         langs[lang] = []
                     langs[lang].append(dir)
-            dir = has_directory(f'{conf_base_dir}features/{feature_or_not}/settings')
-            if dir != '':
-                settings_dirs.append(dir)
+            if has_feature_directory(features_dir, f'{feature_or_not}/settings'):
+                settings_dirs.append(f'{feature_or_not}/settings')
 
         # log(LOG_LEVEL, LOG_LEVEL_BASIC, f"{dev}: settings in: {settings_dirs}")
         settings_files = {}
-        for settings_dir in settings_dirs:
-            for file in os.listdir(settings_dir):
+        for settings_sub_dir in settings_dirs:
+            settings_dir = f'{features_dir}{settings_sub_dir}'
+            for file in list_feature_directory(features_dir, settings_sub_dir):
                 if file in settings_files:
                     # sys.exit(f"{dev}: multiple settings file with the same name: {settings_files[file]}/{file} and {settings_dir}/{file}")
                     print_error(f"{dev}: multiple settings file with the same name: {settings_files[file]}/{file} and {settings_dir}/{file}")
@@ -2597,7 +3927,7 @@ def key_location(dev):
         device_dir = f"{conf_base_dir}{GENERATED_DEVICES_DIR}/{dev}"
         device_file = f"{device_dir}/key_location.mc"
         os.makedirs(device_dir, 0o755, True)
-        with open(device_file, 'w') as output:
+        with open_generated(device_file) as output:
             # output.write(f"// GENERATED for {dev} by {GENERATROR_SIGNATURE}\n\n");
             output.write(f"// GENERATED by {GENERATROR_SIGNATURE}\n\n")
             output.write("import Toybox.Lang;\n\n")
@@ -2722,7 +4052,7 @@ def analog_hands(dev):
         device_dir = f"{conf_base_dir}{GENERATED_DEVICES_DIR}/{dev}"
         device_file = f"{device_dir}/analog_hands.mc"
         os.makedirs(device_dir, 0o755, True)
-        with open(device_file, 'w') as output:
+        with open_generated(device_file) as output:
             # output.write(f"// GENERATED for {dev} by {GENERATROR_SIGNATURE}\n\n");
             output.write(f"// GENERATED by {GENERATROR_SIGNATURE}\n\n")
             output.write("import Toybox.Lang;\n\n")
@@ -2766,7 +4096,7 @@ def const_font(dev):
         device_file = f"{device_dir}/const_font.mc"
         if not os.path.exists(device_file):
             os.makedirs(device_dir, 0o755, True)
-            with open(device_file, 'w') as output:
+            with open_generated(device_file) as output:
                 # output.write(f"// GENERATED for {dev} by {GENERATROR_SIGNATURE}\n\n");
                 output.write(f"// GENERATED by {GENERATROR_SIGNATURE}\n\n")
                 output.write("import Toybox.Graphics;\n\n")
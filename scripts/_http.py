@@ -0,0 +1,45 @@
+# the http helpers of the garmin-download-*.py scripts
+
+import threading
+import http.client
+import urllib.parse
+
+
+# each thread keeps its connection to each host open for the next requests
+CONNECTIONS = threading.local()
+
+def get_connection(url, timeout):
+    if not hasattr(CONNECTIONS, 'by_host'):
+        CONNECTIONS.by_host = {}
+    key = (url.scheme, url.netloc)
+    if key not in CONNECTIONS.by_host:
+        connection_class = http.client.HTTPSConnection if url.scheme == 'https' else http.client.HTTPConnection
+        CONNECTIONS.by_host[key] = connection_class(url.netloc, timeout=timeout)
+    return CONNECTIONS.by_host[key]
+
+def close_connection(url):
+    connection = CONNECTIONS.by_host.pop((url.scheme, url.netloc), None)
+    if connection:
+        connection.close()
+
+# returns the http status and the body of the response
+def fetch(url_str, timeout):
+    url = urllib.parse.urlsplit(url_str)
+    path = url.path + (f"?{url.query}" if url.query else '')
+    # a kept open connection could have been closed by the server, then it's retried with a new connection
+    for attempt in range(2):
+        connection = get_connection(url, timeout)
+        try:
+            connection.request('GET', path, headers={'Accept': 'application/json'})
+            response = connection.getresponse()
+            body = response.read()
+            if response.will_close:
+                close_connection(url)
+            return response.status, body
+        except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+            close_connection(url)
+            if attempt:
+                raise
+        except Exception:
+            close_connection(url)
+            raise
@@ -0,0 +1,19 @@
+# the SDK lookup of the python tools
+
+import sys
+import os
+
+
+# like _sdk.sh (without the WSL lookup)
+def get_sdk_home():
+    ciq_sdk_home = os.environ.get('CIQ_SDK_HOME')
+    if not ciq_sdk_home:
+        # macos
+        ciq_sdk_home = f"{os.environ.get('HOME')}/Library/Application Support/Garmin/ConnectIQ"
+        if not os.path.isdir(ciq_sdk_home):
+            # linux
+            ciq_sdk_home = f"{os.environ.get('HOME')}/.Garmin/ConnectIQ"
+    if not os.path.isdir(ciq_sdk_home):
+        print('Set CIQ_SDK_HOME to the directory where you downloaded the SDK')
+        sys.exit(1)
+    return ciq_sdk_home
@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+
+import sys
+import os
+import re
+import json
+import getopt
+import functools
+
+
+def usage():
+    cmd = os.path.basename(__file__)
+    print(f'''{cmd} [options]
+Reads compiler.json and simulator.json of each device in the SDK once and writes all the csv files
+that device2all-versions.sh, device2max-version.sh, device2min-version.sh, max-version2devices.sh,
+min-version2devices.sh, device2ttf-fonts.sh, device2memory.sh and memory2devices.sh write.
+options:
+    -h|--help
+    -o|--output-dir <dir>           <dir>: where to write the csv files, default: {DEFAULT_OUTPUT_DIR}
+    -c|--check                      don't write the files, only compare them with the existing files in <dir>,
+                                    exits with 1 if any of them would change
+
+examples:
+
+    to update the csv files:
+        {cmd}
+
+    to check that the csv files are up to date:
+        {cmd} --check
+''')
+
+
+DEFAULT_OUTPUT_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.realpath(__file__))), 'csv')
+
+APP_TYPES = ['audioContentProvider', 'background', 'datafield', 'glance', 'watchApp', 'watchFace', 'widget']
+
+
+# like _sdk.sh (without the WSL lookup)
+def get_devices_dir():
+    ciq_sdk_home = os.environ.get('CIQ_SDK_HOME')
+    if not ciq_sdk_home:
+        # macos
+        ciq_sdk_home = f"{os.environ.get('HOME')}/Library/Application Support/Garmin/ConnectIQ"
+        if not os.path.isdir(ciq_sdk_home):
+            # linux
+            ciq_sdk_home = f"{os.environ.get('HOME')}/.Garmin/ConnectIQ"
+    if not os.path.isdir(ciq_sdk_home):
+        print('Set CIQ_SDK_HOME to the directory where you downloaded the SDK')
+        sys.exit(1)
+    return f"{ciq_sdk_home}/Devices"
+
+
+def read_json(path):
+    try:
+        with open(path, 'r') as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+
+# how jq prints a value: strings with -r as they are, the rest as json
+def jq_str(value, raw = True):
+    if raw and isinstance(value, str):
+        return value
+    return json.dumps(value)
+
+
+# the order of `sort --version-sort` (GNU filevercmp, the lines don't have file suffixes)
+def version_char_order(c):
+    if c.isdigit():
+        return 0
+    if c.isalpha():
+        return ord(c)
+    if c == '~':
+        return -1
+    return ord(c) + 256
+
+
+def version_cmp(a, b):
+    i = j = 0
+    while i < len(a) or j < len(b):
+        while (i < len(a) and not a[i].isdigit()) or (j < len(b) and not b[j].isdigit()):
+            ac = version_char_order(a[i]) if i < len(a) else 0
+            bc = version_char_order(b[j]) if j < len(b) else 0
+            if ac != bc:
+                return ac - bc
+            i += 1
+            j += 1
+        while i < len(a) and a[i] == '0':
+            i += 1
+        while j < len(b) and b[j] == '0':
+            j += 1
+        first_diff = 0
+        while i < len(a) and j < len(b) and a[i].isdigit() and b[j].isdigit():
+            if not first_diff:
+                first_diff = ord(a[i]) - ord(b[j])
+            i += 1
+            j += 1
+        if i < len(a) and a[i].isdigit():
+            return 1
+        if j < len(b) and b[j].isdigit():
+            return -1
+        if first_diff:
+            return first_diff
+    return 0
+
+
+# sort --version-sort, equal versions (i.e: 1.01, 1.1) are compared as strings
+def version_sort(lines):
+    return sorted(lines, key=functools.cmp_to_key(lambda a, b: version_cmp(a, b) or (a > b) - (a < b)))
+
+
+def version_sort_uniq(versions):
+    return version_sort(set(versions))
+
+
+NUMERIC_PREFIX_RE = re.compile(r'^\s*(-?[0-9]*(?:\.[0-9]*)?)')
+
+# sort -n, lines with equal numbers are compared as strings
+def numeric_sort(lines):
+    def key(line):
+        prefix = NUMERIC_PREFIX_RE.match(line).group(1)
+        try:
+            number = float(prefix)
+        except ValueError:
+            number = 0
+        return (number, line)
+    return sorted(lines, key=key)
+
+
+# datamash -t : groupby 1 collapse 2
+def group_by(lines):
+    groups = []
+    for line in lines:
+        fields = line.split(':')
+        key, value = fields[0], fields[1] if len(fields) > 1 else ''
+        if groups and groups[-1][0] == key:
+            groups[-1][1].append(value)
+        else:
+            groups.append((key, [value]))
+    return [f"{key}:{','.join(values)}" for key, values in groups]
+
+
+def read_csv_dict(path):
+    csv = {}
+    if os.path.exists(path):
+        with open(path, 'r') as file:
+            for line in file:
+                device, value = line.rstrip('\n').split(':', 1)
+                csv[device] = value
+    return csv
+
+
+def read_devices(devices_dir):
+    devices = {}
+    for device in sorted(d for d in os.listdir(devices_dir) if not d.startswith('.')):
+        compiler = read_json(f"{devices_dir}/{device}/compiler.json") or {}
+        simulator = read_json(f"{devices_dir}/{device}/simulator.json") or {}
+        devices[device] = {
+            'versions': [jq_str(part_number.get('connectIQVersion')) for part_number in compiler.get('partNumbers', [])],
+            'memory': {app_type: [jq_str(type_obj.get('memoryLimit'), False) for type_obj in compiler.get('appTypes', []) if app_type in type_obj.get('type', '')] for app_type in APP_TYPES},
+            'ttf_fonts': [(font_set.get('fontSet') or '', [font.get('name') or '' for font in font_set.get('fonts', []) if font.get('type') == 'system_ttf']) for font_set in simulator.get('fonts', [])],
+        }
+    return devices
+
+
+# returns {file name: lines} in the same format as the shell scripts
+def export_csv(devices, output_dir):
+    csv = {}
+
+    old_all_versions = read_csv_dict(f"{output_dir}/device2all-versions.csv")
+    csv['device2all-versions.csv'] = sort_by_device({device: ','.join(version_sort_uniq([v for v in old_all_versions.get(device, '').split(',') + devices[device]['versions'] if v]))
+        for device in devices})
+
+    device2max = {device: version_sort_uniq(devices[device]['versions'])[-1] if devices[device]['versions'] else '' for device in devices}
+    csv['device2max-version.csv'] = [f"{device}:{device2max[device]}" for device in devices]
+
+    old_min_versions = read_csv_dict(f"{output_dir}/device2min-version.csv")
+    device2min = {}
+    for device in devices:
+        versions = [v for v in version_sort_uniq(devices[device]['versions'])[:1] + [old_min_versions.get(device, '')] if v]
+        device2min[device] = version_sort(versions)[0] if versions else ''
+    csv['device2min-version.csv'] = sort_by_device(device2min)
+
+    csv['max-version2devices.csv'] = group_by(numeric_sort(f"{device2max[device]}:{device}" for device in devices))
+    csv['min-version2devices.csv'] = group_by(version_sort(f"{device2min[device]}:{device}" for device in devices))
+
+    csv['device2ttf-fonts.csv'] = [f"{device}:{font_set}={','.join(fonts)}" for device in devices for font_set, fonts in devices[device]['ttf_fonts']]
+
+    for app_type in APP_TYPES:
+        memory = {device: '\n'.join(devices[device]['memory'][app_type]) for device in devices}
+        csv[f"device2memory-{app_type}.csv"] = split_lines(f"{device}:{memory[device]}" for device in devices)
+        csv[f"memory2devices-{app_type}.csv"] = group_by(numeric_sort(split_lines(f"{memory[device]}:{device}" for device in devices)))
+    return csv
+
+
+# the scripts sort the lines as: "<device>/<value>" and then replace '/' with ':'
+def sort_by_device(device2value):
+    return [line.replace('/', ':') for line in sorted(f"{device}/{value}" for device, value in device2value.items())]
+
+
+# jq prints multiple values in multiple lines
+def split_lines(texts):
+    return [line for text in texts for line in text.split('\n')]
+
+
+def to_content(lines):
+    return ''.join(f"{line}\n" for line in lines)
+
+
+def write_csv(csv, output_dir):
+    for file_name, lines in csv.items():
+        path = f"{output_dir}/{file_name}"
+        with open(f"{path}.tmp", 'w') as file:
+            file.write(to_content(lines))
+        os.replace(f"{path}.tmp", path)
+
+
+# returns the names of the files that would change
+def check_csv(csv, output_dir):
+    changed = []
+    for file_name, lines in csv.items():
+        path = f"{output_dir}/{file_name}"
+        if not os.path.exists(path):
+            changed.append(file_name)
+            continue
+        with open(path, 'r') as file:
+            if file.read() != to_content(lines):
+                changed.append(file_name)
+    return changed
+
+
+def main(argv):
+    try:
+        opts, args = getopt.getopt(argv, 'ho:c', ['help', 'output-dir=', 'check'])
+    except getopt.GetoptError as e:
+        print(e)
+        usage()
+        sys.exit(1)
+    output_dir = DEFAULT_OUTPUT_DIR
+    check = False
+    for opt, arg in opts:
+        if opt == '-h' or opt == '--help':
+            usage()
+            sys.exit(0)
+        if opt == '-o' or opt == '--output-dir':
+            output_dir = arg
+        if opt == '-c' or opt == '--check':
+            check = True
+
+    print(sys.argv[0])
+    csv = export_csv(read_devices(get_devices_dir()), output_dir)
+    if check:
+        changed = check_csv(csv, output_dir)
+        for file_name in changed:
+            print(f'changed: {file_name}')
+        sys.exit(1 if changed else 0)
+    write_csv(csv, output_dir)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+
+import sys
+import os
+import json
+import getopt
+import hashlib
+import sqlite3
+import http.client
+from concurrent.futures import ThreadPoolExecutor
+
+from _http import fetch
+
+
+def usage():
+    cmd = os.path.basename(__file__)
+    print(f'''{cmd} [options] <APP_ID>...
+Downloads the new reviews of the apps into a local store and writes <APP_ID>.reviews.csv like garmin-download-reviews.sh.
+The pages are fetched newest first, a few at the same time, until a review that is already in the store is reached.
+options:
+    -h|--help
+    -s|--store <file>               <file>: the sqlite file the reviews (with their replies) are kept in, default: {DEFAULT_STORE}
+    -o|--output-dir <dir>           <dir>: where to write the csv files, default: .
+    -p|--page-size <N>              <N>: how many reviews to fetch in each request, default: {DEFAULT_PAGE_SIZE}
+    -j|--jobs <N>                   <N>: how many pages to fetch at the same time, default: {DEFAULT_JOBS}
+    -t|--timeout <seconds>          timeout of each request, default: {DEFAULT_TIMEOUT}
+    -f|--full                       fetch every page (i.e: to update the replies of the old reviews)
+    --base-url <url>                <url>: the url of the store, default: {DEFAULT_BASE_URL}
+''')
+
+
+DEFAULT_STORE = 'garmin-reviews.db'
+DEFAULT_BASE_URL = 'https://apps.garmin.com'
+DEFAULT_PAGE_SIZE = 50
+DEFAULT_JOBS = 4
+DEFAULT_TIMEOUT = 30
+
+
+def fetch_json(url_str, timeout):
+    status, body = fetch(url_str, timeout)
+    if status != 200:
+        raise http.client.HTTPException(f"{url_str}: http status: {status}")
+    return json.loads(body)
+
+
+# start: the index of the first review of the page
+def get_page(base_url, app_id, page_size, start, timeout):
+    url = f"{base_url}/api/appsLibraryExternalServices/api/asw/apps/{app_id}/reviews" \
+        f"?sortType=CreatedDate&ascending=false&latestVersionOnly=false&pageSize={page_size}&startPageIndex={start}"
+    reviews = fetch_json(url, timeout)
+    return reviews if isinstance(reviews, list) else []
+
+
+def get_review_id(review):
+    review_id = review.get('id')
+    if review_id is None:
+        review_id = hashlib.sha1(json.dumps({k: v for k, v in review.items() if k != 'replies'}, sort_keys=True).encode()).hexdigest()
+    return str(review_id)
+
+
+def open_store(path):
+    db = sqlite3.connect(path)
+    db.execute('CREATE TABLE IF NOT EXISTS reviews (app_id TEXT NOT NULL, review_id TEXT NOT NULL, review TEXT NOT NULL, PRIMARY KEY (app_id, review_id))')
+    return db
+
+
+def is_stored(db, app_id, review_id):
+    return db.execute('SELECT 1 FROM reviews WHERE app_id = ? AND review_id = ?', (app_id, review_id)).fetchone() is not None
+
+
+# the reviews are inserted oldest first, so the rowid keeps the order of the csv of garmin-download-reviews.sh
+def store_reviews(db, app_id, reviews):
+    with db:
+        db.executemany('INSERT INTO reviews (app_id, review_id, review) VALUES (?, ?, ?) ON CONFLICT (app_id, review_id) DO UPDATE SET review = excluded.review',
+            [(app_id, get_review_id(review), json.dumps(review)) for review in reversed(reviews)])
+
+
+# fetches <jobs> pages at the same time until an empty page, a page without new reviews or a page with a stored review,
+# returns the new (or with --full: all the) reviews newest first.
+# The server can return less reviews than page_size, so the first page is fetched alone, and the next pages
+# are as big as it was, and each page starts after the reviews that were actually received.
+def download_reviews(db, app_id, base_url, page_size, jobs, timeout, full, executor):
+    reviews = []
+    seen = set()
+    start = 0
+    step = page_size
+    starts = [start]
+    while True:
+        pages = list(executor.map(lambda s: get_page(base_url, app_id, page_size, s, timeout), starts))
+        for page_start, page_reviews in zip(starts, pages):
+            if not page_reviews:
+                return reviews
+            new_reviews = 0
+            for review in page_reviews:
+                review_id = get_review_id(review)
+                if not full and is_stored(db, app_id, review_id):
+                    return reviews
+                # new reviews can move the older ones to the next page while we read it
+                if review_id not in seen:
+                    seen.add(review_id)
+                    reviews.append(review)
+                    new_reviews += 1
+            if not new_reviews:
+                return reviews
+            start = page_start + len(page_reviews)
+            if page_start == 0:
+                step = len(page_reviews)
+        starts = [start + step * i for i in range(jobs)]
+        print('.', end='', flush=True)
+
+
+# jq's @csv
+def to_csv_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, (int, float)):
+        return str(int(value)) if isinstance(value, float) and value.is_integer() else str(value)
+    if not isinstance(value, str):
+        value = json.dumps(value)
+    return '"' + value.replace('"', '""') + '"'
+
+
+# .[] |= del(.replies) | (.[0] | keys_unsorted) as $keys | $keys, map([.[$keys[]]])[] | @csv
+def write_csv(db, app_id, output_dir):
+    reviews = [json.loads(row[0]) for row in db.execute('SELECT review FROM reviews WHERE app_id = ? ORDER BY rowid', (app_id,))]
+    path = f"{output_dir}/{app_id}.reviews.csv"
+    with open(f"{path}.tmp", 'w') as file:
+        if reviews:
+            keys = [key for key in reviews[0] if key != 'replies']
+            file.write(','.join(to_csv_value(key) for key in keys) + '\n')
+            for review in reviews:
+                file.write(','.join(to_csv_value(review.get(key)) for key in keys) + '\n')
+    os.replace(f"{path}.tmp", path)
+    return len(reviews)
+
+
+def main(argv):
+    try:
+        opts, args = getopt.getopt(argv, 'hs:o:p:j:t:f', ['help', 'store=', 'output-dir=', 'page-size=', 'jobs=', 'timeout=', 'full', 'base-url='])
+    except getopt.GetoptError as e:
+        print(e)
+        usage()
+        sys.exit(1)
+    store = DEFAULT_STORE
+    output_dir = '.'
+    page_size = DEFAULT_PAGE_SIZE
+    jobs = DEFAULT_JOBS
+    timeout = DEFAULT_TIMEOUT
+    full = False
+    base_url = DEFAULT_BASE_URL
+    for opt, arg in opts:
+        if opt == '-h' or opt == '--help':
+            usage()
+            sys.exit(0)
+        if opt == '-s' or opt == '--store':
+            store = arg
+        if opt == '-o' or opt == '--output-dir':
+            output_dir = arg
+        if opt == '-p' or opt == '--page-size':
+            page_size = int(arg) if int(arg) > 0 else DEFAULT_PAGE_SIZE
+        if opt == '-j' or opt == '--jobs':
+            jobs = int(arg) if int(arg) > 0 else DEFAULT_JOBS
+        if opt == '-t' or opt == '--timeout':
+            timeout = float(arg)
+        if opt == '-f' or opt == '--full':
+            full = True
+        if opt == '--base-url':
+            base_url = arg.rstrip('/')
+    if not args:
+        usage()
+        sys.exit(1)
+
+    db = open_store(store)
+    failed = False
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        for app_id in args:
+            try:
+                reviews = download_reviews(db, app_id, base_url, page_size, jobs, timeout, full, executor)
+            except (OSError, http.client.HTTPException, ValueError) as e:
+                print(f"\n{app_id}: {e}", file=sys.stderr)
+                failed = True
+                continue
+            store_reviews(db, app_id, reviews)
+            print(f"\n{app_id}: new or updated reviews: {len(reviews)}, all reviews: {write_csv(db, app_id, output_dir)}")
+    db.close()
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
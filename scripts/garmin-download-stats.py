@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+# source: https://github.com/flocsy/garmin-dev-tools/blob/main/scripts/garmin-download-stats.py ©2023-2024 by flocsy
+
+import sys
+import os
+import re
+import json
+import getopt
+import datetime
+import http.client
+from concurrent.futures import ThreadPoolExecutor
+
+from _http import fetch
+
+
+def usage():
+    cmd = os.path.basename(__file__)
+    print(f'''{cmd} [options]
+Fetches the stats of the apps in garmin-download-stats.conf from every Garmin domain at the same time
+and adds them to the csv files the same way as garmin-download-stats.sh.
+options:
+    -h|--help
+    -j|--jobs <N>                   <N>: how many requests to run at the same time, default: {DEFAULT_JOBS}
+    -t|--timeout <seconds>          timeout of each request, default: {DEFAULT_TIMEOUT}
+    -r|--resume                     only fetch the stats that don't have a line for today yet
+                                    (i.e: after an interrupted run)
+    --base-url <url>                <url>: the url of the store, {{domain}} is replaced with the domain,
+                                    default: {DEFAULT_BASE_URL}
+''')
+
+
+# Different regions have their own garmin servers and we need to scan them all. i.e: garmin.com, garmin.cn
+DOMAINS = ['com', 'cn']
+HEADERS = 'date,installs,rate,reviews,int_ver,ext_ver'
+DEFAULT_BASE_URL = 'https://apps.garmin.{domain}'
+API_PATH = '/api/appsLibraryExternalServices/api/asw/apps/'
+DEFAULT_JOBS = 8
+DEFAULT_TIMEOUT = 30
+
+DIR = os.path.dirname(os.path.realpath(__file__))
+
+
+def get_conf_file():
+    conf_file = f"{os.environ.get('HOME')}/.garmin-download-stats.conf"
+    if not os.path.isfile(conf_file):
+        conf_file = f"{DIR}/garmin-download-stats.conf"
+        if not os.path.isfile(conf_file):
+            print(f"You must have the configuration in {os.environ.get('HOME')}/.garmin-download-stats.conf or {conf_file}")
+            sys.exit(1)
+    return conf_file
+
+
+# reads APP_IDS=(...) and STATS_DIR="..." from the bash configuration
+def read_conf(conf_file):
+    with open(conf_file, 'r') as file:
+        content = re.sub(r'#.*', '', file.read())
+    app_ids_match = re.search(r'APP_IDS=\(([^)]*)\)', content)
+    app_ids = [app_id.strip('"\'') for app_id in app_ids_match.group(1).split()] if app_ids_match else []
+    stats_dir_match = re.search(r'STATS_DIR=(\S+)', content)
+    stats_dir = os.path.expandvars(stats_dir_match.group(1).strip('"\'')) if stats_dir_match else '.'
+    return app_ids, stats_dir
+
+
+# how jq's tostring prints a value
+def jq_tostring(value):
+    if value is None:
+        return 'null'
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+# (.downloadCount|tostring) + "," + (.averageRating|tostring) + "," + (.reviewCount|tostring) + "," + (.latestInternalVersion|tostring) + "," + .latestExternalVersion
+def to_new_data(stats):
+    return ','.join([jq_tostring(stats.get('downloadCount')), jq_tostring(stats.get('averageRating')), jq_tostring(stats.get('reviewCount')),
+        jq_tostring(stats.get('latestInternalVersion')), stats.get('latestExternalVersion') or ''])
+
+
+def get_csv_file(stats_dir, app_id, domain):
+    return f"{stats_dir}/{app_id}.{domain}.csv"
+
+
+# returns the offset of the last line and the last line of the csv file
+def read_last_line(csv_file):
+    with open(csv_file, 'rb') as file:
+        content = file.read()
+    end = len(content) - 1 if content.endswith(b'\n') else len(content)
+    start = content.rfind(b'\n', 0, end) + 1
+    return start, content[start:end].decode()
+
+
+# appends the new data as today's line, or replaces the last line when it's from today already
+def update_csv(csv_file, new_data, today):
+    if not os.path.isfile(csv_file):
+        with open(csv_file, 'w') as file:
+            file.write(f"{HEADERS}\n")
+    offset, last_line = read_last_line(csv_file)
+    last_data = last_line.split(',', 1)[1] if ',' in last_line else last_line
+    if new_data == last_data or not new_data.replace(',', ''):
+        return False
+    with open(csv_file, 'r+b') as file:
+        if last_line.startswith(f"{today},"):
+            file.seek(offset)
+            file.truncate()
+        else:
+            file.seek(0, os.SEEK_END)
+        file.write(f"{today},{new_data}\n".encode())
+    return True
+
+
+def has_today(csv_file, today):
+    return os.path.isfile(csv_file) and read_last_line(csv_file)[1].startswith(f"{today},")
+
+
+# returns the error message, or None when it was successful
+def fetch_stats(app_id, domain, stats_dir, base_url, timeout, today):
+    url = f"{base_url.replace('{domain}', domain)}{API_PATH}{app_id}"
+    try:
+        status, body = fetch(url, timeout)
+        stats = json.loads(body) if body else {}
+    except (OSError, http.client.HTTPException, ValueError) as e:
+        return f"{url}: {e}"
+    if status == 404 or not isinstance(stats, dict) or stats.get('status') == 404:
+        return f"{url}: no stats (the html fallback of garmin-download-stats.sh is not supported)"
+    if status != 200:
+        return f"{url}: http status: {status}"
+    csv_file = get_csv_file(stats_dir, app_id, domain)
+    if update_csv(csv_file, to_new_data(stats), today):
+        print(f"{app_id}.{domain}: {to_new_data(stats)}")
+    return None
+
+
+def main(argv):
+    try:
+        opts, args = getopt.getopt(argv, 'hj:t:r', ['help', 'jobs=', 'timeout=', 'resume', 'base-url='])
+    except getopt.GetoptError as e:
+        print(e)
+        usage()
+        sys.exit(1)
+    jobs = DEFAULT_JOBS
+    timeout = DEFAULT_TIMEOUT
+    resume = False
+    base_url = DEFAULT_BASE_URL
+    for opt, arg in opts:
+        if opt == '-h' or opt == '--help':
+            usage()
+            sys.exit(0)
+        if opt == '-j' or opt == '--jobs':
+            jobs = int(arg) if int(arg) > 0 else DEFAULT_JOBS
+        if opt == '-t' or opt == '--timeout':
+            timeout = float(arg)
+        if opt == '-r' or opt == '--resume':
+            resume = True
+        if opt == '--base-url':
+            base_url = arg.rstrip('/')
+
+    app_ids, stats_dir = read_conf(get_conf_file())
+    os.makedirs(stats_dir, exist_ok=True)
+    today = datetime.date.today().isoformat()
+    pairs = [(app_id, domain) for app_id in app_ids for domain in DOMAINS]
+    if resume:
+        pairs = [(app_id, domain) for app_id, domain in pairs if not has_today(get_csv_file(stats_dir, app_id, domain), today)]
+
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        errors = list(executor.map(lambda pair: fetch_stats(*pair, stats_dir, base_url, timeout, today), pairs))
+    errors = [error for error in errors if error]
+    for error in errors:
+        print(error, file=sys.stderr)
+    if errors:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
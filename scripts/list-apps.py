@@ -3,19 +3,26 @@
 import sys
 import os
 import getopt
+import csv
+import json
 import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
 
 
 def usage():
     cmd = os.path.basename(__file__)
-    print(f'''{cmd} [options] <GarminDevice.xml>
+    print(f'''{cmd} [options] <GarminDevice.xml | directory>...
 options:
     -h|--help
     -a|--app-id <app-id>            <app-id>: the id of the app in the manifest.xml
     -m|--manifest <manifest.xml>    <manifest.xml>: path to manifest.xml
     -f|--format <format>            <format>: can be either a comma separated list of tags
-                                    or a lower case string of the characters "asfnvt" corresponding to the tags
+                                    or a lower case string of the characters "asfnvtdi" corresponding to the tags
                                     default: AppId,StoreId,FileName,AppName,Version,AppType
+                                    and Device,DeviceId when there are more files or with -o csv|json
+    -o|--output <output>            <output>: text, csv or json, default: text
+    -j|--jobs <N>                   <N>: how many files to parse at the same time, default: {os.cpu_count()}
+    directory: all the .xml files in it and its sub-directories
 
 examples:
 
@@ -30,6 +37,9 @@ examples:
 
     to list the AppName and Version:
         {cmd} -fnv GarminDevice.xml
+
+    to list the apps of all the devices in backups/ as csv:
+        {cmd} -o csv backups/
 ''')
 
 
@@ -40,7 +50,16 @@ NS = {
     'iq': 'http://www.garmin.com/xmlschemas/IqExt/v1'
 }
 
-TAG_KEY_2_TAG = {'a': 'AppId', 's': 'StoreId', 'f': 'FileName', 'n': 'AppName', 'v': 'Version', 't': 'AppType'}
+TAG_KEY_2_TAG = {'a': 'AppId', 's': 'StoreId', 'f': 'FileName', 'n': 'AppName', 'v': 'Version', 't': 'AppType', 'd': 'Device', 'i': 'DeviceId'}
+APP_TAGS = ['AppId', 'StoreId', 'FileName', 'AppName', 'Version', 'AppType']
+# the tags of the device: GarminDevice/Model/Description, GarminDevice/Id
+DEVICE_TAGS = ['Device', 'DeviceId']
+
+GD_DEVICE = f"{{{NS['gd']}}}Device"
+GD_MODEL = f"{{{NS['gd']}}}Model"
+GD_DESCRIPTION = f"{{{NS['gd']}}}Description"
+GD_ID = f"{{{NS['gd']}}}Id"
+IQ_APP = f"{{{NS['iq']}}}App"
 
 
 def get_manifest_app_id(manifest_xml_file):
@@ -51,8 +70,8 @@ def get_manifest_app_id(manifest_xml_file):
     return id
 
 
-def parse_garmin_device_xml(xml_file, manifest_app_id = None, format = None):
-    tags = ['AppId', 'StoreId', 'FileName', 'AppName', 'Version', 'AppType']
+def get_tags(format, with_device):
+    tags = DEVICE_TAGS + APP_TAGS if with_device else APP_TAGS
     if format:
         custom_tags = []
         if format.islower():
@@ -60,7 +79,7 @@ def parse_garmin_device_xml(xml_file, manifest_app_id = None, format = None):
         else:
             tag_keys = format.split(',')
         for tag in tag_keys:
-            if tag in tags:
+            if tag in APP_TAGS or tag in DEVICE_TAGS:
                 custom_tags.append(tag)
             else:
                 if tag in TAG_KEY_2_TAG:
@@ -70,30 +89,88 @@ def parse_garmin_device_xml(xml_file, manifest_app_id = None, format = None):
                 else:
                     print(f'invalid tag key: {tag}')
         tags = custom_tags
+    return tags
+
+
+# returns the apps in xml_file as dicts of their tags and the device's tags, the apps are parsed one by one,
+# so even the big GarminDevice.xml files of the devices with many apps only need a little memory
+def read_garmin_device_xml(xml_file, manifest_app_id = None):
+    device = {'Device': '', 'DeviceId': ''}
+    apps = []
+    path = []
+    try:
+        for event, elem in ET.iterparse(xml_file, events=('start', 'end')):
+            if event == 'start':
+                path.append(elem.tag)
+                continue
+            path.pop()
+            if elem.tag == IQ_APP:
+                app = {child.tag.split('}', 1)[-1]: (child.text or '') for child in elem}
+                if manifest_app_id is None or app.get('AppId') == manifest_app_id:
+                    apps.append(app)
+                elem.clear()
+            elif elem.tag == GD_DESCRIPTION and path == [GD_DEVICE, GD_MODEL]:
+                device['Device'] = elem.text or ''
+            elif elem.tag == GD_ID and path == [GD_DEVICE]:
+                device['DeviceId'] = elem.text or ''
+            elif len(path) == 1:
+                # the direct children of the root are not needed after they were parsed
+                elem.clear()
+    except ET.ParseError as e:
+        # i.e: a malformed xml in the directory, the other files are still listed
+        print(f"skipping {xml_file}: {e}", file=sys.stderr)
+        return []
+    if not device['Device']:
+        device['Device'] = xml_file
+    return [{**device, **app} for app in apps]
+
+
+def find_xml_files(paths):
+    xml_files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                xml_files.extend(os.path.join(root, file) for file in sorted(files) if file.lower().endswith('.xml'))
+        else:
+            xml_files.append(path)
+    return xml_files
 
-    tree = ET.parse(xml_file)
-    root = tree.getroot()
-    apps = root.findall('./gd:Extensions/iq:IQAppExt/iq:Apps/iq:App', NS)
-    # print('AppId,StoreId,FileName,AppName,Version,AppType')
-    for app in apps:
-        if manifest_app_id is None or app.find('iq:AppId', NS).text == manifest_app_id:
-            line = ''
-            for tag in tags:
-                if line:
-                    line += ','
-                line += app.find(f'iq:{tag}', NS).text
-            print(f'{line}')
+
+def read_garmin_device_xmls(xml_files, manifest_app_id, jobs):
+    if jobs > 1 and len(xml_files) > 1:
+        with ProcessPoolExecutor(max_workers=min(jobs, len(xml_files))) as executor:
+            results = list(executor.map(read_garmin_device_xml, xml_files, [manifest_app_id] * len(xml_files)))
+    else:
+        results = [read_garmin_device_xml(xml_file, manifest_app_id) for xml_file in xml_files]
+    return [app for apps in results for app in apps]
+
+
+def print_apps(apps, tags, output):
+    if output == 'csv':
+        writer = csv.writer(sys.stdout, lineterminator='\n')
+        writer.writerow(tags)
+        for app in apps:
+            writer.writerow([app.get(tag, '') for tag in tags])
+    elif output == 'json':
+        print(json.dumps([{tag: app.get(tag, '') for tag in tags} for app in apps], indent=2, ensure_ascii=False))
+    else:
+        # print('AppId,StoreId,FileName,AppName,Version,AppType')
+        for app in apps:
+            print(','.join(app.get(tag, '') for tag in tags))
 
 
 def main(argv):
     try:
-        opts, args = getopt.getopt(argv, 'ha:m:f:', ['help', 'app-id', 'manifest', 'format'])
+        opts, args = getopt.getopt(argv, 'ha:m:f:o:j:', ['help', 'app-id=', 'manifest=', 'format=', 'output=', 'jobs='])
     except getopt.GetoptError as e:
         print(e)
         usage()
         sys.exit(1)
     manifest_app_id = None
     format = None
+    output = 'text'
+    jobs = os.cpu_count()
     for opt, arg in opts:
         if opt == '-h' or opt == '--help':
             usage()
@@ -104,8 +181,20 @@ def main(argv):
             manifest_app_id = get_manifest_app_id(arg)
         if opt == '-f' or opt == '--format':
             format = arg
-    xml_file = argv[len(argv) - 1]
-    parse_garmin_device_xml(xml_file, manifest_app_id, format)
+        if opt == '-o' or opt == '--output':
+            output = arg
+        if opt == '-j' or opt == '--jobs':
+            jobs = int(arg) if int(arg) > 0 else os.cpu_count()
+    if output not in ['text', 'csv', 'json']:
+        print(f'invalid output: {output}')
+        usage()
+        sys.exit(1)
+    if not args:
+        usage()
+        sys.exit(1)
+    xml_files = find_xml_files(args)
+    tags = get_tags(format, len(xml_files) > 1 or output != 'text')
+    print_apps(read_garmin_device_xmls(xml_files, manifest_app_id, jobs), tags, output)
 
 
 if __name__ == '__main__':
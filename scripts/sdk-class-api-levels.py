@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+
+import sys
+import os
+import re
+import getopt
+from concurrent.futures import ProcessPoolExecutor
+
+from _sdk import get_sdk_home
+
+
+def usage():
+    cmd = os.path.basename(__file__)
+    print(f'''{cmd} [options]
+Parses the html files of the latest SDK's doc/Toybox in parallel and writes the same csv files as sdk-class-api-levels.sh:
+{OUTPUT_ALL}, {OUTPUT_CLASS_MIN}, {OUTPUT_MIN_CLASS}
+and the min API level of each method: {OUTPUT_METHOD_MIN}
+options:
+    -h|--help
+    -o|--output-dir <dir>           <dir>: where to write the csv files, default: {DEFAULT_OUTPUT_DIR}
+    -j|--jobs <N>                   <N>: how many processes parse the docs, default: {os.cpu_count()}
+    -q|--query <name>               don't parse the docs, only print the min API level of the classes and methods
+                                    in the csv files whose name is or ends with <name>
+
+examples:
+
+    to update the csv files:
+        {cmd}
+
+    to find out since when Dc.drawAngledText is available:
+        {cmd} -q Dc.drawAngledText
+''')
+
+
+DEFAULT_OUTPUT_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.realpath(__file__))), 'csv')
+OUTPUT_ALL = 'sdk-class-all-api-levels.csv'
+OUTPUT_CLASS_MIN = 'sdk-class-min-api-levels.csv'
+OUTPUT_MIN_CLASS = 'min-api-level2class.csv'
+OUTPUT_METHOD_MIN = 'sdk-method-min-api-levels.csv'
+
+# sed -e 's#.*API Level \([0-9]*\.[0-9]\.[0-9]*\).*#\1#' (the last one in the line)
+API_LEVEL_RE = re.compile(r'.*API Level ([0-9]*\.[0-9]\.[0-9]*)')
+API_LEVELS_RE = re.compile(r'API Level ([0-9]*\.[0-9]\.[0-9]*)')
+# the anchor of a method's details in the yard generated docs
+METHOD_RE = re.compile(r'id="([A-Za-z_][A-Za-z0-9_]*[?!=]?)-(?:instance|class)_method"')
+
+
+def get_doc_dir(sdk_home):
+    sdks = sorted(os.listdir(f"{sdk_home}/Sdks"))
+    if not sdks:
+        print(f"No SDK in: {sdk_home}/Sdks")
+        sys.exit(1)
+    return f"{sdk_home}/Sdks/{sdks[-1]}/doc/Toybox"
+
+
+def version_key(version):
+    return tuple(int(n) if n.isdigit() else 0 for n in version.split('.'))
+
+
+# returns the line of sdk-class-all-api-levels.csv for the file and the min API level of its methods
+def parse_doc_file(doc_dir, path):
+    with open(f"{doc_dir}/{path}", 'r', encoding='utf-8', errors='replace') as file:
+        content = file.read()
+
+    # grep "API Level" | sed ... | sort | uniq | xargs | sed -e 's# #,#g'
+    levels = set()
+    for line in content.splitlines():
+        if 'API Level' in line:
+            match = API_LEVEL_RE.match(line)
+            levels.add(match.group(1) if match else line)
+    levels = ','.join(token for level in sorted(levels) for token in level.split())
+    name = re.sub(r'.html$', ':', path) if re.search(r'.html$', path) else path
+    line = f"{name}{levels}".replace('/', '.')
+
+    method2level = {}
+    if path.endswith('.html'):
+        class_name = path[:-len('.html')].replace('/', '.')
+        methods = list(METHOD_RE.finditer(content))
+        for i, method in enumerate(methods):
+            end = methods[i + 1].start() if i + 1 < len(methods) else len(content)
+            method_levels = API_LEVELS_RE.findall(content, method.end(), end)
+            if method_levels:
+                method_name = f"{class_name}.{method.group(1)}"
+                level = min(method_levels, key=version_key)
+                if method_name not in method2level or version_key(level) < version_key(method2level[method_name]):
+                    method2level[method_name] = level
+    return line, method2level
+
+
+def find_doc_files(doc_dir):
+    paths = []
+    for root, dirs, files in os.walk(doc_dir):
+        for file in files:
+            paths.append(os.path.relpath(os.path.join(root, file), doc_dir))
+    return paths
+
+
+def write_lines(path, lines):
+    with open(f"{path}.tmp", 'w') as file:
+        file.writelines(f"{line}\n" for line in lines)
+    os.replace(f"{path}.tmp", path)
+
+
+def index_docs(doc_dir, output_dir, jobs):
+    paths = find_doc_files(doc_dir)
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        results = list(executor.map(parse_doc_file, [doc_dir] * len(paths), paths, chunksize=16))
+
+    all_lines = sorted(line for line, method2level in results)
+    write_lines(f"{output_dir}/{OUTPUT_ALL}", all_lines)
+    # sed -e 's#,.*##g'
+    class_min_lines = [line.split(',', 1)[0] for line in all_lines]
+    write_lines(f"{output_dir}/{OUTPUT_CLASS_MIN}", class_min_lines)
+    # sed -e 's#\([^:]*\):\(.*\)#\2:\1#' | sort
+    write_lines(f"{output_dir}/{OUTPUT_MIN_CLASS}", sorted(re.sub(r'([^:]*):(.*)', r'\2:\1', line) for line in class_min_lines))
+
+    method2level = {}
+    for line, file_method2level in results:
+        method2level.update(file_method2level)
+    write_lines(f"{output_dir}/{OUTPUT_METHOD_MIN}", sorted(f"{method}:{level}" for method, level in method2level.items()))
+    print(f"classes: {len(all_lines)}, methods: {len(method2level)}")
+
+
+def query(output_dir, name):
+    found = False
+    for file_name in [OUTPUT_CLASS_MIN, OUTPUT_METHOD_MIN]:
+        path = f"{output_dir}/{file_name}"
+        if not os.path.exists(path):
+            continue
+        with open(path, 'r') as file:
+            for line in file:
+                key = line.split(':', 1)[0]
+                if key == name or key.endswith(f".{name}"):
+                    print(line, end='')
+                    found = True
+    return found
+
+
+def main(argv):
+    try:
+        opts, args = getopt.getopt(argv, 'ho:j:q:', ['help', 'output-dir=', 'jobs=', 'query='])
+    except getopt.GetoptError as e:
+        print(e)
+        usage()
+        sys.exit(1)
+    output_dir = DEFAULT_OUTPUT_DIR
+    jobs = os.cpu_count()
+    query_name = None
+    for opt, arg in opts:
+        if opt == '-h' or opt == '--help':
+            usage()
+            sys.exit(0)
+        if opt == '-o' or opt == '--output-dir':
+            output_dir = arg
+        if opt == '-j' or opt == '--jobs':
+            jobs = int(arg) if int(arg) > 0 else os.cpu_count()
+        if opt == '-q' or opt == '--query':
+            query_name = arg
+
+    if query_name:
+        sys.exit(0 if query(output_dir, query_name) else 1)
+
+    print(sys.argv[0])
+    index_docs(get_doc_dir(get_sdk_home()), output_dir, jobs)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
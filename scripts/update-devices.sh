@@ -1,22 +1,12 @@
 #!/bin/sh
 DIR=$(dirname "$(readlink -f "$0")")
 
-(
-    cd "${DIR}/../csv"
-    "${DIR}/device2all-versions.sh"
-    "${DIR}/device2max-version.sh"
-    "${DIR}/device2min-version.sh"
-    "${DIR}/max-version2devices.sh"
-    "${DIR}/min-version2devices.sh"
-    "${DIR}/device2ttf-fonts.sh"
-
-    for TYPE in audioContentProvider background datafield glance watchApp watchFace widget; do
-        "${DIR}/device2memory.sh" "${TYPE}"
-        "${DIR}/memory2devices.sh" "${TYPE}"
-    done
-)
+# writes the same files as device2all-versions.sh, device2max-version.sh, device2min-version.sh, max-version2devices.sh,
+# min-version2devices.sh, device2ttf-fonts.sh and device2memory.sh, memory2devices.sh for each app type, but reads each device once
+"${DIR}/export-devices-csv.py" --output-dir "${DIR}/../csv"
 
+# only runs cft-font-info for the devices whose fonts changed in the SDK
 (
     cd "${DIR}/../font-analyzer"
-    "./device2chars.sh"
+    "./device2chars.py"
 )
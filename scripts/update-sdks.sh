@@ -1,7 +1,5 @@
 #!/bin/sh
 DIR=$(dirname "$(readlink -f "$0")")
 
-(
-    cd "${DIR}/../csv"
-    "${DIR}/sdk-class-api-levels.sh"
-)
+# writes the same files as sdk-class-api-levels.sh and the min API level of each method
+"${DIR}/sdk-class-api-levels.py" --output-dir "${DIR}/../csv"